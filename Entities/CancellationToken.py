@@ -0,0 +1,30 @@
+from typing import *
+import threading
+
+
+class OperationCancelled(Exception):
+    """
+    操作被CancellationToken取消时抛出
+    """
+    pass
+
+
+class CancellationToken:
+    def __init__(self, event=None):
+        """
+        用于取消耗时操作（下载、加载班级数据、选课）。
+        由发起操作的一方持有并调用cancel()，执行操作的一方定期调用raiseIfCancelled()检查。
+        :param event: 记录是否已经取消的事件对象。为None时使用threading.Event()。
+                      需要让子进程也能看到取消状态时，传入multiprocessing的Event
+        """
+        self.event = threading.Event() if event is None else event
+
+    def cancel(self):
+        self.event.set()
+
+    def isCancelled(self) -> bool:
+        return self.event.is_set()
+
+    def raiseIfCancelled(self):
+        if self.event.is_set():
+            raise OperationCancelled()
@@ -3,6 +3,12 @@ from .Time import *
 
 
 class Class:
+    __slots__ = (
+        "classCode", "course", "teacherNames", "semester", "classTime", "examTimeList",
+        "available", "unfiltered", "status", "originClassTimeStr", "originSemesterStr", "location",
+        "_rate", "_teacherRate", "_timeRate", "_possibilityRate", "index", "conflictBits",
+    )
+
     def __init__(self, classCode: str,
                  course: Course, teacherNames: List[str], semester: str,
                  classTime: ClassTime, examTimeList: List[ExamTime],
@@ -42,15 +48,21 @@ class Class:
         self._timeRate : Union[float, None] = None  # 时间评分。由data.py中的calculateClassRate(course)函数计算并填充。
         self._possibilityRate : Union[float, None] = None  # 选上概率评分。由data.py中的calculateClassRate(course)函数计算并填充。
 
+        self.index : Union[int, None] = None    # 班级在data.allClassSet中的编号。由data.py中的buildConflictIndex()填充。
+        self.conflictBits : Union[int, None] = None     # 与本班级冲突的班级的编号位图。由data.py中的buildConflictIndex()填充。
+
     def isConflict(self, item):
         if not isinstance(item, Class):
             raise TypeError(
                 "item must be an instance of Class"
             )
-        if self.course.courseCode == item.course.courseCode:
+        if self.course.key == item.course.key:
             # 同一个课程的不同班级之间不会冲突
             # 因为你只能选上一个班级
             return False
+        if self.conflictBits is not None and item.index is not None:
+            # 两个班级都在冲突索引中，直接查表
+            return self.conflictBits >> item.index & 1 == 1
 
         return any(
             [
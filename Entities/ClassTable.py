@@ -11,12 +11,111 @@ class ClassTable:
         self.classes : List[Class] = []
         self.__assumeNotSelectCourse : List[Course] = []    # 假设未选中的课程
 
+        # 以下是随着班级的加入、删除而增量维护的状态，用于让插入检查的耗时与课表大小无关。
+        # 每个班级加入时计数加一，删除时计数减一，所以撤销一次加入的代价和加入一样小。
+        self._classCodeCount : Dict[str, int] = {}   # 班级代码 -> 这个班级在课表中出现的次数
+        self._classBits = 0      # 课表中已有班级的编号位图。编号见Class.index
+        self._unindexedCount = 0     # 课表中没有编号的班级数量。有这样的班级时，冲突检查退化为逐个比较
+        self._timeBitCount : Dict[int, int] = {}     # 上课时间位 -> 占据这一位的班级数量
+        self._timeMask = 0       # 课表占据的上课时间位图
+        self._examTimeCount : Dict[Tuple, int] = {}  # (考试开始时间, 考试结束时间) -> 有这个考试的班级数量
+        self._candidateCount : Dict[int, int] = {}   # 课程键 -> 这门课程的志愿数量
+
+    def _addState(self, item: Class):
+        """
+        把一个班级计入增量维护的状态
+        """
+        self._classCodeCount[item.classCode] = self._classCodeCount.get(item.classCode, 0) + 1
+        if item.index is None:
+            self._unindexedCount += 1
+        else:
+            self._classBits |= 1 << item.index
+        mask = item.classTime.mask
+        while mask:
+            lowBit = mask & -mask
+            self._timeBitCount[lowBit] = self._timeBitCount.get(lowBit, 0) + 1
+            mask ^= lowBit
+        self._timeMask |= item.classTime.mask
+        for examTime in item.examTimeList:
+            if not examTime.noExam:
+                key = (examTime.startTime, examTime.endTime)
+                self._examTimeCount[key] = self._examTimeCount.get(key, 0) + 1
+        courseKey = item.course.key
+        self._candidateCount[courseKey] = self._candidateCount.get(courseKey, 0) + 1
+
+    def _removeState(self, item: Class):
+        """
+        把一个班级从增量维护的状态中扣除。是_addState的逆操作
+        """
+        count = self._classCodeCount[item.classCode] - 1
+        if count:
+            self._classCodeCount[item.classCode] = count
+        else:
+            del self._classCodeCount[item.classCode]
+        if item.index is None:
+            self._unindexedCount -= 1
+        elif not count:
+            self._classBits &= ~(1 << item.index)
+        mask = item.classTime.mask
+        while mask:
+            lowBit = mask & -mask
+            bitCount = self._timeBitCount[lowBit] - 1
+            if bitCount:
+                self._timeBitCount[lowBit] = bitCount
+            else:
+                del self._timeBitCount[lowBit]
+                self._timeMask &= ~lowBit
+            mask ^= lowBit
+        for examTime in item.examTimeList:
+            if not examTime.noExam:
+                key = (examTime.startTime, examTime.endTime)
+                examCount = self._examTimeCount[key] - 1
+                if examCount:
+                    self._examTimeCount[key] = examCount
+                else:
+                    del self._examTimeCount[key]
+        courseKey = item.course.key
+        candidateCount = self._candidateCount[courseKey] - 1
+        if candidateCount:
+            self._candidateCount[courseKey] = candidateCount
+        else:
+            del self._candidateCount[courseKey]
+
+    @property
+    def timeMask(self) -> int:
+        """
+        课表占据的上课时间位图。位的含义见Time.ClassTime
+        """
+        return self._timeMask
+
+    def getOccupiedExamTimes(self) -> FrozenSet[Tuple]:
+        """
+        获取课表中所有班级的考试时间段
+        :return: {(考试开始时间, 考试结束时间), ...}
+        """
+        return frozenset(self._examTimeCount)
+
     def isConflict(self, item: Class) -> bool:
         """
         判断一个班级是否和当前课表有时间上的冲突
         :param item: 课程对象
         :return: bool
         """
+        if not self._unindexedCount:
+            if item.conflictBits is not None:
+                # 课表内的班级和item都在冲突索引中，直接查表
+                return item.conflictBits & self._classBits != 0
+            if item.course.key not in self._candidateCount:
+                # 课表里没有同一门课程的班级，直接和整个课表占据的时间比较
+                if item.classTime.mask & self._timeMask:
+                    return True
+                for examTime in item.examTimeList:
+                    if examTime.noExam:
+                        continue
+                    for startTime, endTime in self._examTimeCount:
+                        if not (examTime.endTime < startTime or examTime.startTime > endTime):
+                            return True
+                return False
         for class_ in self.classes:
             if class_.isConflict(item):
                 return True
@@ -32,6 +131,7 @@ class ClassTable:
                 "Cannot append a class that is conflict with current ClassTable!"
             )
         self.classes.append(item)
+        self._addState(item)
 
     def assumeNotSelectCourse(self, course: Course):
         """
@@ -44,8 +144,19 @@ class ClassTable:
         return self.__assumeNotSelectCourse
 
     def removeClass(self, item: Class):
-        while item in self.classes:
-            self.classes.remove(item)
+        if item.classCode not in self._classCodeCount:
+            return
+        if self.classes[-1] == item and self._classCodeCount[item.classCode] == 1:
+            # 选课算法总是先加入的后删除，这种情况最常见
+            self._removeState(self.classes.pop())
+            return
+        remainingClasses = []
+        for class_ in self.classes:
+            if class_ == item:
+                self._removeState(class_)
+            else:
+                remainingClasses.append(class_)
+        self.classes[:] = remainingClasses
 
 
     def removeCourse(self, course: Course):
@@ -53,13 +164,16 @@ class ClassTable:
         从课表中删除某门课程的所有班级
         :param course: Course对象
         """
+        if course.key not in self._candidateCount:
+            return
         classToRemove = []
         for class_ in self.classes:
-            if Course.isEqualCourseCode(class_.course.courseCode, course.courseCode):
+            if class_.course.key == course.key:
                 classToRemove.append(class_)
 
         for class_ in classToRemove:
             self.classes.remove(class_)
+            self._removeState(class_)
 
     def getNumberOfCandidates(self, course):
         """
@@ -67,19 +181,30 @@ class ClassTable:
         :param course: Course对象
         :return: 这门课程现在的志愿数量
         """
-        return len([class_ for class_ in self.classes if Course.isEqualCourseCode(class_.course.courseCode, course.courseCode)])
+        return self._candidateCount.get(course.key, 0)
 
     def pop(self):
-        return self.classes.pop()
+        class_ = self.classes.pop()
+        self._removeState(class_)
+        return class_
 
     def clear(self):
         self.classes.clear()
+        self._classCodeCount.clear()
+        self._classBits = 0
+        self._unindexedCount = 0
+        self._timeBitCount.clear()
+        self._timeMask = 0
+        self._examTimeCount.clear()
+        self._candidateCount.clear()
 
     def extend(self, classTable):
         classTable: ClassTable
-        self.classes.extend(classTable.classes)
+        for class_ in list(classTable.classes):
+            self.classes.append(class_)
+            self._addState(class_)
 
     def copyTo(self, classTable):
         classTable: ClassTable
-        classTable.classes.clear()
-        classTable.classes.extend(self.classes)
\ No newline at end of file
+        classTable.clear()
+        classTable.extend(self)
@@ -5,6 +5,8 @@ from .Time import *
 
 
 class CourseType:
+    __slots__ = ("sort", "belonging", "mark", "identification")
+
     def __init__(self, sort: str, belonging: str, mark: str, identification: str):
         """
         课程类型由多个属性组成
@@ -22,7 +24,28 @@ class CourseType:
         return f"CourseType({self.sort}, {self.belonging}, {self.mark}, {self.identification})"
 
 
+# 课程代码 -> 规范的整数键。同一门课程的新版代码、旧版代码、"新版（旧版）"形式的代码都对应同一个键。
+# 由Course.getCourseKey填充。键按照第一次遇到的顺序分配，所以只在同一个进程内有意义
+_courseKeyRegistry: Dict[str, int] = {}
+_courseKeyCodes: Dict[int, List[str]] = {}  # 课程键 -> 对应这个键的所有课程代码。合并两个键时用来修改映射
+_nextCourseKey = 0
+
+# 没有设置选课策略的课程共用的默认值。Strategy对象不可修改，所以可以共用。
+# 序列类的属性在没有内容时都指向同一个空元组，第一次通过with...等方法写入时才为这门课程创建自己的列表，
+# 所以这些属性标注为Sequence：读取时不要假定它们是列表，修改时用这些方法，或者整个替换
+_DEFAULT_STRATEGY = Strategy(*STRATEGY_DEFAULT)
+_EMPTY: Tuple = ()
+_EMPTY_TEACHER_GROUP: Tuple[Tuple, ...] = ((), (), (), ())
+
+
 class Course:
+    __slots__ = (
+        "courseCode", "courseName", "credit", "courseType", "academy", "status",
+        "priority", "strategy", "rated", "classScoreList", "teacherGroup", "requiredTeachers", "avoidedTeachers",
+        "onlyChooseOneTimeFlag", "expectedTimeList", "avoidTimeList",
+        "teacherFactor", "timeFactor", "possibilityFactor", "candidates",
+    )
+
     def __init__(self, courseCode, courseName, credit, courseType: CourseType, academy, status: str):
         """
         :param courseCode: 课程代码
@@ -34,6 +57,7 @@ class Course:
         这些属性都是可以从json文件中读取的
         """
         self.courseCode = courseCode
+        Course.getCourseKey(courseCode)     # 登记课程代码。课程键见key属性
         self.courseName = courseName
         self.credit = credit
         self.courseType = courseType
@@ -42,24 +66,38 @@ class Course:
 
         # 以下为选课策略
         self.priority = 0       # 选课优先级。数字越大，优先级越高。非负整数
-        self.strategy = Strategy(*STRATEGY_DEFAULT)
+        self.strategy = _DEFAULT_STRATEGY
 
         self.rated = False      # 是否已经给各班级评分。设置这个属性是为了减少网络IO
-        self.classScoreList : List[List] = [] # [[class1, score1], ... ] # 存储各班级的评分
-        self.teacherGroup = [[], [], [], []]
-        self.requiredTeachers = []
-        self.avoidedTeachers = []
+        self.classScoreList : Sequence[List] = _EMPTY # [[class1, score1], ... ] # 存储各班级的评分
+        self.teacherGroup : Sequence[Sequence[str]] = _EMPTY_TEACHER_GROUP    # [首选, 好, 一般, 差]四组教师名
+        self.requiredTeachers : Sequence[str] = _EMPTY
+        self.avoidedTeachers : Sequence[str] = _EMPTY
 
         self.onlyChooseOneTimeFlag = False   # 是否要求所有志愿的课程在同一时间段上课
-        self.expectedTimeList : List[ClassTime] = []  # 期望上课时间
-        self.avoidTimeList : List[ClassTime] = [] # 避免上课时间
+        self.expectedTimeList : Sequence[ClassTime] = _EMPTY  # 期望上课时间
+        self.avoidTimeList : Sequence[ClassTime] = _EMPTY # 避免上课时间
 
         self.teacherFactor = 1.0  # 教师因素权重
         self.timeFactor = 1.0    # 时间因素权重
         self.possibilityFactor = 3.0    # 选上的概率的权重
 
         # 三个选课志愿
-        self.candidates = []    # List[Course]
+        self.candidates : Sequence[Course] = _EMPTY
+
+    @property
+    def key(self) -> int:
+        """
+        规范的课程键。比较、哈希都用它，不用每次都解析课程代码。
+        键在使用时才从映射中读取，所以创建课程对象之后发生的合并（见getCourseKey）也会反映出来
+        """
+        key = _courseKeyRegistry.get(self.courseCode)
+        return key if key is not None else Course.getCourseKey(self.courseCode)
+
+    def _addTeachers(self, group: int, teacherNames):
+        if isinstance(self.teacherGroup, tuple):   # 还是共用的空分组
+            self.teacherGroup = [[], [], [], []]
+        self.teacherGroup[group].extend(teacherNames)
 
     def withPriority(self, priority: int):
         if priority < 0 or not isinstance(priority, int):
@@ -74,30 +112,36 @@ class Course:
         return self
 
     def onlyChooseFromTheseTeachers(self, *teacherName):
+        if self.requiredTeachers is _EMPTY:
+            self.requiredTeachers = []
         self.requiredTeachers.extend(teacherName)
         return self
 
     def preferredTeacher(self, *teacherName):
-        self.teacherGroup[0].extend(teacherName)
+        self._addTeachers(0, teacherName)
         return self
 
     def goodTeacher(self, *teacherName):
-        self.teacherGroup[1].extend(teacherName)
+        self._addTeachers(1, teacherName)
         return self
 
     def normalTeacher(self, *teacherName):
-        self.teacherGroup[2].extend(teacherName)
+        self._addTeachers(2, teacherName)
         return self
 
     def badTeacher(self, *teacherName):
-        self.teacherGroup[3].extend(teacherName)
+        self._addTeachers(3, teacherName)
         return self
 
     def avoidTeacher(self, *teacherName):
+        if self.avoidedTeachers is _EMPTY:
+            self.avoidedTeachers = []
         self.avoidedTeachers.extend(teacherName)
         return self
 
     def expectClassAt(self, classTime: ClassTime):
+        if self.expectedTimeList is _EMPTY:
+            self.expectedTimeList = []
         self.expectedTimeList.append(classTime)
         return self
 
@@ -106,6 +150,8 @@ class Course:
         return self
 
     def avoidClassAt(self, classTime: ClassTime):
+        if self.avoidTimeList is _EMPTY:
+            self.avoidTimeList = []
         self.avoidTimeList.append(classTime)
         return self
 
@@ -129,7 +175,110 @@ class Course:
             raise TypeError(
                 "item must be an instance of Course"
             )
-        return self.isEqualCourseCode(self.courseCode, other.courseCode)
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @staticmethod
+    def getCourseKey(code: str) -> int:
+        """
+        把课程代码解析为规范的整数键，没有见过的课程代码会分配新的键。
+        新版代码和旧版代码指向同一门课，所以它们得到同一个键。如果两种形式之前分别得到了不同的键，
+        这两个键会合并成一个，之后两种形式的所有代码都返回合并后的键。
+        但是已经登记过"新版（旧版）"形式代码的键各自代表一门确定的课程，不会被合并：
+        例如登记过A（B）和C（D）之后，B（C）和它们都有相同的形式，却不会把A（B）和C（D）变成同一门课程。
+        这时B（C）使用新版代码B的键。只查找、不登记课程代码时用findCourseKey
+        :param code: 课程代码
+        :return: 课程键
+        """
+        global _nextCourseKey
+        key = _courseKeyRegistry.get(code)
+        if key is not None:
+            return key
+        forms = Course.getCourseCodeForms(code)
+        keys = {_courseKeyRegistry[form] for form in forms if form in _courseKeyRegistry}
+        if keys:
+            anchoredKeys = {key for key in keys if Course._isAnchoredCourseKey(key)}
+            if len(anchoredKeys) > 1:
+                key = _courseKeyRegistry.get(forms[0], min(anchoredKeys))
+            else:
+                key = min(anchoredKeys or keys)
+            for other in keys - anchoredKeys - {key}:
+                Course._mergeCourseKey(other, key)
+        else:
+            key = _nextCourseKey
+            _nextCourseKey += 1
+        for form in {code, *forms}:
+            if form not in _courseKeyRegistry:
+                _courseKeyRegistry[form] = key
+                _courseKeyCodes.setdefault(key, []).append(form)
+        return key
+
+    @staticmethod
+    def _isAnchoredCourseKey(key: int) -> bool:
+        """
+        :return: 课程键是否登记过"新版（旧版）"形式的代码。这样的键代表一门确定的课程，不应再和其他键合并
+        """
+        return any('（' in code for code in _courseKeyCodes.get(key, ()))
+
+    @staticmethod
+    def _mergeCourseKey(source: int, target: int):
+        """
+        把课程键source的所有课程代码改为指向target
+        """
+        codes = _courseKeyCodes.pop(source, [])
+        for code in codes:
+            _courseKeyRegistry[code] = target
+        _courseKeyCodes.setdefault(target, []).extend(codes)
+
+    @staticmethod
+    def findCourseKey(code: str) -> Union[int, None]:
+        """
+        查找课程代码的课程键，不会分配新的键，也不会修改已有的映射
+        :param code: 课程代码
+        :return: 课程键。课程代码的各种形式都没有登记过时返回None
+        """
+        key = _courseKeyRegistry.get(code)
+        if key is not None:
+            return key
+        keys = [_courseKeyRegistry[form] for form in Course.getCourseCodeForms(code) if form in _courseKeyRegistry]
+        # 两种形式分别属于不同的键时，说明这个代码还没有登记过，合并要等到getCourseKey登记时才做
+        return keys[0] if keys and all(key == keys[0] for key in keys) else None
+
+    @staticmethod
+    def getCourseKeyRegistry() -> Dict[str, int]:
+        """
+        获取课程代码到课程键的映射。用于把课程键同步给子进程
+        """
+        return dict(_courseKeyRegistry)
+
+    @staticmethod
+    def setCourseKeyRegistry(registry: Dict[str, int]):
+        """
+        用getCourseKeyRegistry的结果覆盖当前进程的课程代码到课程键的映射。
+        之后新分配的键从映射中最大的键之后开始，不会和已有的键重复
+        """
+        global _nextCourseKey
+        _courseKeyRegistry.clear()
+        _courseKeyRegistry.update(registry)
+        _courseKeyCodes.clear()
+        for code, key in registry.items():
+            _courseKeyCodes.setdefault(key, []).append(code)
+        _nextCourseKey = max(registry.values(), default=-1) + 1
+
+    @staticmethod
+    def getCourseCodeForms(code: str) -> Tuple[str, str]:
+        """
+        把课程代码拆成新版和旧版两种形式。例如"新版代码（旧版代码）"拆成("新版代码", "旧版代码")。
+        没有括号的课程代码，新旧两种形式相同。
+        :param code: 课程代码
+        :return: (新版课程代码, 旧版课程代码)
+        """
+        if '（' in code:
+            new, old = code.split('（')
+            return new, old[:-1]
+        return code, code
 
     @staticmethod
     def isEqualCourseCode(code1:str, code2:str) -> bool:
@@ -137,20 +286,12 @@ class Course:
         用于判断两个课程代码是否相同。
         课程代码有时候会有括号，有时候没有。括号外和括号内的内容都是课程代码，只是版本不同。
         括号内的内容是新版课程代码，括号外的内容是旧版课程代码。但他们都指向同一门课。
+        两个代码有相同的形式，或者登记过的课程键相同时，认为它们相同。见getCourseKey。这个方法不会登记课程代码
         """
-        if '（' in code1:
-            new1, old1 = code1.split('（')
-            old1 = old1[:-1]
-        else:
-            new1 = old1 = code1
-        if '（' in code2:
-            new2, old2 = code2.split('（')
-            old2 = old2[:-1]
-        else:
-            new2 = old2 = code2
-        return any([
-            new1 == new2, new1 == old2, old1 == new2, old1 == old2
-        ])
+        if not set(Course.getCourseCodeForms(code1)).isdisjoint(Course.getCourseCodeForms(code2)):
+            return True
+        key1 = Course.findCourseKey(code1)
+        return key1 is not None and key1 == Course.findCourseKey(code2)
 
 
 class CourseList(list):
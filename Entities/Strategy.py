@@ -5,14 +5,20 @@ class Strategy:
         """
         用于描述选一门课的三个志愿的策略。用户可以通过这个类来描述自己的选课策略。
         hot表示热门班级数量，normal表示普通班级数量，cold表示冷门班级数量。
-        三个参数的和应该等于3。
+        三个参数的和应该等于3。创建后不可修改，没有设置策略的课程共用同一个默认策略对象
         :param hot:
         :param normal:
         :param cold:
         """
         if hot + normal + cold != 3:
             raise ValueError("Unable to create Strategy object: hot + normal + cold should be 3")
-        self.hot = hot
-        self.normal = normal
-        self.cold = cold
+        object.__setattr__(self, "hot", hot)
+        object.__setattr__(self, "normal", normal)
+        object.__setattr__(self, "cold", cold)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Strategy is immutable")
+
+    def __reduce__(self):
+        return Strategy, (self.hot, self.normal, self.cold)
 
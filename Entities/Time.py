@@ -1,26 +1,99 @@
-from copy import deepcopy
 from datetime import datetime
 from typing import *
 
 
+# ClassTime内部用一个整数位图表示上课时间。
+# 每个半学期占 DAYS_PER_WEEK * PERIODS_PER_DAY 位，上半学期在低位，下半学期在高位。
+# 第(周几, 第几节课)对应的位为 (周几-1)*PERIODS_PER_DAY + (第几节课-1)，下半学期再加上 HALF_SEMESTER_BITS
+DAYS_PER_WEEK = 7
+PERIODS_PER_DAY = 14
+HALF_SEMESTER_BITS = DAYS_PER_WEEK * PERIODS_PER_DAY
+
+
 class ClassTime:
+    __slots__ = ("mask", "_firstHalfTimeList", "_secondHalfTimeList")
+
     def __init__(self, firstHalfTimeList: List[Tuple[int, int]], secondHalfTimeList: List[Tuple[int, int]]):
         """
-        上课时间
+        上课时间。创建后不可修改：解析缓存会让上课时间字符串相同的班级共享同一个ClassTime对象。
+        firstHalfTimeList、secondHalfTimeList是只读属性，返回元组
         :param firstHalfTimeList: 上半学期的课表 [(周几, 第几节课), ...]
         :param secondHalfTimeList: 下半学期的课表 [(周几, 第几节课), ...]
+        :raise ValueError: 周几不在1~DAYS_PER_WEEK之间，或者第几节课不在1~PERIODS_PER_DAY之间
+        """
+        object.__setattr__(self, "mask", self.getMaskFromTimeList(firstHalfTimeList)
+                           | self.getMaskFromTimeList(secondHalfTimeList) << HALF_SEMESTER_BITS)
+        # 元组形式只在需要的时候才从位图中解析出来
+        object.__setattr__(self, "_firstHalfTimeList", None)
+        object.__setattr__(self, "_secondHalfTimeList", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ClassTime is immutable")
+
+    def __reduce__(self):
+        return ClassTime.fromMask, (self.mask,)
+
+    @staticmethod
+    def getMaskFromTimeList(timeList: List[Tuple[int, int]]) -> int:
+        """
+        把一个半学期的时间列表转换成位图
+        :param timeList: [(周几, 第几节课), ...]
+        :return: 这个半学期的位图
+        :raise ValueError: 时间超出范围。位图只有DAYS_PER_WEEK * PERIODS_PER_DAY位，超出范围的时间无法表示
+        """
+        mask = 0
+        for day, period in timeList:
+            if not (1 <= day <= DAYS_PER_WEEK and 1 <= period <= PERIODS_PER_DAY):
+                raise ValueError(f"Invalid class time ({day}, {period})")
+            mask |= 1 << ((day - 1) * PERIODS_PER_DAY + period - 1)
+        return mask
+
+    @staticmethod
+    def getTimeListFromMask(mask: int) -> List[Tuple[int, int]]:
+        """
+        把一个半学期的位图转换成时间列表。列表按照(周几, 第几节课)排序
+        :param mask: 这个半学期的位图
+        :return: [(周几, 第几节课), ...]
+        """
+        timeList = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                timeList.append((bit // PERIODS_PER_DAY + 1, bit % PERIODS_PER_DAY + 1))
+            mask >>= 1
+            bit += 1
+        return timeList
+
+    @classmethod
+    def fromMask(cls, mask: int):
         """
-        self.firstHalfTimeList = firstHalfTimeList
-        self.firstHalfTimeList.sort(key=lambda x: (x[0], x[1]))
-        self.secondHalfTimeList = secondHalfTimeList
-        self.secondHalfTimeList.sort(key=lambda x: (x[0], x[1]))
+        直接从位图构造ClassTime对象，省去解析列表的开销
+        :param mask: 两个半学期合在一起的位图
+        :return: ClassTime对象
+        """
+        classTime = cls.__new__(cls)
+        object.__setattr__(classTime, "mask", mask)
+        object.__setattr__(classTime, "_firstHalfTimeList", None)
+        object.__setattr__(classTime, "_secondHalfTimeList", None)
+        return classTime
+
+    @property
+    def firstHalfTimeList(self) -> Tuple[Tuple[int, int], ...]:
+        if self._firstHalfTimeList is None:
+            object.__setattr__(self, "_firstHalfTimeList",
+                               tuple(self.getTimeListFromMask(self.mask & ((1 << HALF_SEMESTER_BITS) - 1))))
+        return self._firstHalfTimeList
+
+    @property
+    def secondHalfTimeList(self) -> Tuple[Tuple[int, int], ...]:
+        if self._secondHalfTimeList is None:
+            object.__setattr__(self, "_secondHalfTimeList",
+                               tuple(self.getTimeListFromMask(self.mask >> HALF_SEMESTER_BITS)))
+        return self._secondHalfTimeList
 
     def isOverlapped(self, item):
         if isinstance(item, ClassTime):
-            return (
-                    any(i in self.firstHalfTimeList for i in item.firstHalfTimeList)
-                    or any(i in self.secondHalfTimeList for i in item.secondHalfTimeList)
-            )
+            return self.mask & item.mask != 0
         raise TypeError("item must be an instance of ClassTime")
 
     def __add__(self, other):
@@ -28,17 +101,7 @@ class ClassTime:
             raise TypeError(
                 "item must be an instance of ClassTime"
             )
-        first_half_time_list = deepcopy(self.firstHalfTimeList)
-        for i in other.firstHalfTimeList:
-            if i not in first_half_time_list:
-                first_half_time_list.append(i)
-
-        second_half_time_list = deepcopy(self.secondHalfTimeList)
-        for i in other.secondHalfTimeList:
-            if i not in second_half_time_list:
-                second_half_time_list.append(i)
-
-        return ClassTime(first_half_time_list, second_half_time_list)
+        return ClassTime.fromMask(self.mask | other.mask)
 
     def __sub__(self, other):
         """
@@ -50,17 +113,7 @@ class ClassTime:
             raise TypeError(
                 "item must be an instance of ClassTime"
             )
-        firstHalfTimeList = deepcopy(self.firstHalfTimeList)
-        for i in other.firstHalfTimeList:
-            if i in firstHalfTimeList:
-                firstHalfTimeList.remove(i)
-
-        secondHalfTimeList = deepcopy(self.secondHalfTimeList)
-        for i in other.secondHalfTimeList:
-            if i in secondHalfTimeList:
-                secondHalfTimeList.remove(i)
-
-        return ClassTime(firstHalfTimeList, secondHalfTimeList)
+        return ClassTime.fromMask(self.mask & ~other.mask)
 
     def __mul__(self, other):
         """
@@ -72,42 +125,48 @@ class ClassTime:
             raise TypeError(
                 "item must be an instance of ClassTime"
             )
-        firstHalfTimeList = [i for i in self.firstHalfTimeList if i in other.firstHalfTimeList]
-        secondHalfTimeList = [i for i in self.secondHalfTimeList if i in other.secondHalfTimeList]
-        return ClassTime(firstHalfTimeList, secondHalfTimeList)
+        return ClassTime.fromMask(self.mask & other.mask)
 
     def __eq__(self, other):
         if not isinstance(other, ClassTime):
             raise TypeError(
                 "item must be an instance of ClassTime"
             )
-        return self.firstHalfTimeList == other.firstHalfTimeList and self.secondHalfTimeList == other.secondHalfTimeList
+        return self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
 
     def __contains__(self, item):
         # 对应表达式： item in self
         if isinstance(item, ClassTime):
-            return (
-                all(i in self.firstHalfTimeList for i in item.firstHalfTimeList)
-                and all(i in self.secondHalfTimeList for i in item.secondHalfTimeList)
-            )
+            return item.mask & self.mask == item.mask
         raise TypeError("item must be an instance of ClassTime")
 
     def __repr__(self):
         # return f"ClassTime()"
-        return f"ClassTime({self.firstHalfTimeList}, {self.secondHalfTimeList})"
+        return f"ClassTime({list(self.firstHalfTimeList)}, {list(self.secondHalfTimeList)})"
 
 
 
 class ExamTime:
+    __slots__ = ("startTime", "endTime", "noExam")
+
     def __init__(self, startTime: datetime, endTime: datetime, noExam:bool=False):
         """
-        考试时间
+        考试时间。创建后不可修改：解析缓存会让考试时间相同的班级共享同一个ExamTime对象
         :param startTime: 考试开始时间
         :param endTime: 考试结束时间
         """
-        self.startTime = startTime
-        self.endTime = endTime
-        self.noExam : bool = noExam
+        object.__setattr__(self, "startTime", startTime)
+        object.__setattr__(self, "endTime", endTime)
+        object.__setattr__(self, "noExam", noExam)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ExamTime is immutable")
+
+    def __reduce__(self):
+        return ExamTime, (self.startTime, self.endTime, self.noExam)
 
     def isOverlapped(self, item):
         if isinstance(item, ExamTime):
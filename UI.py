@@ -7,9 +7,15 @@ from lib import colorizer as idc
 import idlelib.percolator as idp
 from interface import *
 import network
+import data
 import threading
+import multiprocessing
+import os
 import time
-from data import loadCourseData, loadClassData, initClassTable, courseData, filterClassSetByCondition
+from data import loadCourseData, loadClassData, initClassTable, courseRecords, filterClassSetByCondition
+from selectClass import SearchStats, PARALLEL_MAX_WORKERS
+from monitor import EnrollmentMonitor
+from Entities.CancellationToken import CancellationToken, OperationCancelled
 
 
 class ProgressBar(Canvas):
@@ -459,7 +465,13 @@ class Application(Tk):
         self.selectButton = Button(self, text="开始自动选课", command=self.selectCourse, state=DISABLED)
         self.showButton = Button(self, text="显示选课结果", command=self.showResult, state=DISABLED)
         self.authorButton = Button(self, text="关于", command=self.showAuthor)
+        self.cancelButton = Button(self, text="取消", command=self.cancel, state=DISABLED)
+        self.monitorButton = Button(self, text="开始监控余量", command=self.toggleMonitor, state=DISABLED)
+        self.monitorStatusLabel = Label(self, text="", fg="blue")
 
+        self.monitorStatusLabel.place(x=600, y=320, width=200, height=40, anchor=NW)
+        self.monitorButton.place(x=600, y=360, width=200, height=40, anchor=NW)
+        self.cancelButton.place(x=600, y=400, width=200, height=40, anchor=NW)
         self.updateButton.place(x=600, y=440, width=200, height=40, anchor=NW)
         self.selectButton.place(x=600, y=480, width=200, height=40, anchor=NW)
         self.showButton.place(x=600, y=520, width=200, height=40, anchor=NW)
@@ -468,6 +480,10 @@ class Application(Tk):
         self.progressBar = None
         self.doubleVar = DoubleVar()
         self.stringVar = StringVar()
+        self.cancelToken = None
+        self.monitor = None     # 余量监控器。选课完成后才能开始监控
+        self.baseTable = ClassTable()   # 最近一次选课前的课表（只含已选上的班级）
+        self.workers = 1    # 最近一次选课使用的进程数
 
     def _login(self):
         username = self.accountEntry.get()
@@ -484,7 +500,7 @@ class Application(Tk):
                 self.updateButton.config(state=NORMAL)
                 self.selectButton.config(state=NORMAL)
                 self.showButton.config(state=NORMAL)
-                if not courseData:
+                if not courseRecords:
                     showinfo("提示", "检测到课程数据为空，即将自动更新课程数据")
                     self.updateCourse()
             else:
@@ -503,22 +519,28 @@ class Application(Tk):
         thread.start()
 
     def _updateCourse(self):
+        self.stopMonitor()
         self.updateButton.config(state=DISABLED)
         self.selectButton.config(state=DISABLED)
         self.updateButton.config(text="正在更新课程数据...")
+        self.cancelToken = CancellationToken()
+        self.cancelButton.config(state=NORMAL)
 
 
         try:
             self.enableProgress()
             self.stringVar.set("下载课程档案...")
-            network.updateCoursesJson(self.doubleVar)
+            network.updateCoursesJson(self.doubleVar, self.stringVar, force=True, cancelToken=self.cancelToken)
             self.resetProgress()
             self.stringVar.set("载入课程档案...")
             loadCourseData()
             showinfo("更新成功", "课程数据更新成功")
+        except OperationCancelled:
+            showinfo("已取消", "已取消更新课程数据，课程数据保持不变")
         except Exception as e:
             showerror("更新失败", str(e)+'\n'+traceback.format_exc())
 
+        self.cancelButton.config(state=DISABLED)
         self.updateButton.config(state=NORMAL)
         self.selectButton.config(state=NORMAL)
         self.updateButton.config(text="更新课程数据")
@@ -530,6 +552,8 @@ class Application(Tk):
         thread.start()
 
     def _selectCourse(self):
+        self.stopMonitor()
+        self.monitorButton.config(state=DISABLED)
         self.updateButton.config(state=DISABLED)
         self.selectButton.config(state=DISABLED)
         self.showButton.config(state=DISABLED)
@@ -608,24 +632,52 @@ class Application(Tk):
                 self.disableProgress()
                 return
 
+            self.cancelToken = CancellationToken()
+            self.cancelButton.config(state=NORMAL)
             self.stringVar.set("下载班级档案...")
-            network.updateClassJson(wishList, self.doubleVar)
+            network.updateClassJson(wishList, self.doubleVar, cancelToken=self.cancelToken)
             self.resetProgress()
 
             self.stringVar.set("载入班级档案...")
-            loadClassData(self.doubleVar)
+            loadClassData(self.doubleVar, cancelToken=self.cancelToken)
             initClassTable(classTable)
+            classTable.copyTo(self.baseTable)
             self.resetProgress()
+            failureNote = ""
+            if data.classLoadFailures:
+                failureNote = f"\n{len(data.classLoadFailures)}个班级的数据有误，没有参与选课"
 
             self.stringVar.set("自动选课中...")
-            selectClass(classTable, wishList, doubleVar=self.doubleVar)
+            # 搜索量大时用多个进程并行搜索。搜索量小的优先级selectClass会直接在本进程内搜索完，不启动进程池
+            workers = min(os.cpu_count() or 1, PARALLEL_MAX_WORKERS)
+            self.workers = workers
+            stats = SearchStats()
+            selectClass(classTable, wishList, doubleVar=self.doubleVar, workers=workers,
+                        stats=stats, onProgress=self._showSearchProgress, cancelToken=self.cancelToken)
+            self.cancelButton.config(state=DISABLED)
 
             time.sleep(0.1)
-            showinfo("选课完毕", "选课完毕")
+            report = stats.getReport()
+            if stats.cancelled:
+                showinfo("已取消", f"选课已取消，选课结果是目前找到的最好的课表\n"
+                                   f"共搜索{report['nodes']}个节点，评估{report['leafEvaluations']}个课表，"
+                                   f"用时{report['totalTime']:.1f}秒" + failureNote)
+            else:
+                showinfo("选课完毕", f"选课完毕\n共搜索{report['nodes']}个节点，评估{report['leafEvaluations']}个课表，"
+                                     f"用时{report['totalTime']:.1f}秒" + failureNote)
+                self.monitorButton.config(state=NORMAL)
             self.selectButton.config(text="自动选课完毕")
 
+        except OperationCancelled:
+            # 在下载或载入班级档案时取消，还没有选课结果
+            self.cancelButton.config(state=DISABLED)
+            showinfo("已取消", "已取消选课")
+            self.updateButton.config(state=NORMAL)
+            self.selectButton.config(state=NORMAL)
+            self.selectButton.config(text="开始自动选课")
         except Exception as e:
             detail = traceback.format_exc()
+            self.cancelButton.config(state=DISABLED)
             showerror("选课失败", str(e)+'\n'+detail)
             self.updateButton.config(state=NORMAL)
             self.selectButton.config(state=NORMAL)
@@ -635,6 +687,54 @@ class Application(Tk):
         self.disableProgress()
 
 
+    def _showSearchProgress(self, stats: SearchStats):
+        text = f"自动选课中...(第{stats.finishedPriorityCount + 1}/{stats.priorityCount}个优先级，已搜索{stats.currentNodes}个节点"
+        remaining = stats.estimatedRemainingNodes
+        if remaining is not None:
+            text += f"，预计还需{remaining}个"
+        self.stringVar.set(text + ")")
+
+    def cancel(self):
+        """
+        取消正在进行的更新或选课。操作会在下一个检查点停止
+        """
+        self.cancelButton.config(state=DISABLED)
+        if self.cancelToken is not None:
+            self.cancelToken.cancel()
+            self.stringVar.set("正在取消...")
+
+    def toggleMonitor(self):
+        """
+        开始或停止监控课表中班级的余量。余量变化影响选课结果时，自动重新选课并替换选课结果
+        """
+        if self.monitor is not None and self.monitor.isRunning():
+            self.stopMonitor()
+            return
+        self.monitor = EnrollmentMonitor(self.baseTable, classTable, wishList, self.doubleVar,
+                                         onResult=self._onMonitorResult, onError=self._onMonitorError,
+                                         workers=self.workers)
+        self.monitor.start()
+        self.monitorButton.config(text="停止监控余量")
+        self.monitorStatusLabel.config(text="正在监控余量", fg="blue")
+
+    def stopMonitor(self):
+        """
+        停止余量监控，等待正在进行的检查结束
+        """
+        if self.monitor is not None:
+            self.monitor.stop(wait=True)
+            self.monitor = None
+        self.monitorButton.config(text="开始监控余量")
+        self.monitorStatusLabel.config(text="")
+
+    def _onMonitorResult(self, newTable: ClassTable, deltas):
+        newTable.copyTo(classTable)
+        self.monitorStatusLabel.config(text=f"{time.strftime('%H:%M:%S')} {len(deltas)}个班级余量变化，已重新选课",
+                                       fg="green")
+
+    def _onMonitorError(self, error: Exception):
+        self.monitorStatusLabel.config(text=f"{time.strftime('%H:%M:%S')} 检查余量失败：{error}", fg="red")
+
     def selectCourse(self):
         self.selectStatus = True
         thread = threading.Thread(target=self._selectCourse)
@@ -678,6 +778,7 @@ https://github.com/xi2p/ZJU-MOTIS
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()    # 打包成exe后，并行选课的子进程需要这一句
     loadCourseData()
     wishList = WishList()
     classTable = ClassTable()
@@ -0,0 +1,3 @@
+"""
+性能测试工具。在项目根目录下用python -m benchmark.xxx运行
+"""
@@ -0,0 +1,132 @@
+"""
+这个模块测试loadClassData和selectClass的耗时随愿望清单长度的变化，用于找出搜索量急剧增长的位置。
+每个愿望清单长度都按照真实的运行流程测试：classes.json里只有愿望清单中的课程（见network.updateClassJson），
+然后加载班级数据、插入已选课程、执行选课算法。
+
+用法：
+    python -m benchmark.scaling [--sizes 5,10,20,30] [--courses 课程数] [--priorities 优先级个数] [--seed 随机种子]
+"""
+from typing import *
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import data
+import network
+from Entities.WishList import WishList
+from Entities.ClassTable import ClassTable
+from selectClass import selectClass
+from benchmark.synthetic import REPO_DIR, SemesterConfig, generateSemester
+
+
+class NullProgress:
+    """
+    代替tkinter的DoubleVar，丢弃所有进度
+    """
+    def set(self, value):
+        pass
+
+    def get(self):
+        return 0
+
+
+def prepareWorkDir(workDir: str):
+    """
+    让data.py在workDir中读写数据文件，教师评分仍然使用项目中的teacher.json
+    """
+    os.chdir(workDir)
+    data.TEACHER_DATA_PATH = os.path.join(REPO_DIR, "teacher.json")
+    data.TEACHER_INDEX_PATH = os.path.join(workDir, "teacher.idx")
+
+
+def loadWishedSemester(courses: list, classes: list, chosen: list, wishedIndices: List[int]):
+    """
+    写出只含愿望清单课程和已选课程的classes.json，并重新加载所有数据
+    :param wishedIndices: 愿望清单中的课程在courses中的下标
+    """
+    chosenCodes = {class_["t_kcdm"] for class_ in chosen}
+    indices = list(wishedIndices) + [i for i, course in enumerate(courses)
+                                     if course["kcdm"] in chosenCodes and i not in wishedIndices]
+    with open("courses.json", "w", encoding="UTF-8") as f:
+        json.dump(courses, f, ensure_ascii=False)
+    with open("classes.json", "w", encoding="UTF-8") as f:
+        json.dump([classes[i] for i in indices], f, ensure_ascii=False)
+    network.chosenClasses = chosen
+    # 课程对象上保存着上一轮的愿望设置，loadCourseData会重新创建
+    data.loadCourseData()
+
+
+def runScaling(sizes: List[int], config: SemesterConfig, priorityLevels: int = 3,
+               workers: int = 1, report: Callable[[Dict], None] = None) -> List[Dict]:
+    """
+    对每个愿望清单长度执行一次完整的选课流程
+    :param sizes: 要测试的愿望清单长度
+    :param config: 模拟学期数据的参数
+    :param priorityLevels: 愿望随机分配到多少个不同的优先级。优先级越少，单次搜索的课程越多
+    :param workers: selectClass使用的进程数
+    :param report: 每测完一个长度就调用一次 report(结果)
+    :return: 各长度的结果 [{"wishes": 长度, "classes": 班级数, "loadClassData": 秒, "selectClass": 秒}, ...]
+    """
+    courses, classes, chosen = generateSemester(config)
+    rnd = random.Random(config.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as workDir:
+        cwd = os.getcwd()
+        prepareWorkDir(workDir)
+        try:
+            for size in sizes:
+                wishedIndices = rnd.sample(range(len(courses)), min(size, len(courses)))
+                loadWishedSemester(courses, classes, chosen, wishedIndices)
+
+                start = time.perf_counter()
+                data.loadClassData(NullProgress())
+                loadTime = time.perf_counter() - start
+
+                classTable = ClassTable()
+                data.initClassTable(classTable)
+                wishList = WishList()
+                for i in wishedIndices:
+                    wishList.append(data.getCourseFromCourseCode(courses[i]["xskcdm"])).withPriority(
+                        rnd.randrange(priorityLevels))
+
+                start = time.perf_counter()
+                selectClass(classTable, wishList, NullProgress(), workers=workers)
+                selectTime = time.perf_counter() - start
+
+                result = {
+                    "wishes": len(wishedIndices),
+                    "classes": len(data.allClassSet),
+                    "loadClassData": loadTime,
+                    "selectClass": selectTime,
+                }
+                results.append(result)
+                if report is not None:
+                    report(result)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="测试选课耗时随愿望清单长度的变化")
+    parser.add_argument("--sizes", default="5,10,15,20,25,30", help="愿望清单长度，用逗号分隔")
+    parser.add_argument("--courses", type=int, default=300, help="模拟学期的课程数")
+    parser.add_argument("--priorities", type=int, default=3, help="愿望分配到的优先级个数")
+    parser.add_argument("--workers", type=int, default=1, help="selectClass使用的进程数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    print(f"{'wishes':>8}{'classes':>10}{'loadClassData(s)':>20}{'selectClass(s)':>18}")
+    runScaling(
+        [int(size) for size in args.sizes.split(",")],
+        SemesterConfig(courseCount=args.courses, seed=args.seed),
+        priorityLevels=args.priorities,
+        workers=args.workers,
+        report=lambda result: print(
+            f"{result['wishes']:>8}{result['classes']:>10}"
+            f"{result['loadClassData']:>20.3f}{result['selectClass']:>18.3f}",
+            flush=True
+        )
+    )
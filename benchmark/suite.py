@@ -0,0 +1,232 @@
+"""
+这个模块在固定的模拟数据上分阶段测试选课流程的性能，
+记录各阶段的耗时、内存峰值和搜索节点数，输出为json，并可以与保存的基准结果比较，发现性能退化。
+
+用法：
+    python -m benchmark.suite [--output 结果.json] [--baseline 基准.json] [--tolerance 0.2] [--cases small,medium]
+    python -m benchmark.suite --output benchmark/baseline.json     # 保存基准结果
+"""
+from typing import *
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import data
+import network
+import selectClass
+from Entities.WishList import WishList
+from Entities.ClassTable import ClassTable
+from benchmark.synthetic import SemesterConfig, generateSemester
+from benchmark.scaling import NullProgress, prepareWorkDir, loadWishedSemester
+
+# 固定的测试数据。数据由种子决定，每次运行都相同
+BENCHMARK_CASES: Dict[str, Dict] = {
+    "small": {"courses": 200, "wishes": 10, "priorities": 3, "chosen": 2, "seed": 1},
+    "medium": {"courses": 300, "wishes": 20, "priorities": 5, "chosen": 3, "seed": 2},
+    "large": {"courses": 400, "wishes": 40, "priorities": 10, "chosen": 4, "seed": 3},
+}
+
+# 按执行顺序排列的阶段。
+# getCourseCandidateCombination在_select内部执行，_select的耗时包含它
+PHASES = ["loadCourseData", "loadClassData", "initClassTable", "calculateClassRate",
+          "getCourseCandidateCombination", "_select", "ScheduleTable.fill"]
+
+MIN_REGRESSION_SECONDS = 0.005  # 耗时差距小于这个值时不算退化，避免计时误差
+
+
+def _fillScheduleTables(classTable: ClassTable) -> Union[float, None]:
+    """
+    绘制上下半学期的课程表，返回耗时。没有图形界面时返回None
+    """
+    try:
+        import tkinter
+        from UI import ScheduleTable
+        root = tkinter.Tk()
+    except Exception:
+        return None
+    try:
+        root.withdraw()
+        tables = [ScheduleTable(root, classTable, half) for half in (0, 1)]
+        start = time.perf_counter()
+        for table in tables:
+            table.fill()
+        return time.perf_counter() - start
+    finally:
+        root.destroy()
+
+
+def runCase(case: Dict, traceMemory: bool) -> Dict:
+    """
+    执行一个测试数据的完整流程
+    :param case: BENCHMARK_CASES中的一项
+    :param traceMemory: 是否用tracemalloc记录各阶段的内存峰值。记录内存会明显拖慢运行速度
+    :return: {"phases": {阶段: {"time": 秒, "peakMemory": 字节}}, "nodes": 搜索节点数, "leaves": 评估的完整课表数, ...}
+    """
+    courses, classes, chosen = generateSemester(SemesterConfig(
+        courseCount=case["courses"], chosenCount=case["chosen"], seed=case["seed"]
+    ))
+    rnd = random.Random(case["seed"])
+    wishedIndices = rnd.sample(range(len(courses)), case["wishes"])
+    priorities = [rnd.randrange(case["priorities"]) for _ in wishedIndices]
+
+    phases: Dict[str, Dict[str, float]] = {}
+
+    @contextlib.contextmanager
+    def _phase(name: str):
+        if traceMemory:
+            tracemalloc.reset_peak()
+            baseMemory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        phases[name] = {"time": time.perf_counter() - start}
+        if traceMemory:
+            phases[name]["peakMemory"] = tracemalloc.get_traced_memory()[1] - baseMemory
+
+    loadWishedSemester(courses, classes, chosen, wishedIndices)
+    with _phase("loadCourseData"):
+        data.loadCourseData()
+    with _phase("loadClassData"):
+        data.loadClassData(NullProgress())
+    classTable = ClassTable()
+    with _phase("initClassTable"):
+        data.initClassTable(classTable)
+
+    wishList = WishList()
+    for i, priority in zip(wishedIndices, priorities):
+        wishList.append(data.getCourseFromCourseCode(courses[i]["xskcdm"])).withPriority(priority)
+    with _phase("calculateClassRate"):
+        selectClass.calculateClassRates(wishList.wishes)
+
+    stats = selectClass.SearchStats()
+    selectClass.clearCandidateCache()
+    with _phase("_select"):
+        selectClass.selectClass(classTable, wishList, NullProgress(), recalculate=False, stats=stats)
+    phases["getCourseCandidateCombination"] = {"time": stats.candidateTime}
+
+    fillTime = _fillScheduleTables(classTable)
+    if fillTime is not None:
+        phases["ScheduleTable.fill"] = {"time": fillTime}
+
+    return {
+        "phases": phases,
+        "classes": len(data.allClassSet),
+        "nodes": sum(stats.nodesPerPriority.values()),
+        "leaves": stats.leafEvaluations,
+        "pruned": sum(stats.prunedPerPriority.values()),
+        "combinations": sum(stats.combinationsPerCourse.values()),
+        "result": [class_.classCode for class_ in classTable.classes],
+    }
+
+
+def runSuite(caseNames: List[str], traceMemory: bool = True) -> Dict:
+    """
+    执行多个测试数据
+    :param caseNames: BENCHMARK_CASES中的名字
+    :param traceMemory: 是否另外执行一遍以记录内存峰值。计时那一遍不记录内存，以免影响耗时
+    :return: 可以直接写成json的结果
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workDir:
+        cwd = os.getcwd()
+        prepareWorkDir(workDir)
+        try:
+            for name in caseNames:
+                result = runCase(BENCHMARK_CASES[name], traceMemory=False)
+                if traceMemory:
+                    tracemalloc.start()
+                    try:
+                        memoryResult = runCase(BENCHMARK_CASES[name], traceMemory=True)
+                    finally:
+                        tracemalloc.stop()
+                    for phase, stats in memoryResult["phases"].items():
+                        if "peakMemory" in stats:
+                            result["phases"][phase]["peakMemory"] = stats["peakMemory"]
+                results[name] = result
+        finally:
+            os.chdir(cwd)
+    return {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "cases": results,
+    }
+
+
+def compareWithBaseline(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    与基准结果比较
+    :param tolerance: 允许的耗时和内存增长比例
+    :return: 退化的描述。没有退化时为空列表
+    """
+    regressions = []
+    for name, case in current["cases"].items():
+        baseCase = baseline["cases"].get(name)
+        if baseCase is None:
+            continue
+        for phase, stats in case["phases"].items():
+            baseStats = baseCase["phases"].get(phase)
+            if baseStats is None:
+                continue
+            if (stats["time"] > baseStats["time"] * (1 + tolerance)
+                    and stats["time"] - baseStats["time"] > MIN_REGRESSION_SECONDS):
+                regressions.append(f"{name}/{phase}: time {baseStats['time']:.3f}s -> {stats['time']:.3f}s")
+            if ("peakMemory" in stats and "peakMemory" in baseStats
+                    and stats["peakMemory"] > baseStats["peakMemory"] * (1 + tolerance)):
+                regressions.append(f"{name}/{phase}: peak memory {baseStats['peakMemory']} -> {stats['peakMemory']} bytes")
+        # 搜索是确定性的，节点数增加说明剪枝变差了
+        if case["nodes"] > baseCase["nodes"]:
+            regressions.append(f"{name}: nodes {baseCase['nodes']} -> {case['nodes']}")
+        if case["result"] != baseCase["result"]:
+            regressions.append(f"{name}: result changed")
+    return regressions
+
+
+def printReport(current: Dict, baseline: Union[Dict, None]):
+    for name, case in current["cases"].items():
+        baseCase = None if baseline is None else baseline["cases"].get(name)
+        print(f"[{name}] classes={case['classes']} nodes={case['nodes']} leaves={case['leaves']} "
+              f"pruned={case['pruned']} combinations={case['combinations']}")
+        for phase in PHASES:
+            if phase not in case["phases"]:
+                print(f"    {phase:<32}skipped")
+                continue
+            stats = case["phases"][phase]
+            line = f"    {phase:<32}{stats['time']:>10.4f}s"
+            if "peakMemory" in stats:
+                line += f"{stats['peakMemory'] / 1024:>12.1f}KB"
+            if baseCase is not None and phase in baseCase["phases"] and baseCase["phases"][phase]["time"] > 0:
+                line += f"    ({stats['time'] / baseCase['phases'][phase]['time'] - 1:+.1%} vs baseline)"
+            print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="分阶段测试选课流程的性能")
+    parser.add_argument("--cases", default=",".join(BENCHMARK_CASES), help="测试数据的名字，用逗号分隔")
+    parser.add_argument("--output", help="把结果写入这个json文件。可以作为之后的基准")
+    parser.add_argument("--baseline", help="与这个json文件中的基准结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的耗时和内存增长比例")
+    parser.add_argument("--no-memory", action="store_true", help="不记录内存峰值")
+    args = parser.parse_args()
+
+    current = runSuite(args.cases.split(","), traceMemory=not args.no_memory)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="UTF-8") as f:
+            baseline = json.load(f)
+    printReport(current, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    if baseline is not None:
+        regressions = compareWithBaseline(current, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,268 @@
+"""
+这个模块负责生成模拟的学期数据（courses.json、classes.json、chosen.json），用于性能测试。
+生成的文件格式与network.py从zdbk下载的文件相同，可以直接被data.py加载，也可以交给mockServer.py使用。
+
+用法：
+    python -m benchmark.synthetic 输出目录 [--courses 课程数] [--seed 随机种子] ...
+"""
+from typing import *
+import argparse
+import json
+import os
+import random
+import network
+
+# 常见的上课时间段（节次）。键是时间段，值是这种时间段出现的权重
+DEFAULT_PERIOD_WEIGHTS: Dict[Tuple[int, ...], float] = {
+    (1, 2): 3,
+    (3, 4, 5): 3,
+    (3, 4): 1,
+    (6, 7, 8): 3,
+    (7, 8): 1,
+    (9, 10): 2,
+    (11, 12): 1,
+    (11, 12, 13): 1,
+}
+# 周一到周日出现的权重
+DEFAULT_DAY_WEIGHTS: List[float] = [5, 5, 5, 5, 5, 0.5, 0.5]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DAY_NAMES = "一二三四五六日"
+# 考试时间段
+EXAM_PERIODS = [("08:00", "10:00"), ("10:30", "12:30"), ("14:00", "16:00"), ("16:30", "18:30"), ("18:30", "20:30")]
+COLLEGES = ["数学科学学院", "物理学院", "化学系", "计算机科学与技术学院", "外国语学院", "经济学院", "机械工程学院", "马克思主义学院"]
+COURSE_SORTS = ["通识", "专业基础课程", "专业必修课程", "体育", "大类课程"]
+
+
+class SemesterConfig:
+    def __init__(self, courseCount: int = 300, classesPerCourse: Tuple[int, int] = (1, 12),
+                 periodWeights: Dict[Tuple[int, ...], float] = None, dayWeights: List[float] = None,
+                 slotsPerClass: Tuple[int, int] = (1, 3),
+                 halfSemesterRatio: float = 0.25, splitTimeRatio: float = 0.1,
+                 examDensity: float = 0.6, midtermRatio: float = 0.1,
+                 teacherOverlap: float = 0.8, sharedTeacherRatio: float = 0.1,
+                 availabilityRatio: Tuple[float, float] = (0.2, 3.0), fullRatio: float = 0.05,
+                 oldCodeRatio: float = 0.2, chosenCount: int = 0, seed: int = 0):
+        """
+        模拟学期数据的参数
+        :param courseCount: 课程数
+        :param classesPerCourse: 每门课程的班级数范围[最少, 最多]
+        :param periodWeights: 各上课时间段的权重。为None时使用DEFAULT_PERIOD_WEIGHTS
+        :param dayWeights: 周一到周日的权重。为None时使用DEFAULT_DAY_WEIGHTS
+        :param slotsPerClass: 每个班级每周上几次课的范围[最少, 最多]
+        :param halfSemesterRatio: 只在春学期或夏学期上课的班级比例
+        :param splitTimeRatio: 春学期和夏学期分别写出上课时间的班级比例，例如"春周三第9,10节<br>夏周三第9,10节"
+        :param examDensity: 有期末考试的课程比例
+        :param midtermRatio: 在期末考试之外还有期中考试的课程比例
+        :param teacherOverlap: 教师姓名取自teacher.json的比例。其余教师为查不到评分的虚构姓名
+        :param sharedTeacherRatio: 班级有两位教师的比例
+        :param availabilityRatio: 待筛选人数与余量之比的范围。大于1表示僧多粥少
+        :param fullRatio: 余量为0的班级比例
+        :param oldCodeRatio: 课程代码写成"新代码（旧代码）"形式的比例
+        :param chosenCount: 生成多少门已选上的课程，写入chosen.json
+        :param seed: 随机种子。相同的参数和种子生成相同的数据
+        """
+        self.courseCount = courseCount
+        self.classesPerCourse = classesPerCourse
+        self.periodWeights = DEFAULT_PERIOD_WEIGHTS if periodWeights is None else periodWeights
+        self.dayWeights = DEFAULT_DAY_WEIGHTS if dayWeights is None else dayWeights
+        self.slotsPerClass = slotsPerClass
+        self.halfSemesterRatio = halfSemesterRatio
+        self.splitTimeRatio = splitTimeRatio
+        self.examDensity = examDensity
+        self.midtermRatio = midtermRatio
+        self.teacherOverlap = teacherOverlap
+        self.sharedTeacherRatio = sharedTeacherRatio
+        self.availabilityRatio = availabilityRatio
+        self.fullRatio = fullRatio
+        self.oldCodeRatio = oldCodeRatio
+        self.chosenCount = chosenCount
+        self.seed = seed
+
+
+def loadTeacherNames(path: str = None) -> List[str]:
+    """
+    读取teacher.json中所有教师的姓名。文件不存在时返回空列表
+    :param path: teacher.json的路径。为None时使用项目中的teacher.json
+    """
+    if path is None:
+        path = os.path.join(REPO_DIR, "teacher.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [teacher["name"] for teacher in json.load(f)["teachers"]]
+
+
+def _getClassTimeString(rnd: random.Random, config: SemesterConfig, semester: str) -> Tuple[str, Set[Tuple]]:
+    """
+    生成一个班级的上课时间字符串
+    :return: (上课时间字符串, 占据的时间{(学期, 星期, 节次), ...})
+    """
+    periods = list(config.periodWeights.keys())
+    periodWeights = list(config.periodWeights.values())
+    pieces = []
+    usedDays = set()
+    occupied = set()
+    for _ in range(rnd.randint(*config.slotsPerClass)):
+        day = rnd.choices(range(1, 8), weights=config.dayWeights)[0]
+        if day in usedDays:     # 同一天不重复排课
+            continue
+        usedDays.add(day)
+        period = rnd.choices(periods, weights=periodWeights)[0]
+        occupied.update((half, day, i) for half in semester for i in period)
+        pieces.append(f"周{DAY_NAMES[day - 1]}第{','.join(str(i) for i in period)}节")
+    if semester == "春夏" and rnd.random() < config.splitTimeRatio:
+        # 春学期和夏学期分别写出
+        return "<br>".join([f"春{piece}" for piece in pieces] + [f"夏{piece}" for piece in pieces]), occupied
+    return ";".join(pieces), occupied
+
+
+def _getExamTimeString(rnd: random.Random, config: SemesterConfig) -> Tuple[str, Set[str]]:
+    """
+    生成一门课程的考试时间字符串
+    :return: (考试时间字符串, 考试的日期集合)。没有考试时返回("", 空集合)
+    """
+    if rnd.random() >= config.examDensity:
+        return "", set()
+    exams = []
+    if rnd.random() < config.midtermRatio:
+        start, end = rnd.choice(EXAM_PERIODS)
+        exams.append(f"2025年04月{rnd.randint(14, 20):02d}日({start}-{end})")
+    start, end = rnd.choice(EXAM_PERIODS)
+    exams.append(f"2025年06月{rnd.randint(16, 25):02d}日({start}-{end})")
+    return ";".join(exams), {exam.split("(")[0] for exam in exams}
+
+
+def generateSemester(config: SemesterConfig, teacherNames: List[str] = None) -> Tuple[list, list, list]:
+    """
+    生成模拟的学期数据
+    :param config: 参数
+    :param teacherNames: 可以使用的真实教师姓名。为None时读取teacher.json
+    :return: (courses.json的内容, classes.json的内容, chosen.json的内容)
+    """
+    rnd = random.Random(config.seed)
+    if teacherNames is None:
+        teacherNames = loadTeacherNames()
+    fakeTeacherCount = [0]
+
+    def _getTeacherName():
+        if teacherNames and rnd.random() < config.teacherOverlap:
+            return rnd.choice(teacherNames)
+        fakeTeacherCount[0] += 1
+        return f"虚构教师{fakeTeacherCount[0]}"
+
+    courses = []
+    classes = []
+    occupation = []     # 每门课程的(各班级占据的时间, 考试日期)，用于挑选互不冲突的已选课程
+    for i in range(config.courseCount):
+        prefix = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rnd.randint(2, 4)))
+        courseCode = f"{prefix}{1000 + i}{rnd.choice('FGMH')}"
+        if rnd.random() < config.oldCodeRatio:
+            courseCode = f"{courseCode}（{prefix}{9000 + i}{courseCode[-1]}）"
+        courses.append({
+            "xskcdm": courseCode,
+            "kcdm": courseCode,
+            "kcmc": f"模拟课程{i}",
+            "kcxx": f"~{rnd.choice([1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0])}~",
+            "kkxy": rnd.choice(COLLEGES),
+            "kclb": rnd.choice(COURSE_SORTS),
+            "kcgs": "",
+            "kcbs": "",
+            "rdlb": "",
+            "xkkh": f"{network.XNXQ}{courseCode}",
+        })
+
+        # 同一门课程的班级一般考试时间相同
+        examTime, examDates = _getExamTimeString(rnd, config)
+        courseClasses = []
+        courseOccupation = []
+        for j in range(rnd.randint(*config.classesPerCourse)):
+            if rnd.random() < config.halfSemesterRatio:
+                semester = rnd.choice(["春", "夏"])
+            else:
+                semester = "春夏"
+            teachers = [_getTeacherName()]
+            if rnd.random() < config.sharedTeacherRatio:
+                teachers.append(_getTeacherName())
+
+            capacity = rnd.choice([30, 40, 60, 80, 120])
+            available = 0 if rnd.random() < config.fullRatio else rnd.randint(1, capacity)
+            unfiltered = int(available * rnd.uniform(*config.availabilityRatio))
+            classTime, occupied = _getClassTimeString(rnd, config, semester)
+            courseOccupation.append(occupied)
+            courseClasses.append({
+                "xkkh": f"{network.XNXQ}{courseCode}-{rnd.randint(1000000, 9999999)}-{j + 1}",
+                "jsxm": "<br>".join(teachers),
+                "xxq": semester,
+                "sksj": classTime,
+                "kssj": examTime,
+                "rs": f"{available}/{capacity}",
+                "yxrs": f"{rnd.randint(0, unfiltered)}~{unfiltered}",
+                "skdd": f"紫金港{rnd.choice('东西')}{rnd.randint(1, 7)}-{rnd.randint(101, 599)}",
+            })
+        classes.append(courseClasses)
+        occupation.append((courseOccupation, examDates))
+
+    # 已选上的课程之间不能冲突。同一天有考试也算冲突
+    chosen = []
+    occupiedTime = set()
+    occupiedExamDates = set()
+    courseIndices = list(range(config.courseCount))
+    rnd.shuffle(courseIndices)
+    for i in courseIndices:
+        if len(chosen) >= config.chosenCount:
+            break
+        courseOccupation, examDates = occupation[i]
+        if examDates & occupiedExamDates:
+            continue
+        for class_, occupied in zip(classes[i], courseOccupation):
+            if not occupied & occupiedTime:
+                chosen.append({
+                    "xkkh": class_["xkkh"],
+                    "t_kcdm": courses[i]["kcdm"],
+                    "sxbj": "1",
+                })
+                occupiedTime |= occupied
+                occupiedExamDates |= examDates
+                break
+    return courses, classes, chosen
+
+
+def writeSemester(outputDir: str, courses: list, classes: list, chosen: list):
+    """
+    把模拟的学期数据写入outputDir下的courses.json、classes.json、chosen.json
+    """
+    os.makedirs(outputDir, exist_ok=True)
+    for name, content in (("courses.json", courses), ("classes.json", classes), ("chosen.json", chosen)):
+        with open(os.path.join(outputDir, name), "w", encoding="UTF-8") as f:
+            json.dump(content, f, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="生成模拟的学期数据")
+    parser.add_argument("outputDir", help="输出目录")
+    parser.add_argument("--courses", type=int, default=300, help="课程数")
+    parser.add_argument("--min-classes", type=int, default=1, help="每门课程最少的班级数")
+    parser.add_argument("--max-classes", type=int, default=12, help="每门课程最多的班级数")
+    parser.add_argument("--half-semester-ratio", type=float, default=0.25, help="只在春学期或夏学期上课的班级比例")
+    parser.add_argument("--split-time-ratio", type=float, default=0.1, help="春夏分别写出上课时间的班级比例")
+    parser.add_argument("--exam-density", type=float, default=0.6, help="有期末考试的课程比例")
+    parser.add_argument("--teacher-overlap", type=float, default=0.8, help="教师姓名取自teacher.json的比例")
+    parser.add_argument("--min-availability-ratio", type=float, default=0.2, help="待筛选人数与余量之比的下限")
+    parser.add_argument("--max-availability-ratio", type=float, default=3.0, help="待筛选人数与余量之比的上限")
+    parser.add_argument("--chosen", type=int, default=0, help="已选上的课程数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    writeSemester(args.outputDir, *generateSemester(SemesterConfig(
+        courseCount=args.courses,
+        classesPerCourse=(args.min_classes, args.max_classes),
+        halfSemesterRatio=args.half_semester_ratio,
+        splitTimeRatio=args.split_time_ratio,
+        examDensity=args.exam_density,
+        teacherOverlap=args.teacher_overlap,
+        availabilityRatio=(args.min_availability_ratio, args.max_availability_ratio),
+        chosenCount=args.chosen,
+        seed=args.seed,
+    )))
@@ -0,0 +1,283 @@
+"""
+这个模块负责读写班级数据的快照文件。
+快照保存的是已经解析好的班级数据：上课时间位图、考试时间、余量等，按列存放，字符串统一放在字符串表里。
+快照的头部记录了classes.json内容的sha1和解析代码的版本，两者都不变时直接用mmap读取快照，不需要再解析json和各种时间字符串。
+
+文件布局（除头部外都是本机字节序，每一列都对齐到8字节）：
+    头部      MAGIC, 格式签名, 解析代码的版本, classes.json的sha1, 各部分的长度
+    字符串表  STRING_COLUMNS, 然后是utf-8编码的字符串
+    班级      CLASS_COLUMNS, 然后是上课时间位图，每个班级MASK_BYTES字节
+    考试      EXAM_COLUMNS
+    解析失败  FAILURE_COLUMNS
+"""
+from typing import *
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from Entities.Time import HALF_SEMESTER_BITS
+
+CLASS_SNAPSHOT_PATH = "classes.snapshot"
+
+MAGIC = b"ZJUCSNP2"
+# 解析班级数据的代码的版本。修改了data.py中解析班级的代码（_parseClassData、_parseClassTimeString、
+# _parseExamTimeString等）导致解析结果变化时，要把它加一，旧的快照就会被当作过期
+PARSER_VERSION = 1
+MASK_BYTES = (2 * HALF_SEMESTER_BITS + 7) // 8  # 两个半学期的上课时间位图占用的字节数
+ALIGNMENT = 8
+
+# (列名, array的类型码)。字符串列保存的是字符串表中的编号
+STRING_COLUMNS = [("offset", "q")]     # 字符串的起始位置，比字符串多一项，最后一项是总长度
+CLASS_COLUMNS = [
+    ("group", "I"),         # 班级在classes.json中属于第几门课程
+    ("classCode", "I"),     # 字符串
+    ("courseCode", "I"),    # 字符串
+    ("teacherNames", "I"),  # 字符串，原始的"jsxm"
+    ("semester", "I"),      # 字符串
+    ("classTime", "I"),     # 字符串，原始的上课时间
+    ("location", "I"),      # 字符串
+    ("examStart", "I"),     # 第一个考试在考试列中的编号
+    ("examCount", "I"),
+    ("available", "i"),
+    ("unfiltered", "i"),
+]
+EXAM_COLUMNS = [
+    ("startTime", "q"),     # 距离1970年1月1日的秒数
+    ("endTime", "q"),
+    ("noExam", "B"),
+]
+FAILURE_COLUMNS = [
+    ("classCode", "I"),     # 字符串
+    ("message", "I"),       # 字符串
+]
+
+# 本机字节序和各类型码的长度。与写入时不同的快照不能直接读取
+FORMAT_SIGNATURE = (sys.byteorder + "".join(
+    f"{typecode}{array(typecode).itemsize}"
+    for typecode in sorted({typecode for columns in (STRING_COLUMNS, CLASS_COLUMNS, EXAM_COLUMNS, FAILURE_COLUMNS)
+                            for _, typecode in columns})
+)).encode("ascii")
+# 魔数、格式签名、解析代码的版本、sha1、字符串数、字符串总字节数、课程数、班级数、考试数、解析失败数
+HEADER = struct.Struct("<8s32sI20sQQQQQQ")
+
+
+class ClassRecord(NamedTuple):
+    """
+    解析好的一个班级。课程对象和筛选状态要到加载时才确定，这里只保存与courses.json和已选课程无关的部分
+    """
+    group: int
+    classCode: str
+    courseCode: str
+    teacherNames: str
+    semester: str
+    classTime: str
+    location: str
+    classTimeMask: int
+    examTimes: List[Tuple[int, int, bool]]  # [(开始时间, 结束时间, 是否没有考试), ...]，时间为距离1970年1月1日的秒数
+    available: int
+    unfiltered: int
+
+
+def getSourceDigest(source: bytes) -> bytes:
+    return hashlib.sha1(source).digest()
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _getLayout(counts: Dict[str, int]) -> Tuple[Dict[Tuple[str, str], Tuple[int, str, int]], int]:
+    """
+    计算各列在文件中的位置
+    :param counts: {"strings": 字符串数, "stringBytes": 字符串总字节数, "classes": 班级数, "exams": 考试数, "failures": 解析失败数}
+    :return: ({(部分, 列名): (起始位置, 类型码, 长度)}, 文件总长度)
+    """
+    layout = {}
+    offset = _align(HEADER.size)
+    parts = [
+        ("strings", STRING_COLUMNS + [("data", "B")], [counts["strings"] + 1, counts["stringBytes"]]),
+        ("classes", CLASS_COLUMNS + [("classTimeMask", "B")], [counts["classes"]] * len(CLASS_COLUMNS)
+         + [counts["classes"] * MASK_BYTES]),
+        ("exams", EXAM_COLUMNS, [counts["exams"]] * len(EXAM_COLUMNS)),
+        ("failures", FAILURE_COLUMNS, [counts["failures"]] * len(FAILURE_COLUMNS)),
+    ]
+    for part, columns, lengths in parts:
+        for (name, typecode), length in zip(columns, lengths):
+            layout[(part, name)] = (offset, typecode, length)
+            offset = _align(offset + length * array(typecode).itemsize)
+    return layout, offset
+
+
+def writeClassSnapshot(path: str, digest: bytes, groupCount: int, records: List[ClassRecord],
+                       failures: List[Tuple[str, str]]):
+    """
+    写入快照。先写临时文件再替换，写到一半失败也不会留下损坏的快照
+    :param digest: classes.json的sha1
+    :param groupCount: classes.json中的课程数
+    :param records: 解析好的班级
+    :param failures: 解析失败的班级 [(班级代码, 错误信息), ...]
+    """
+    stringIds: Dict[str, int] = {}
+    stringData = bytearray()
+    stringOffsets = array("q", [0])
+
+    def _getStringId(string: str) -> int:
+        stringId = stringIds.get(string)
+        if stringId is None:
+            stringId = stringIds[string] = len(stringIds)
+            stringData.extend(string.encode("utf-8"))
+            stringOffsets.append(len(stringData))
+        return stringId
+
+    columns: Dict[Tuple[str, str], array] = {}
+    for part, partColumns in (("classes", CLASS_COLUMNS), ("exams", EXAM_COLUMNS), ("failures", FAILURE_COLUMNS)):
+        for name, typecode in partColumns:
+            columns[(part, name)] = array(typecode)
+    masks = bytearray()
+    for record in records:
+        values = {
+            "group": record.group,
+            "classCode": _getStringId(record.classCode),
+            "courseCode": _getStringId(record.courseCode),
+            "teacherNames": _getStringId(record.teacherNames),
+            "semester": _getStringId(record.semester),
+            "classTime": _getStringId(record.classTime),
+            "location": _getStringId(record.location),
+            "examStart": len(columns[("exams", "startTime")]),
+            "examCount": len(record.examTimes),
+            "available": record.available,
+            "unfiltered": record.unfiltered,
+        }
+        for name, _ in CLASS_COLUMNS:
+            columns[("classes", name)].append(values[name])
+        masks.extend(record.classTimeMask.to_bytes(MASK_BYTES, "little"))
+        for startTime, endTime, noExam in record.examTimes:
+            columns[("exams", "startTime")].append(startTime)
+            columns[("exams", "endTime")].append(endTime)
+            columns[("exams", "noExam")].append(noExam)
+    for classCode, message in failures:
+        columns[("failures", "classCode")].append(_getStringId(classCode))
+        columns[("failures", "message")].append(_getStringId(message))
+    columns[("strings", "offset")] = stringOffsets
+    columns[("strings", "data")] = array("B", stringData)
+    columns[("classes", "classTimeMask")] = array("B", masks)
+
+    counts = {"strings": len(stringIds), "stringBytes": len(stringData), "classes": len(records),
+              "exams": len(columns[("exams", "startTime")]), "failures": len(failures)}
+    layout, size = _getLayout(counts)
+    tempPath = path + ".tmp"
+    with open(tempPath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_SIGNATURE, PARSER_VERSION, digest, counts["strings"],
+                            counts["stringBytes"], groupCount, counts["classes"], counts["exams"], counts["failures"]))
+        for key, (offset, _, _) in sorted(layout.items(), key=lambda item: item[1][0]):
+            f.write(b"\0" * (offset - f.tell()))
+            columns[key].tofile(f)
+        f.write(b"\0" * (size - f.tell()))
+    os.replace(tempPath, path)
+
+
+class ClassSnapshot:
+    def __init__(self, path: str, digest: bytes):
+        """
+        用mmap打开快照。快照不存在、已经过期或者格式不对时抛出ValueError或OSError，调用方应当改为解析json。
+        各列直接在映射的内存上按类型码读取，只有用到的字符串才会被解码。用完后要调用close()
+        :param path: 快照文件路径
+        :param digest: 当前classes.json的sha1
+        """
+        self.file = open(path, "rb")
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+        self.view = memoryview(self.buffer)
+        try:
+            self._open(digest)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self, digest: bytes):
+        if len(self.buffer) < HEADER.size:
+            raise ValueError("快照文件不完整")
+        (magic, signature, parserVersion, snapshotDigest, stringCount, stringBytes,
+         self.groupCount, self.classCount, examCount, self.failureCount) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or signature.rstrip(b"\0") != FORMAT_SIGNATURE:
+            raise ValueError("快照格式不匹配")
+        if parserVersion != PARSER_VERSION or snapshotDigest != digest:
+            raise ValueError("快照已经过期")
+        layout, size = _getLayout({"strings": stringCount, "stringBytes": stringBytes, "classes": self.classCount,
+                                   "exams": examCount, "failures": self.failureCount})
+        if len(self.buffer) != size:
+            raise ValueError("快照文件不完整")
+        self.columns: Dict[Tuple[str, str], memoryview] = {}
+        for key, (offset, typecode, length) in layout.items():
+            self.columns[key] = self.view[offset:offset + length * array(typecode).itemsize].cast(typecode)
+        self.strings: List[Union[str, None]] = [None] * stringCount
+
+    def close(self):
+        # 先释放所有指向映射内存的memoryview，否则mmap无法关闭
+        for column in getattr(self, "columns", {}).values():
+            column.release()
+        self.columns = {}
+        self.view.release()
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def getString(self, stringId: int) -> str:
+        string = self.strings[stringId]
+        if string is None:
+            offsets = self.columns[("strings", "offset")]
+            string = self.strings[stringId] = bytes(
+                self.columns[("strings", "data")][offsets[stringId]:offsets[stringId + 1]]).decode("utf-8")
+        return string
+
+    def getColumn(self, part: str, name: str) -> memoryview:
+        """
+        获取一列数据
+        :param part: "classes", "exams"或"failures"
+        :param name: 列名，见CLASS_COLUMNS、EXAM_COLUMNS、FAILURE_COLUMNS
+        """
+        return self.columns[(part, name)]
+
+    def getClassTimeMask(self, i: int) -> int:
+        return int.from_bytes(self.columns[("classes", "classTimeMask")][i * MASK_BYTES:(i + 1) * MASK_BYTES],
+                              "little")
+
+    def __len__(self):
+        return self.classCount
+
+    def getRecord(self, i: int) -> ClassRecord:
+        """
+        读取第i个班级
+        """
+        columns = self.columns
+        examStart = columns[("classes", "examStart")][i]
+        exams = range(examStart, examStart + columns[("classes", "examCount")][i])
+        return ClassRecord(
+            columns[("classes", "group")][i],
+            self.getString(columns[("classes", "classCode")][i]),
+            self.getString(columns[("classes", "courseCode")][i]),
+            self.getString(columns[("classes", "teacherNames")][i]),
+            self.getString(columns[("classes", "semester")][i]),
+            self.getString(columns[("classes", "classTime")][i]),
+            self.getString(columns[("classes", "location")][i]),
+            self.getClassTimeMask(i),
+            [(columns[("exams", "startTime")][j], columns[("exams", "endTime")][j],
+              bool(columns[("exams", "noExam")][j])) for j in exams],
+            columns[("classes", "available")][i],
+            columns[("classes", "unfiltered")][i],
+        )
+
+    def getFailures(self) -> List[Tuple[str, str]]:
+        classCodes = self.columns[("failures", "classCode")]
+        messages = self.columns[("failures", "message")]
+        return [(self.getString(classCodes[i]), self.getString(messages[i])) for i in range(self.failureCount)]
@@ -4,39 +4,115 @@
 """
 import json
 from typing import *
+from collections import OrderedDict
 from Entities import Course, Class, Time, Constants, ClassTable
+from Entities.CancellationToken import CancellationToken, OperationCancelled
 import re
+import datetime
+import time
 import network
 import os
+import classSnapshot
+import jsonStream
 
-courseData = []
 classData = []
 
-with open("teacher.json", "r", encoding="utf-8") as f:
-    teacher_data = json.load(f)
-
+TEACHER_DATA_PATH = "teacher.json"
+# teacher.json的紧凑形式。只保留用得到的教师名、学院名和评分，每行一个教师，用制表符分隔。
+# 第一行记录生成它时teacher.json的大小和修改时间，teacher.json变化后会重新生成
+TEACHER_INDEX_PATH = "teacher.idx"
 
 NULL_TEACHER_SCORE = -1 # 无法查到教师评分时的返回值。应当小于所有可能的评分值
 teacherRatePool = {}  # 用于缓存教师评分。避免重复查找
+# 教师名 -> [(学院名, 评分), ...]。同名的教师按照在teacher.json中的顺序排列。第一次查询评分时才建立
+teacherRateIndex: Union[Dict[str, List[Tuple[str, float]]], None] = None
+
+
+def _getTeacherDataFingerprint() -> str:
+    stat = os.stat(TEACHER_DATA_PATH)
+    return f"{stat.st_size} {stat.st_mtime_ns}"
+
 
-def getTeacherRate(teacherName: str) -> float:
+def _loadTeacherRateIndexFromJson() -> Dict[str, List[Tuple[str, float]]]:
+    """
+    解析teacher.json，建立教师评分索引
+    """
+    with open(TEACHER_DATA_PATH, "r", encoding="utf-8") as f:
+        teacherData = json.load(f)
+    collegeNames = {college["id"]: college["name"] for college in teacherData["colleges"]}
+    index: Dict[str, List[Tuple[str, float]]] = {}
+    for teacher in teacherData["teachers"]:
+        try:
+            rate = float(teacher["rate"])
+        except:     # 查不到、分数为N/A，这样
+            rate = NULL_TEACHER_SCORE
+        index.setdefault(teacher["name"], []).append((collegeNames.get(teacher.get("xy"), ""), rate))
+    return index
+
+
+def _loadTeacherRateIndexFromIdx(fingerprint: str) -> Union[Dict[str, List[Tuple[str, float]]], None]:
+    """
+    读取teacher.idx。文件不存在或者已经过期时返回None
+    """
+    if not os.path.exists(TEACHER_INDEX_PATH):
+        return None
+    with open(TEACHER_INDEX_PATH, "r", encoding="utf-8") as f:
+        if f.readline().rstrip("\n") != fingerprint:
+            return None
+        index: Dict[str, List[Tuple[str, float]]] = {}
+        for line in f:
+            name, collegeName, rate = line.rstrip("\n").split("\t")
+            index.setdefault(name, []).append((collegeName, float(rate)))
+    return index
+
+
+def _saveTeacherRateIndexToIdx(index: Dict[str, List[Tuple[str, float]]], fingerprint: str):
+    try:
+        with open(TEACHER_INDEX_PATH, "w", encoding="utf-8") as f:
+            f.write(fingerprint + "\n")
+            for name, records in index.items():
+                for collegeName, rate in records:
+                    f.write(f"{name}\t{collegeName}\t{rate}\n")
+    except OSError:
+        pass    # 写不了缓存文件也不影响使用，下次启动再解析teacher.json就是了
+
+
+def getTeacherRateIndex() -> Dict[str, List[Tuple[str, float]]]:
+    """
+    获取教师评分索引。优先读取teacher.idx，读取不到时解析teacher.json并生成teacher.idx
+    :return: 教师名 -> [(学院名, 评分), ...]
+    """
+    global teacherRateIndex
+    if teacherRateIndex is None:
+        fingerprint = _getTeacherDataFingerprint()
+        index = _loadTeacherRateIndexFromIdx(fingerprint)
+        if index is None:
+            index = _loadTeacherRateIndexFromJson()
+            _saveTeacherRateIndexToIdx(index, fingerprint)
+        teacherRateIndex = index
+    return teacherRateIndex
+
+
+def getTeacherRate(teacherName: str, academy: str = "") -> float:
     """
     获取老师在査老师上的评分。査老师的数据已经被爬取并保存在teacher.json中
     :param teacherName: 教师名
+    :param academy: 开课学院。有同名的教师时，优先取这个学院的教师的评分；没有这个学院的同名教师时取第一个
     :return: 评分。如果查不到，返回NULL_TEACHER_SCORE
     """
-    if teacherName in teacherRatePool:
-        return teacherRatePool[teacherName]
-    for teacher in teacher_data["teachers"]:
-        if teacher["name"] == teacherName:
-            try:
-                teacherRatePool[teacherName] = float(teacher["rate"])
-                return float(teacher["rate"])
-            except:     # 查不到、分数为N/A，这样
-                teacherRatePool[teacherName] = NULL_TEACHER_SCORE
-                return NULL_TEACHER_SCORE
-    teacherRatePool[teacherName] = NULL_TEACHER_SCORE
-    return NULL_TEACHER_SCORE
+    if (teacherName, academy) in teacherRatePool:
+        return teacherRatePool[(teacherName, academy)]
+    records = getTeacherRateIndex().get(teacherName)
+    if not records:
+        rate = NULL_TEACHER_SCORE
+    else:
+        rate = records[0][1]
+        for collegeName, collegeRate in records:
+            if collegeName == academy:
+                rate = collegeRate
+                break
+    teacherRatePool[(teacherName, academy)] = rate
+    return rate
 
 
 # class ClassSet:
@@ -46,7 +122,64 @@ def getTeacherRate(teacherName: str) -> float:
 #     """
 #     def __init__(self):
 #         self.classes = deepcopy(all_class_set)
-courseObjectPool = []
+courseObjectPool: Dict[int, Course.Course] = {}    # 课程键 -> 课程对象。同一门课程只创建一个对象
+
+
+class CourseRecord(NamedTuple):
+    """
+    courses.json中一条课程记录里用得到的字段，在加载时就解析好
+    """
+    key: int
+    courseCode: str
+    courseName: str
+    credit: float
+    courseType: Tuple[str, str, str, str]   # (课程类别, 课程归属, 课程标识, 认定类别)
+    academy: str
+    queryCode: str      # 查询班级数据时使用的课程代码"kcdm"
+    selectionCode: str  # 选课课号"xkkh"
+
+    def getQuery(self) -> Dict[str, str]:
+        """
+        :return: network.fetchClassDetail需要的课程记录字段
+        """
+        return {"kcdm": self.queryCode, "xkkh": self.selectionCode}
+
+    def createCourse(self) -> Course.Course:
+        return Course.Course(
+            self.courseCode,
+            self.courseName,
+            self.credit,
+            Course.CourseType(*self.courseType),
+            self.academy,
+            Constants.CourseStatus.NOT_SELECTED
+            # Constants.CourseStatus.SELECTED if int(target["kcxzzt"]) else Constants.CourseStatus.NOT_SELECTED  # 课程选择状态
+        )
+
+
+courseRecords: List[CourseRecord] = []  # courses.json中各条记录解析后的结果，顺序相同。由loadCourseData()填充
+courseRecordByKey: Dict[int, CourseRecord] = {}     # 课程键 -> courseRecords中这门课程的第一条记录
+
+
+def getCourseRecordFromJson(course: Dict) -> CourseRecord:
+    """
+    解析courses.json中的一条课程记录
+    """
+    return CourseRecord(
+        Course.Course.getCourseKey(course["xskcdm"]),
+        course["xskcdm"],  # 课程代码
+        course["kcmc"],  # 课程名称
+        float(re.findall(r"~(.*?)~", course["kcxx"])[0]),  # 学分
+        (
+            course.get("kclb", ""),  # 课程类别
+            course.get("kcgs", ""),  # 课程归属
+            course.get("kcbs", ""),  # 课程标识
+            course.get("rdlb", "")  # 认定类别
+        ),
+        course["kkxy"],  # 开课学院
+        course.get("kcdm", ""),
+        course.get("xkkh", "")
+    )
+
 
 def getCourseFromCourseCode(courseCode: str) -> Course.Course:
     """
@@ -54,46 +187,71 @@ def getCourseFromCourseCode(courseCode: str) -> Course.Course:
     :param courseCode: 课程代码
     :return: 课程信息(courseCode, courseName, credit, courseType: CourseType, academy, status)
     """
+    key = Course.Course.findCourseKey(courseCode)
+    if key in courseObjectPool:
+        return courseObjectPool[key]
 
-    for course in courseObjectPool:
-        if Course.Course.isEqualCourseCode(courseCode, course.courseCode):
-            return course
-
-    target: Union[Dict, None] = None
-    for course in courseData:
-        if Course.Course.isEqualCourseCode(courseCode, course["xskcdm"]):
-            target = course
-            break
+    record: Union[CourseRecord, None] = courseRecordByKey.get(key)
 
-    if target is None:
+    if record is None:
         raise ValueError(f"未找到课程代码匹配的课程'{courseCode}'")
 
-    courseType = Course.CourseType(
-        target.get("kclb", ""),  # 课程类别
-        target.get("kcgs", ""),  # 课程归属
-        target.get("kcbs", ""),  # 课程标识
-        target.get("rdlb", "")  # 认定类别
-    )
-    course = Course.Course(
-        target["xskcdm"],  # 课程代码
-        target["kcmc"],  # 课程名称
-        float(re.findall(r"~(.*?)~", target["kcxx"])[0]),  # 学分
-        courseType,  # 课程类别
-        target["kkxy"],  # 开课学院
-        Constants.CourseStatus.NOT_SELECTED
-        # Constants.CourseStatus.SELECTED if int(target["kcxzzt"]) else Constants.CourseStatus.NOT_SELECTED  # 课程选择状态
-    )
-    courseObjectPool.append(course)
+    course = record.createCourse()
+    courseObjectPool[key] = course
     return course
 
 
+# 时间字符串的解析缓存。很多班级的上课时间、考试时间字符串相同，相同的字符串只解析一次，并且共享同一个时间对象。
+# 缓存返回的时间对象是共享的，所以ClassTime和ExamTime创建后都不可修改
+PARSE_CACHE_SIZE = 4096     # 每个缓存最多保存多少个结果。超出时淘汰最久没有用到的结果
+_classTimeCache: OrderedDict = OrderedDict()    # (时间字符串, 学期字符串) -> ClassTime
+_examTimeListCache: OrderedDict = OrderedDict()     # 考试时间字符串 -> (ExamTime, ...)
+_examTimeCache: OrderedDict = OrderedDict()     # (开始时间, 结束时间, 是否没有考试) -> ExamTime。时间为距离EXAM_TIME_EPOCH的秒数
+parseCacheStats = {name: {"hits": 0, "misses": 0} for name in ("classTime", "examTimeList", "examTime")}
+EXAM_TIME_EPOCH = datetime.datetime(1970, 1, 1)  # 快照和_examTimeCache中的考试时间都是距离这个时间的秒数
+EXAM_TIME_PATTERN = re.compile(r"(.*?)年(.*?)月(.*?)日\((.*?):(.*?)-(.*?):(.*?)\)")
+
+
+def clearParseCache():
+    """
+    清空时间字符串的解析缓存和命中统计
+    """
+    for cache in (_classTimeCache, _examTimeListCache, _examTimeCache):
+        cache.clear()
+    for stats in parseCacheStats.values():
+        stats["hits"] = 0
+        stats["misses"] = 0
+
+
+def _getCached(cache: OrderedDict, name: str, key, factory: Callable[[], Any]):
+    """
+    从缓存中取出结果，没有时调用factory()生成并放入缓存
+    :param name: parseCacheStats中的名字
+    """
+    result = cache.get(key)
+    if result is not None:
+        parseCacheStats[name]["hits"] += 1
+        cache.move_to_end(key)
+        return result
+    parseCacheStats[name]["misses"] += 1
+    result = cache[key] = factory()
+    if len(cache) > PARSE_CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
+
+
 def getClassTimeFromString(time: str, semester) -> Time.ClassTime:
     """
-    从字符串中解析出时间
+    从字符串中解析出时间。结果会被缓存，相同的字符串返回同一个时间对象
     :param time: 时间字符串 "周一第3,4,5节;周二第9节;周三第1,2节"
     :param semester: 学期字符串 "春夏"
     :return: 时间对象
     """
+    return _getCached(_classTimeCache, "classTime", (time, semester),
+                      lambda: _parseClassTimeString(time, semester))
+
+
+def _parseClassTimeString(time: str, semester) -> Time.ClassTime:
     # print("ClassTime:", time)
     if time in ["待定", "--", ""]:
         return Time.ClassTime([], [])
@@ -150,40 +308,73 @@ def getClassTimeFromString(time: str, semester) -> Time.ClassTime:
 
 def getExamTimeListFromString(time: str) -> List[Time.ExamTime]:
     """
-    从字符串中解析出考试时间
+    从字符串中解析出考试时间。结果会被缓存，相同的字符串返回相同的考试时间对象
     :param time: 时间字符串 "2025年04月12日(14:00-16:00);2025年06月13日(08:00-10:00)"。若没有考试，则time输入""
     :return: 考试时间对象
     """
-    import datetime
+    return list(_getCached(_examTimeListCache, "examTimeList", time, lambda: _parseExamTimeString(time)))
+
+
+def _parseExamTimeString(time: str) -> Tuple[Time.ExamTime, ...]:
     # print("ExamTime", time)
     if time in ["待定", "--", ""]:
-        return [Time.ExamTime(datetime.datetime(1970, 1, 1), datetime.datetime(1970, 1, 1), True)]
+        return (getExamTime(0, 0, True),)
     time = time.replace("<br>", ";").split(";")
     timeList = []
     for exam in time:
-        # 用re.findall提取时间
+        # 用正则表达式提取时间
         (
             year, month, day,
             start_hour, start_minute,
             end_hour, end_minute
-        ) = re.findall(r"(.*?)年(.*?)月(.*?)日\((.*?):(.*?)-(.*?):(.*?)\)", exam)[0]
+        ) = EXAM_TIME_PATTERN.findall(exam)[0]
         # 转换为datetime对象
         startTime = datetime.datetime(int(year), int(month), int(day), int(start_hour), int(start_minute))
         endTime = datetime.datetime(int(year), int(month), int(day), int(end_hour), int(end_minute))
-        timeList.append(Time.ExamTime(startTime, endTime))
+        timeList.append(getExamTime(int((startTime - EXAM_TIME_EPOCH).total_seconds()),
+                                    int((endTime - EXAM_TIME_EPOCH).total_seconds())))
 
-    return timeList
+    return tuple(timeList)
+
+
+def getExamTime(startTime: int, endTime: int, noExam: bool = False) -> Time.ExamTime:
+    """
+    获取考试时间对象。相同的考试时间返回同一个对象
+    :param startTime: 开始时间，距离EXAM_TIME_EPOCH的秒数
+    :param endTime: 结束时间，距离EXAM_TIME_EPOCH的秒数
+    :param noExam: 是否没有考试
+    """
+    return _getCached(_examTimeCache, "examTime", (startTime, endTime, noExam), lambda: Time.ExamTime(
+        EXAM_TIME_EPOCH + datetime.timedelta(seconds=startTime),
+        EXAM_TIME_EPOCH + datetime.timedelta(seconds=endTime),
+        noExam
+    ))
 
 
 def loadCourseData():
     """
-    从本地json文件中加载课程数据
+    从本地json文件中加载课程数据。
+    课程记录逐条读取，读到一条就解析一条：课程代码解析为课程键，学分等字段解析为CourseRecord，之后的查找和过滤都直接使用。
+    原始的json记录不保留。无法解析的记录会被跳过
     :return:
     """
-    courseData.clear()
-    if os.path.exists("courses.json"):
-        with open("courses.json", "r", encoding="utf-8") as f:
-            courseData.extend(json.load(f))
+    courseRecords.clear()
+    courseRecordByKey.clear()
+    courseObjectPool.clear()    # 旧的课程对象来自旧的课程记录
+    if not os.path.exists("courses.json"):
+        return
+    for course in jsonStream.iterJsonArrayFile("courses.json"):
+        try:
+            record = getCourseRecordFromJson(course)
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+        courseRecords.append(record)
+    # 后面的记录可能把前面记录的新旧两种代码合并成同一个键，所以全部读完后再按最终的键建立索引
+    for i, record in enumerate(courseRecords):
+        key = Course.Course.getCourseKey(record.courseCode)
+        if key != record.key:
+            record = courseRecords[i] = record._replace(key=key)
+        courseRecordByKey.setdefault(key, record)
 
 allClassSet = []
 
@@ -196,68 +387,286 @@ allClassSet = []
 5. 接下来调用loadClassData()，加载班级数据。这个过程中需要正确填充status属性。之后就可以获取班级对象了。
 6. 将已选的课程对象插入classTable中，然后开始正式执行选课算法。
 """
-def loadClassData(doubleVar):
+def getEnrollmentFromJson(class_: dict) -> Tuple[int, int]:
+    """
+    从zdbk返回的班级数据中解析余量和待筛选人数
+    :param class_: json格式的班级数据
+    :return: (余量, 待筛选人数)
+    """
+    return int(class_["rs"].split("/")[0]), int(class_["yxrs"].split("~")[1])
+
+
+LOAD_PROGRESS_INTERVAL = 0.1    # 加载班级时每隔多少秒更新一次进度条
+
+
+class ClassLoadFailure(NamedTuple):
+    """
+    一个没能加载的班级
+    """
+    classCode: str
+    stage: str      # "parse": 解析classes.json时出错；"create": 创建班级对象时出错，例如在courses.json中找不到课程
+    message: str
+
+
+classLoadFailures: List[ClassLoadFailure] = []  # 上一次loadClassData中没能加载的班级
+
+
+def _parseClassData(groups: List[List[Dict]], failures: List[ClassLoadFailure]) -> Iterator[classSnapshot.ClassRecord]:
+    """
+    逐个解析classes.json中的班级。解析失败的班级不返回，记入failures。
+    解析结果会保存在快照中，这里或者各时间字符串的解析结果有变化时，要把classSnapshot.PARSER_VERSION加一
+    :param groups: classes.json的内容，每门课程一个列表
+    :param failures: 解析失败的班级
+    """
+    for group, course in enumerate(groups):
+        for class_ in course:
+            try:
+                available, unfiltered = getEnrollmentFromJson(class_)
+                yield classSnapshot.ClassRecord(
+                    group,
+                    class_["xkkh"],
+                    re.findall(r"\)-(.*?)-", class_["xkkh"])[0],
+                    class_["jsxm"],
+                    class_["xxq"],
+                    class_["sksj"],
+                    class_["skdd"],
+                    getClassTimeFromString(class_["sksj"], class_["xxq"]).mask,
+                    [(int((examTime.startTime - EXAM_TIME_EPOCH).total_seconds()),
+                      int((examTime.endTime - EXAM_TIME_EPOCH).total_seconds()),
+                      examTime.noExam)
+                     for examTime in getExamTimeListFromString(class_.get("kssj", ""))],
+                    available,
+                    unfiltered
+                )
+            except Exception as e:
+                failures.append(ClassLoadFailure(str(class_.get("xkkh")), "parse", str(e)))
+
+
+def _createClass(record: classSnapshot.ClassRecord, status: str) -> Class.Class:
+    """
+    用解析好的班级数据创建班级对象
+    """
+    return Class.Class(
+        record.classCode,
+        getCourseFromCourseCode(record.courseCode),
+        record.teacherNames.split("<br>"),
+        record.semester,
+        # 从快照读取时没有解析过时间字符串，直接用位图创建时间对象，同样放进缓存里共享
+        _getCached(_classTimeCache, "classTime", (record.classTime, record.semester),
+                   lambda: Time.ClassTime.fromMask(record.classTimeMask)),
+        [getExamTime(startTime, endTime, noExam) for startTime, endTime, noExam in record.examTimes],
+        record.available,
+        record.unfiltered,
+        status,
+        record.classTime,
+        record.semester,
+        record.location
+    )
+
+
+def loadClassData(doubleVar, cancelToken: CancellationToken = None):
     """
-    从本地json文件中加载班级数据
+    从本地json文件中加载班级数据。
+    解析好的班级保存在快照文件中（见classSnapshot.py），classes.json没有变化时直接读取快照，不再解析json，
+    此时classData保持为空。
+    班级逐个解析、逐个创建，耗时与班级数成正比。没能加载的班级记入classLoadFailures
     :param doubleVar: 用于显示进度条
+    :param cancelToken: 取消令牌。取消时清空已经加载的班级，然后抛出OperationCancelled
     """
     classData.clear()
-    with open("classes.json", "r", encoding="utf-8") as f:
-        classData.extend(json.load(f))
+    with open("classes.json", "rb") as f:
+        source = f.read()
+    digest = classSnapshot.getSourceDigest(source)
 
-    confirmedClassCodeSet = []
-    toBeFilteredClassCodeSet = []
+    confirmedClassCodeSet = set()
+    toBeFilteredClassCodeSet = set()
     for class_ in network.getChosenClasses():
         if class_["sxbj"] == "1":
-            confirmedClassCodeSet.append(class_["xkkh"])
+            confirmedClassCodeSet.add(class_["xkkh"])
             try:
                 # 标记课程状态为已选
                 getCourseFromCourseCode(class_["t_kcdm"]).status = Constants.CourseStatus.SELECTED
             except ValueError:
                 pass    # 已经选上的课，在courses.json中找不到对应的课程。例如形势与政策I，秋学期选的，春学期找不到。
         else:
-            toBeFilteredClassCodeSet.append(class_["xkkh"])
+            toBeFilteredClassCodeSet.add(class_["xkkh"])
+
+    try:
+        snapshot = classSnapshot.ClassSnapshot(classSnapshot.CLASS_SNAPSHOT_PATH, digest)
+    except (OSError, ValueError):
+        snapshot = None     # 没有快照或者快照已经过期，解析json
+    classLoadFailures.clear()
+    if snapshot is None:
+        classData.extend(json.loads(source))
+        total = len(classData)
+        records = []
+        recordIterator = _parseClassData(classData, classLoadFailures)
+    else:
+        total = snapshot.groupCount
+        classLoadFailures.extend(ClassLoadFailure(classCode, "parse", message)
+                                 for classCode, message in snapshot.getFailures())
+        recordIterator = (snapshot.getRecord(i) for i in range(len(snapshot)))
 
     allClassSet.clear()
-    total = len(classData)
-    for i, course in enumerate(classData):
-        doubleVar.set(i / total)
-        for class_ in course:
+    try:
+        group = -1
+        lastProgressTime = float('-inf')
+        for record in recordIterator:
+            if record.group != group:
+                group = record.group
+                if cancelToken is not None and cancelToken.isCancelled():
+                    # 只加载了一部分的班级不能使用
+                    allClassSet.clear()
+                    buildClassIndex()
+                    raise OperationCancelled()
+                # doubleVar属于界面线程，限制更新频率
+                now = time.perf_counter()
+                if now - lastProgressTime >= LOAD_PROGRESS_INTERVAL:
+                    lastProgressTime = now
+                    doubleVar.set(group / total)
+            if snapshot is None:
+                records.append(record)
+
+            if record.classCode in confirmedClassCodeSet:
+                class_status = Constants.ClassStatus.CONFIRMED
+            elif record.classCode in toBeFilteredClassCodeSet:
+                class_status = Constants.ClassStatus.TO_BE_FILTERED
+            else:
+                class_status = Constants.ClassStatus.NOT_SELECTED
             try:
-                if class_["xkkh"] in confirmedClassCodeSet:
-                    class_status = Constants.ClassStatus.CONFIRMED
-                elif class_["xkkh"] in toBeFilteredClassCodeSet:
-                    class_status = Constants.ClassStatus.TO_BE_FILTERED
-                else:
-                    class_status = Constants.ClassStatus.NOT_SELECTED
-
-                available = int(class_["rs"].split("/")[0])
-                unfiltered = int(class_["yxrs"].split("~")[1])
-
-                allClassSet.append(
-                    Class.Class(
-                        class_["xkkh"],
-                        getCourseFromCourseCode(re.findall(r"\)-(.*?)-", class_["xkkh"])[0]),
-                        class_["jsxm"].split("<br>"),
-                        class_["xxq"],
-                        getClassTimeFromString(class_["sksj"], class_["xxq"]),
-                        getExamTimeListFromString(class_.get("kssj", "")),
-                        available,
-                        unfiltered,
-                        class_status,
-                        class_["sksj"],
-                        class_["xxq"],
-                        class_["skdd"]
-                    )
-                )
+                allClassSet.append(_createClass(record, class_status))
             except Exception as e:
-                print(f"Failed({e}) to create class", class_["xkkh"])
+                classLoadFailures.append(ClassLoadFailure(record.classCode, "create", str(e)))
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+    if snapshot is None:
+        try:
+            classSnapshot.writeClassSnapshot(
+                classSnapshot.CLASS_SNAPSHOT_PATH, digest, total, records,
+                [(failure.classCode, failure.message) for failure in classLoadFailures if failure.stage == "parse"]
+            )
+        except OSError:
+            pass    # 写不了快照也不影响使用，下次再解析json
 
+    buildConflictIndex()
+    buildClassIndex()
 
 
     # print(f"Succeeded to load all classes({len(all_class_set)} classes in total)")
 
 
+def buildConflictIndex():
+    """
+    为allClassSet中的所有班级建立冲突索引。
+    每个班级被分配一个稠密的整数编号class_.index，
+    class_.conflictBits是一个位图，第i位为1表示这个班级与编号为i的班级冲突。
+    这样Class.isConflict就只需要查一次表，而不用每次都比较上课时间和考试时间。
+    """
+    # 按上课时间的每一位、考试时间、课程代码分别把班级编号归组
+    timeBitToClassBits: Dict[int, int] = {}
+    examToClassBits: Dict[Tuple, int] = {}
+    examToExamTime: Dict[Tuple, Time.ExamTime] = {}
+    courseKeyToClassBits: Dict[int, int] = {}
+    for i, class_ in enumerate(allClassSet):
+        class_.index = i
+        classBit = 1 << i
+        mask = class_.classTime.mask
+        while mask:
+            lowBit = mask & -mask
+            timeBitToClassBits[lowBit] = timeBitToClassBits.get(lowBit, 0) | classBit
+            mask ^= lowBit
+        for examTime in class_.examTimeList:
+            if examTime.noExam:
+                continue
+            key = (examTime.startTime, examTime.endTime)
+            examToClassBits[key] = examToClassBits.get(key, 0) | classBit
+            examToExamTime[key] = examTime
+        courseKey = class_.course.key
+        courseKeyToClassBits[courseKey] = courseKeyToClassBits.get(courseKey, 0) | classBit
+
+    # 不同的考试时间段数量很少，两两比较即可
+    examToConflictBits: Dict[Tuple, int] = {}
+    for key, examTime in examToExamTime.items():
+        conflictBits = 0
+        for otherKey, otherExamTime in examToExamTime.items():
+            if examTime.isOverlapped(otherExamTime):
+                conflictBits |= examToClassBits[otherKey]
+        examToConflictBits[key] = conflictBits
+
+    for class_ in allClassSet:
+        conflictBits = 0
+        mask = class_.classTime.mask
+        while mask:
+            lowBit = mask & -mask
+            conflictBits |= timeBitToClassBits[lowBit]
+            mask ^= lowBit
+        for examTime in class_.examTimeList:
+            if not examTime.noExam:
+                conflictBits |= examToConflictBits[(examTime.startTime, examTime.endTime)]
+        # 同一个课程的不同班级之间不会冲突
+        class_.conflictBits = conflictBits & ~courseKeyToClassBits[class_.course.key]
+
+
+# 以下是allClassSet的二级索引，由buildClassIndex()建立。用于代替对allClassSet的线性扫描
+# 各索引内的班级都按照其在allClassSet中的顺序排列，和filterClassSetByCondition的结果顺序一致
+classIndexByCourseKey: Dict[int, List[Class.Class]] = {}   # 课程键 -> 班级列表
+classIndexByClassCode: Dict[str, Class.Class] = {}  # 班级代码 -> 班级
+
+
+def buildClassIndex():
+    """
+    为allClassSet建立二级索引。调用前班级应当已经由buildConflictIndex()编号
+    """
+    classIndexByCourseKey.clear()
+    classIndexByClassCode.clear()
+    for class_ in allClassSet:
+        classIndexByCourseKey.setdefault(class_.course.key, []).append(class_)
+        classIndexByClassCode.setdefault(class_.classCode, class_)
+
+
+def getClassesOfCourse(courseCode: str) -> List[Class.Class]:
+    """
+    获取某门课程的所有班级。等价于
+    filterClassSetByCondition(lambda x: Course.Course.isEqualCourseCode(courseCode, x.course.courseCode))
+    :param courseCode: 课程代码。新版、旧版、"新版（旧版）"形式都可以
+    :return: 班级列表
+    """
+    return list(classIndexByCourseKey.get(Course.Course.findCourseKey(courseCode), []))
+
+
+def getClassByClassCode(classCode: str) -> Union[Class.Class, None]:
+    """
+    通过班级代码获取班级
+    :param classCode: 班级代码
+    :return: 班级对象。找不到时返回None
+    """
+    return classIndexByClassCode.get(classCode)
+
+
+def updateClassEnrollment(classDetail: List[dict]) -> List[Tuple[Class.Class, int, int]]:
+    """
+    用新下载的班级数据更新已加载班级的余量和待筛选人数
+    :param classDetail: 一门或多门课程的json格式的班级数据
+    :return: [(班级, 余量的变化量, 待筛选人数的变化量), ...] 只包含有变化的班级
+    """
+    deltas = []
+    for classJson in classDetail:
+        class_ = getClassByClassCode(classJson["xkkh"])
+        if class_ is None:
+            continue
+        try:
+            available, unfiltered = getEnrollmentFromJson(classJson)
+        except (KeyError, IndexError, ValueError):
+            continue
+        if available != class_.available or unfiltered != class_.unfiltered:
+            deltas.append((class_, available - class_.available, unfiltered - class_.unfiltered))
+            class_.available = available
+            class_.unfiltered = unfiltered
+    return deltas
+
+
 def filterClassSetByCondition(condition: Callable[[Class.Class], bool], srcSet=None) -> List[Class.Class]:
     """
     通过条件过滤班级集合
@@ -284,24 +693,10 @@ def filterCourseSetByCondition(condition: Callable[[Course.Course], bool]) -> Co
     """
     result = Course.CourseList()
 
-    for course in courseData:
-        courseType = Course.CourseType(
-            course.get("kclb", ""),  # 课程类别
-            course.get("kcgs", ""),  # 课程归属
-            course.get("kcbs", ""),  # 课程标识
-            course.get("rdlb", "")  # 认定类别
-        )
-        course = Course.Course(
-            course["xskcdm"],  # 课程代码
-            course["kcmc"],  # 课程名称
-            float(re.findall(r"~(.*?)~", course["kcxx"])[0]),  # 学分
-            courseType,  # 课程类别
-            course["kkxy"],  # 开课学院
-            Constants.CourseStatus.NOT_SELECTED
-            # Constants.CourseStatus.SELECTED if int(target["kcxzzt"]) else Constants.CourseStatus.NOT_SELECTED  # 课程选择状态
-        )
-        if condition(course):
-            result.append(getCourseFromCourseCode(course.courseCode))
+    # 条件作用在新建的课程对象上，不受愿望清单对课程对象的修改影响
+    for record in courseRecords:
+        if condition(record.createCourse()):
+            result.append(getCourseFromCourseCode(record.courseCode))
     return result
 
 
@@ -311,20 +706,17 @@ def initClassTable(classTable: ClassTable.ClassTable):
     :param classTable: classTable对象
     """
     for chosenClassData in network.getChosenClasses():
-        classes = filterClassSetByCondition(
-            lambda x: (x.classCode == chosenClassData["xkkh"] and x.status == Constants.ClassStatus.CONFIRMED)
-        )
-        if len(classes) != 0:
-            classTable.append(
-                classes[0]
-            )
+        class_ = getClassByClassCode(chosenClassData["xkkh"])
+        if class_ is not None and class_.status == Constants.ClassStatus.CONFIRMED:
+            classTable.append(class_)
 
     # 处理assumeNotSelectCourse
     for course in classTable.getAssumeNotSelectCourse():
         classTable.removeCourse(course)
         course.status = Constants.CourseStatus.NOT_SELECTED
         classes = filterClassSetByCondition(
-            lambda x: (Course.Course.isEqualCourseCode(course.courseCode, x.course.courseCode) and x.status == Constants.ClassStatus.CONFIRMED)
+            lambda x: x.status == Constants.ClassStatus.CONFIRMED,
+            getClassesOfCourse(course.courseCode)
         )
         for class_ in classes:
-            class_.status = Constants.ClassStatus.NOT_SELECTED
\ No newline at end of file
+            class_.status = Constants.ClassStatus.NOT_SELECTED
@@ -0,0 +1,87 @@
+"""
+这个模块提供json数组的流式解析。
+zdbk返回的课程、班级数据都是很大的json数组。流式解析时一边接收数据一边取出数组中的元素，
+不需要先把整个响应或文件读进内存，收到第一个元素时就可以开始处理。
+"""
+from typing import *
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024  # 从文件中流式读取时每次读取的字节数
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def _skipWhitespace(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def iterJsonArray(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    流式解析一个json数组，逐个返回数组中的元素
+    :param chunks: utf-8编码的json数据块，例如response.iter_content()
+    :return: 数组元素的迭代器。数据不是合法的json数组时抛出ValueError(json.JSONDecodeError)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False     # 是否已经读到了"["
+    finished = False    # 是否已经读到了"]"
+    expectValue = True  # 下一个有意义的字符应当是元素(True)，还是","或"]"(False)
+    count = 0           # 已经取出的元素个数
+    chunkIterator = iter(chunks)
+    eof = False
+    while not finished:
+        chunk = next(chunkIterator, None)
+        if chunk is None:
+            eof = True
+            buffer += decoder.decode(b"", final=True)
+        else:
+            buffer += decoder.decode(chunk)
+        while True:
+            pos = _skipWhitespace(buffer, pos)
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise json.JSONDecodeError("Expecting '['", buffer, pos)
+                started = True
+                pos += 1
+            elif buffer[pos] == "]" and (not expectValue or count == 0):
+                finished = True
+                break
+            elif not expectValue:
+                if buffer[pos] != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+                expectValue = True
+            else:
+                try:
+                    value, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break   # 元素还没有接收完整，等待更多数据
+                if not eof and (end == len(buffer) or buffer[end] not in _DELIMITERS):
+                    break   # 数字之类的元素可能还没有接收完整，例如"1.5e"，要看到后面的分隔符才能确定
+                yield value
+                count += 1
+                pos = end
+                expectValue = False
+        # 丢弃已经解析过的部分
+        buffer = buffer[pos:]
+        pos = 0
+        if eof and not finished:
+            raise json.JSONDecodeError("Unexpected end of data", buffer, pos)
+
+
+def iterJsonArrayFile(path: str) -> Iterator[Any]:
+    """
+    流式读取一个内容为json数组的文件，逐个返回数组中的元素
+    """
+    with open(path, "rb") as f:
+        yield from iterJsonArray(iter(lambda: f.read(CHUNK_SIZE), b""))
@@ -0,0 +1,189 @@
+"""
+这个模块是教务系统和统一身份认证的本地模拟服务器，用于离线测试和性能测试。
+实现了network.py用到的接口：
+    统一身份认证登录(/cas/login)、获取公钥(/cas/v2/getPubKey)、
+    课程列表(cxZzxkGhbKcList)、班级列表(cxZzxkGhbJxbList)、已选课程(cxZzxkGhbChoosed)
+返回的数据来自数据目录中的courses.json、classes.json和chosen.json，
+前两个文件的格式与network.updateCoursesJson、network.updateClassJson写出的文件相同，
+chosen.json的格式与network.getChosenClasses的返回值相同。缺少的文件视为空列表。
+
+用法：
+    python mockServer.py [数据目录] [--port 端口] [--latency 秒] [--failure-rate 概率]
+或者在代码中：
+    server = startMockServer("fixtures", latency=0.05)
+    network.setBaseUrl(server.baseUrl, server.baseUrl)
+    ...
+    server.shutdown()
+"""
+from typing import *
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from Entities.Course import Course
+
+# 模拟服务器使用的RSA公钥。登录时不校验密码，所以不需要对应的私钥
+MOCK_MODULUS = "d2a7" + "5" * 124
+MOCK_EXPONENT = "10001"
+MOCK_EXECUTION = "mock-execution"
+
+
+class MockZdbkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, fixtureDir: str, latency: float = 0, failureRate: float = 0):
+        """
+        :param port: 监听的端口。为0时由系统分配
+        :param fixtureDir: 数据目录
+        :param latency: 每个请求在返回前等待的时间（秒）
+        :param failureRate: 每个请求返回500错误的概率
+        """
+        super().__init__(("127.0.0.1", port), MockZdbkRequestHandler)
+        self.latency = latency
+        self.failureRate = failureRate
+        self.requestCount = 0   # 收到的请求总数
+        self.failureCount = 0   # 故意返回错误的请求数
+        self._countLock = threading.Lock()
+
+        self.courses = self._loadFixture(fixtureDir, "courses.json")
+        self.chosen = self._loadFixture(fixtureDir, "chosen.json")
+        # 班级代码中的课程代码 -> 这门课程的班级列表。不登记课程键，以免影响同一进程中的客户端
+        self.classesByCourseCode: Dict[str, List[dict]] = {}
+        for detail in self._loadFixture(fixtureDir, "classes.json"):
+            for class_ in detail:
+                courseCode = re.findall(r"\)-(.*?)-", class_["xkkh"])[0]
+                self.classesByCourseCode.setdefault(courseCode, []).append(class_)
+
+    @staticmethod
+    def _loadFixture(fixtureDir: str, name: str) -> list:
+        path = os.path.join(fixtureDir, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="UTF-8") as f:
+            return json.load(f)
+
+    def getClassesOfCourse(self, courseCode: str) -> List[dict]:
+        """
+        获取某门课程的所有班级。课程代码的新版、旧版、"新版（旧版）"形式都可以。
+        只比较代码的形式，不读取客户端登记的课程键，结果与同一进程中的客户端状态无关
+        """
+        forms = set(Course.getCourseCodeForms(courseCode))
+        return [class_ for code, classes in self.classesByCourseCode.items()
+                if not forms.isdisjoint(Course.getCourseCodeForms(code)) for class_ in classes]
+
+    @property
+    def baseUrl(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def shouldFail(self) -> bool:
+        """
+        记录一次请求，并决定这次请求是否要故意失败
+        """
+        fail = random.random() < self.failureRate
+        with self._countLock:
+            self.requestCount += 1
+            if fail:
+                self.failureCount += 1
+        return fail
+
+
+class MockZdbkRequestHandler(BaseHTTPRequestHandler):
+    server: MockZdbkServer
+
+    def log_message(self, format, *args):
+        # 不在控制台输出每个请求
+        pass
+
+    def _sendJson(self, obj, headers: Dict[str, str] = None):
+        body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sendHtml(self, html: str, headers: Dict[str, str] = None):
+        body = html.encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _readForm(self) -> Dict[str, str]:
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("UTF-8"))
+        return {key: values[0] for key, values in form.items()}
+
+    def _handle(self, form: Dict[str, str]):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.shouldFail():
+            self.send_error(500, "Injected failure")
+            return
+
+        path = urlparse(self.path).path
+        if path == "/cas/login":
+            if form.get("username") and form.get("password") and form.get("execution") == MOCK_EXECUTION:
+                # 不校验密码，只要表单完整就登录成功
+                self._sendHtml("<html>ok</html>", {"Set-Cookie": "iPlanetDirectoryPro=mock; Path=/"})
+            else:
+                self._sendHtml(f'<input type="hidden" name="execution" value="{MOCK_EXECUTION}"/>')
+        elif path == "/cas/v2/getPubKey":
+            self._sendJson({"modulus": MOCK_MODULUS, "exponent": MOCK_EXPONENT})
+        elif path.endswith("zzxkghb_cxZzxkGhbKcList.html"):
+            # 不区分课程类别，每个类别都返回全部课程。network.updateCoursesJson会去重
+            self._sendJson(self.server.courses)
+        elif path.endswith("zzxkghb_cxZzxkGhbJxbList.html"):
+            self._sendJson(self.server.getClassesOfCourse(form.get("kcdm", "")))
+        elif path.endswith("zzxkghb_cxZzxkGhbChoosed.html"):
+            self._sendJson(self.server.chosen)
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        self._handle(self._readForm())
+
+
+def startMockServer(fixtureDir: str = ".", port: int = 0, latency: float = 0, failureRate: float = 0) -> MockZdbkServer:
+    """
+    在后台线程中启动模拟服务器
+    :param fixtureDir: 数据目录
+    :param port: 监听的端口。为0时由系统分配，可以通过server.baseUrl得到地址
+    :param latency: 每个请求在返回前等待的时间（秒）
+    :param failureRate: 每个请求返回500错误的概率
+    :return: 服务器对象。用server.shutdown()停止
+    """
+    server = MockZdbkServer(port, fixtureDir, latency, failureRate)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="教务系统的本地模拟服务器")
+    parser.add_argument("fixtureDir", nargs="?", default=".", help="数据目录")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0, help="每个请求返回500错误的概率")
+    args = parser.parse_args()
+
+    server = MockZdbkServer(args.port, args.fixtureDir, args.latency, args.failure_rate)
+    print(f"Mock server listening on {server.baseUrl}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,150 @@
+"""
+这个模块负责在选课期间持续监控课表中班级的余量和待筛选人数，
+并在余量变化影响了选课结果时重新选课
+"""
+from typing import *
+import threading
+import data
+import network
+from Entities.WishList import WishList
+from Entities.Course import Course
+from Entities.ClassTable import ClassTable
+from Entities.Class import Class
+from Entities.CancellationToken import CancellationToken, OperationCancelled
+from selectClass import selectClass, updatePossibilityRates, invalidateCandidateCache, getPossibilityBucket
+
+POLL_INTERVAL = 60  # 两次检查之间等待的时间（秒）
+
+
+class EnrollmentMonitor:
+    def __init__(self, baseTable: ClassTable, resultTable: ClassTable, wishList: WishList, doubleVar,
+                 onResult: Callable[[ClassTable, List[Tuple[Class, int, int]]], None],
+                 onError: Callable[[Exception], None] = None,
+                 interval: float = POLL_INTERVAL, workers: int = 1):
+        """
+        余量监控器。调用start()后在后台线程中定期下载课表中各课程的班级数据，更新这些班级的余量和待筛选人数。
+        只有余量有变化的课程会重新计算选上概率评分，并丢弃缓存的志愿组合。
+        如果某门课程内班级的排名、冷热类别或者有没有余量因此改变，就在baseTable的基础上重新选课。
+        使用前应当已经对wishList执行过一次selectClass，以便所有班级都已经有评分。
+        :param baseTable: 选课前的课程表（只含已选上的班级）。监控器会保存它的副本，之后不会修改它
+        :param resultTable: 目前的选课结果。监控器只检查其中除baseTable以外的课程，重新选课后改为检查新结果中的课程。
+                            监控器会保存它的副本
+        :param wishList: 愿望列表对象
+        :param doubleVar: 重新选课时用于显示进度条
+        :param onResult: 重新选课后的回调函数 onResult(新的课程表, [(班级, 余量的变化量, 待筛选人数的变化量), ...])
+        :param onError: 某次检查失败时的回调函数 onError(异常)。失败的原因也会保存在lastError中
+        :param interval: 两次检查之间等待的时间（秒）
+        :param workers: 重新选课时使用的进程数。见selectClass
+        """
+        self.baseTable = ClassTable()
+        baseTable.copyTo(self.baseTable)
+        self.resultTable = ClassTable()
+        resultTable.copyTo(self.resultTable)
+        self.wishList = wishList
+        self.doubleVar = doubleVar
+        self.onResult = onResult
+        self.onError = onError
+        self.interval = interval
+        self.workers = workers
+
+        self.lastError: Union[Exception, None] = None   # 最近一次检查失败的原因。成功后清空
+        self.pollCount = 0      # 已经完成的检查次数
+        self._stopEvent = threading.Event()
+        self._cancelToken = CancellationToken()
+        self._thread: Union[threading.Thread, None] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopEvent.clear()
+        self._cancelToken = CancellationToken()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """
+        停止监控。正在进行的重新选课会尽快停止，结果不再回调
+        :param wait: 是否等待后台线程退出
+        """
+        self._stopEvent.set()
+        self._cancelToken.cancel()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def isRunning(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopEvent.is_set()
+
+    def _run(self):
+        while not self._stopEvent.wait(self.interval):
+            try:
+                self.poll()
+                self.lastError = None
+            except OperationCancelled:
+                return
+            except Exception as e:
+                # 网络偶尔出错不影响下一次检查
+                self.lastError = e
+                if self.onError is not None:
+                    self.onError(e)
+
+    def getWatchedCourses(self) -> List[Course]:
+        """
+        :return: 需要监控的课程。即目前的选课结果中，已选上的班级以外的班级所属的课程，按课程键去重。
+                 选课结果为空时改为监控愿望清单中的所有课程
+        """
+        baseCodes = {class_.classCode for class_ in self.baseTable.classes}
+        courses = {}
+        for class_ in self.resultTable.classes:
+            if class_.classCode not in baseCodes:
+                courses.setdefault(class_.course.key, class_.course)
+        if not courses:
+            for course in self.wishList.wishes:
+                courses.setdefault(course.key, course)
+        return list(courses.values())
+
+    def poll(self) -> Union[ClassTable, None]:
+        """
+        立即检查一次余量。班级数据按课程下载，所以同一门课程中不在课表里的班级也会一起更新
+        :return: 需要重新选课时返回重新选课的结果，否则返回None
+        """
+        courses = self.getWatchedCourses()
+        records = [data.courseRecordByKey[course.key].getQuery() for course in courses
+                   if course.key in data.courseRecordByKey]
+        # stop()时不等待正在进行的请求
+        details = network.fetchClassDetails(records, cancelToken=self._cancelToken)
+        classDetail = [class_ for detail in details for class_ in detail]
+
+        # 排名要在更新余量之前记下来，否则看不出有没有余量的变化
+        before = {course.key: self.getRanking(course) for course in courses}
+        deltas = data.updateClassEnrollment(classDetail)
+        self.pollCount += 1
+        if not deltas:
+            return None
+        changedKeys = {class_.course.key for class_, _, _ in deltas}
+        affectedCourses = [course for course in courses if course.key in changedKeys]
+        before = [before[course.key] for course in affectedCourses]
+        updatePossibilityRates(affectedCourses)
+        # 这些课程的评分和余量都变了，缓存的志愿组合可能包含已经满员或者换了类别的班级
+        invalidateCandidateCache(changedKeys)
+        after = [self.getRanking(course) for course in affectedCourses]
+        if before == after:
+            return None
+
+        classTable = ClassTable()
+        self.baseTable.copyTo(classTable)
+        selectClass(classTable, self.wishList, self.doubleVar, workers=self.workers, recalculate=False,
+                    cancelToken=self._cancelToken)
+        self._cancelToken.raiseIfCancelled()
+        classTable.copyTo(self.resultTable)
+        self.onResult(classTable, deltas)
+        return classTable
+
+    @staticmethod
+    def getRanking(course: Course) -> List[Tuple[str, int, bool]]:
+        """
+        :return: 课程内各班级按评分从高到低排列的 [(班级代码, 冷热类别, 是否有余量), ...]。
+                 这些都不变时，这门课程的志愿组合也不变
+        """
+        classes = sorted(data.getClassesOfCourse(course.courseCode), key=lambda x: x.rate, reverse=True)
+        return [(class_.classCode, getPossibilityBucket(class_), class_.available > 0) for class_ in classes]
@@ -3,9 +3,19 @@
 """
 from Entities.Course import Course
 from Entities.WishList import WishList
+from Entities.CancellationToken import CancellationToken, OperationCancelled
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 import requests as r
+from urllib.parse import quote
+from typing import *
+import jsonStream
 import re
 import json
+import hashlib
+import os
+import threading
+import time
 
 GNMKDM = "N253530"
 XN = "2024-2025"
@@ -15,11 +25,25 @@ ZYDM = "1102"
 JXJHH = "20241102"
 XNXQ = f"({XN}-{XQ})-"
 
+# 教务系统和统一身份认证的地址。离线测试时可以用setBaseUrl指向本地的模拟服务器（见mockServer.py）
+ZDBK_BASE_URL = "http://zdbk.zju.edu.cn"
+ZJUAM_BASE_URL = "http://zjuam.zju.edu.cn"
+ZJUAM_SECURE_BASE_URL = "https://zjuam.zju.edu.cn"     # 获取公钥的接口走https
+
 headers = {
     "User-Agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36 Edg/114.0.1823.58'
 }
 
+FETCH_CONCURRENCY = 8     # 并发下载时最多同时发出多少个请求
+REQUEST_TIMEOUT = 15        # 单个请求的超时时间（秒）
+REQUEST_RETRIES = 3         # 单个请求最多尝试几次
+RETRY_INTERVAL = 1.0        # 两次尝试之间等待的时间（秒）。每失败一次翻倍
+CANCEL_CHECK_INTERVAL = 0.1 # 并发下载时每隔多少秒检查一次是否已经取消
+
 session = r.session()
+# 并发下载时各线程共用这个session。连接池要足够大，否则多出来的连接用完就被丢弃，无法复用
+session.mount("http://", HTTPAdapter(pool_connections=FETCH_CONCURRENCY, pool_maxsize=FETCH_CONCURRENCY))
+session.mount("https://", HTTPAdapter(pool_connections=FETCH_CONCURRENCY, pool_maxsize=FETCH_CONCURRENCY))
 
 # 本地不保存用户名和密码，防止泄露。
 username = ""
@@ -27,6 +51,27 @@ password = ""
 
 chosenClasses = None
 
+def setBaseUrl(zdbkBaseUrl: str, zjuamBaseUrl: str, zjuamSecureBaseUrl: str = None):
+    """
+    设置教务系统和统一身份认证的地址
+    :param zdbkBaseUrl: 教务系统的地址，例如"http://127.0.0.1:8000"
+    :param zjuamBaseUrl: 统一身份认证的地址
+    :param zjuamSecureBaseUrl: 获取公钥的地址。为None时与zjuamBaseUrl相同
+    """
+    global ZDBK_BASE_URL, ZJUAM_BASE_URL, ZJUAM_SECURE_BASE_URL
+    ZDBK_BASE_URL = zdbkBaseUrl.rstrip("/")
+    ZJUAM_BASE_URL = zjuamBaseUrl.rstrip("/")
+    ZJUAM_SECURE_BASE_URL = (zjuamBaseUrl if zjuamSecureBaseUrl is None else zjuamSecureBaseUrl).rstrip("/")
+
+
+def getLoginUrl() -> str:
+    """
+    :return: 统一身份认证登录教务系统的地址
+    """
+    service = quote(f"{ZDBK_BASE_URL}/jwglxt/xtgl/login_ssologin.html", safe="")
+    return f"{ZJUAM_BASE_URL}/cas/login?service={service}"
+
+
 def encrypt(publicExponent, modulus, password):
     passwordInt = int.from_bytes(bytes(password, 'ascii'), 'big')
     resultInt = pow(passwordInt, int(publicExponent, 16), int(modulus, 16))
@@ -41,19 +86,16 @@ def loginZDBK() -> bool:
     if username == "" or password == "":
         return False
 
-    response = session.post(
-        "http://zjuam.zju.edu.cn/cas/login?service=http%3A%2F%2Fzdbk.zju.edu.cn%2Fjwglxt%2Fxtgl%2Flogin_ssologin.html",
-        headers=headers
-    )
+    response = session.post(getLoginUrl(), headers=headers)
     execution = re.findall(r"\"execution\" value=\"(.*?)\"", response.text)[0]
-    response = session.get("https://zjuam.zju.edu.cn/cas/v2/getPubKey", headers=headers)
+    response = session.get(f"{ZJUAM_SECURE_BASE_URL}/cas/v2/getPubKey", headers=headers)
     modulus = re.findall(r"\"modulus\":\"(.*?)\"", response.text)[0]
     exponent = re.findall(r"\"exponent\":\"(.*?)\"", response.text)[0]
 
     encryptedPassword = encrypt(exponent, modulus, password)
 
     response = session.post(
-        "http://zjuam.zju.edu.cn/cas/login?service=http%3A%2F%2Fzdbk.zju.edu.cn%2Fjwglxt%2Fxtgl%2Flogin_ssologin.html",
+        getLoginUrl(),
         headers=headers,
         data={
             "username": username,
@@ -68,6 +110,64 @@ def loginZDBK() -> bool:
     return False
 
 
+def postJson(url: str, data: dict, onProgress: Callable[[int, int, int], None] = None, path: str = None):
+    """
+    发送POST请求并解析返回的json。超时或者出错时会重试
+    :param url: 请求地址
+    :param data: 表单数据
+    :param onProgress: 接收数据时的回调函数 onProgress(本次收到的字节数, 响应的总字节数, 本次解析出的元素数)。
+                       总字节数未知时为0。传入时响应必须是json数组，一边接收一边逐个解析数组中的元素（见jsonStream.py），
+                       不需要把整个响应保存在内存中
+    :param path: 不为None时响应必须是json数组，收到的数据直接写入这个文件，解析出的元素只用于检查格式和统计数量，不保存在内存中。
+                 完整接收并检查通过后才替换原来的文件
+    :return: 解析后的json。path不为None时返回数组的元素数
+    """
+    for attempt in range(REQUEST_RETRIES):
+        received = 0
+        parsed = 0
+        try:
+            if onProgress is None and path is None:
+                response = session.post(url, data=data, headers=headers, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                return response.json()
+            response = session.post(url, data=data, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+            response.raise_for_status()
+            total = int(response.headers.get("Content-Length", 0))
+            result = [] if path is None else None
+            count = 0
+
+            def _iterChunks(output):
+                # 每收到一块数据报告一次进度，同时报告上一块数据中解析出的元素数
+                nonlocal received, parsed
+                for chunk in response.iter_content(chunk_size=jsonStream.CHUNK_SIZE):
+                    received += len(chunk)
+                    if output is not None:
+                        output.write(chunk)
+                    if onProgress is not None:
+                        onProgress(len(chunk), total, count - parsed)
+                    parsed = count
+                    yield chunk
+
+            if path is None:
+                for record in jsonStream.iterJsonArray(_iterChunks(None)):
+                    result.append(record)
+                    count += 1
+            else:
+                with open(path + ".tmp", "wb") as output:
+                    for _ in jsonStream.iterJsonArray(_iterChunks(output)):
+                        count += 1
+                os.replace(path + ".tmp", path)
+            if onProgress is not None:
+                onProgress(0, total, count - parsed)
+            return result if path is None else count
+        except (r.RequestException, ValueError):
+            if onProgress is not None and (received or parsed):
+                onProgress(-received, 0, -parsed)    # 这次收到的数据作废，把进度退回去
+            if attempt == REQUEST_RETRIES - 1:
+                raise
+            time.sleep(RETRY_INTERVAL * 2 ** attempt)
+
+
 def getChosenClasses():
     """
     获取已选课程
@@ -77,7 +177,7 @@ def getChosenClasses():
     if chosenClasses is not None:
         return chosenClasses
     response = session.post(
-        f"http://zdbk.zju.edu.cn/jwglxt/xsxk/zzxkghb_cxZzxkGhbChoosed.html?gnmkdm={GNMKDM}&su={username}",
+        f"{ZDBK_BASE_URL}/jwglxt/xsxk/zzxkghb_cxZzxkGhbChoosed.html?gnmkdm={GNMKDM}&su={username}",
         data={
             "xn": XN,
             "xq": XQ
@@ -88,15 +188,122 @@ def getChosenClasses():
     return chosenClasses
 
 
-def updateCoursesJson(doubleVar):
+def iterCompleted(executor: ThreadPoolExecutor, futures, cancelToken: CancellationToken = None):
+    """
+    与as_completed相同，按完成的顺序逐个返回future，但会定期检查是否已经取消。
+    取消时撤销还没有开始的请求，不等待正在进行的请求，抛出OperationCancelled
+    :param executor: 执行futures的线程池
+    :param futures: future列表
+    :param cancelToken: 取消令牌。为None时不能取消
+    """
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=CANCEL_CHECK_INTERVAL, return_when=FIRST_COMPLETED)
+        yield from done
+        if cancelToken is not None and cancelToken.isCancelled():
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise OperationCancelled()
+
+
+# 增量同步的状态保存在SYNC_STATE_PATH中：
+# {
+#     "term": 学年学期,
+#     "coursesTime": 上次下载courses.json的时间戳,
+#     "classes": {课程代码kcdm: {"time": 下载时间戳, "fingerprint": 下载时这门课程在courses.json中的记录的指纹, "detail": 班级数据}, ...}
+# }
+# 数据在有效期内且课程记录没有变化时，直接使用本地数据，不再下载
+# "classes"只保留courses.json中还有、而且最近一次updateClassJson用到的课程，文件不会随着时间无限增长
+SYNC_STATE_PATH = "sync.json"
+COURSES_FRESH_SECONDS = 6 * 60 * 60     # courses.json的有效期（秒）
+CLASSES_FRESH_SECONDS = 5 * 60          # 各课程班级数据的有效期（秒）。选课期间余量变化很快，有效期要短一些
+
+
+def loadSyncState() -> dict:
+    """
+    读取增量同步的状态。文件不存在、损坏或者不是当前学期的数据时，返回空的状态
+    """
+    emptyState = {"term": XNXQ, "coursesTime": 0, "courseCategories": {}, "classes": {}}
+    if not os.path.exists(SYNC_STATE_PATH):
+        return emptyState
+    try:
+        with open(SYNC_STATE_PATH, "r", encoding="UTF-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return emptyState
+    if state.get("term") != XNXQ:
+        return emptyState
+    return state
+
+
+def saveSyncState(state: dict):
+    with open(SYNC_STATE_PATH, "w", encoding="UTF-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+
+
+def getCourseFingerprint(course: dict) -> str:
+    """
+    计算courses.json中一条课程记录的指纹。记录有任何变化，指纹就会变化
+    :param course: courses.json中的课程记录
+    :return: 指纹
+    """
+    return hashlib.sha1(json.dumps(course, ensure_ascii=False, sort_keys=True).encode("UTF-8")).hexdigest()
+
+
+# updateCoursesJson要下载的课程类别 (dl, xkmc)。同一门课程出现在多个类别中时，保留排在前面的类别里的记录
+COURSE_CATEGORIES = [
+    ("xk_b", "全部课程"),     # 通识必修课
+    ("xk_n", "全部课程"),
+    ("xk_8", "体育课程"),
+    ("xk_zyjckc", "专业基础课程"),
+    ("zy_qb", "所有类（专业）"),
+]
+
+
+def getCategoryPath(dl: str) -> str:
     """
-    更新courses.json文件
+    :return: 一个课程类别的下载结果保存的位置。各类别下载完成后再合并成courses.json
+    """
+    return f"courses.{dl}.part"
+
+
+def updateCoursesJson(doubleVar, stringVar=None, force: bool = False, cancelToken: CancellationToken = None):
+    """
+    更新courses.json文件。各个类别的课程同时下载，收到的数据直接写入各类别的文件（见getCategoryPath），
+    全部下载完成后再逐条合并成courses.json，整个过程中不需要把所有课程放进内存
     :param doubleVar: DoubleVar对象。用于显示进度条
+    :param stringVar: StringVar对象。不为None时用于显示已接收的数据量和课程数
+    某个类别下载失败或者取消时，已经下载好的类别会保留下来，有效期内再次更新时不用重新下载。
+    :param force: 为False时，如果courses.json还在有效期（COURSES_FRESH_SECONDS）内，就不重新下载。
+                  为True时总是重新下载，只有上次没有完成的更新中已经下载好的类别会直接使用
+    :param cancelToken: 取消令牌。取消时抛出OperationCancelled，courses.json保持不变
     """
-    courses = []
-    codes = []
-    def _updateCourseJson(dl, xkmc):
-        url = f"http://zdbk.zju.edu.cn/jwglxt/xsxk/zzxkghb_cxZzxkGhbKcList.html?gnmkdm={GNMKDM}&su={username}"
+    state = loadSyncState()
+    if not force and os.path.exists("courses.json") and time.time() - state["coursesTime"] < COURSES_FRESH_SECONDS:
+        doubleVar.set(1.0)
+        return
+    # 类别 -> 这个类别的文件下载完成的时间
+    categoryTimes: Dict[str, float] = state.setdefault("courseCategories", {})
+    url = f"{ZDBK_BASE_URL}/jwglxt/xsxk/zzxkghb_cxZzxkGhbKcList.html?gnmkdm={GNMKDM}&su={username}"
+    # 各类别的下载进度。进度条上每个类别占相同的长度，知道响应大小时按照已接收的字节数推进，否则下载完成时一次推进
+    progressLock = threading.Lock()
+    receivedBytes = [0] * len(COURSE_CATEGORIES)
+    totalBytes = [0] * len(COURSE_CATEGORIES)
+    finished = [os.path.exists(getCategoryPath(dl)) and time.time() - categoryTimes.get(dl, 0) < COURSES_FRESH_SECONDS
+                for dl, _ in COURSE_CATEGORIES]
+    receivedRecords = [0]   # 已经解析出的课程数。课程边接收边解析，这个数随下载进度增长
+
+    def _showProgress():
+        progress = 0
+        for i in range(len(COURSE_CATEGORIES)):
+            if finished[i]:
+                progress += 1
+            elif totalBytes[i]:
+                progress += min(receivedBytes[i] / totalBytes[i], 1)
+        doubleVar.set(progress / len(COURSE_CATEGORIES))
+        if stringVar is not None:
+            stringVar.set(f"下载课程档案...({sum(receivedBytes) / 1024 / 1024:.1f}MB, {receivedRecords[0]}条)")
+
+    def _updateCourseJson(i, dl, xkmc):
         data = {
             "lx": "bl",
             "nj": NJ,
@@ -110,85 +317,183 @@ def updateCoursesJson(doubleVar):
             "dl": dl,
             "xkmc": xkmc
         }
-        response = session.post(url, data=data, headers=headers)     # 通识必修课
-        j = response.json()
-        for course in j:
-            code = course["xskcdm"]
-            if code not in codes:
-                codes.append(code)
-                courses.append(course)
-
-    _updateCourseJson("xk_b", "全部课程")
-    doubleVar.set(0.2)
 
-    _updateCourseJson("xk_n", "全部课程")
-    doubleVar.set(0.4)
+        def _onProgress(chunkSize, total, records):
+            with progressLock:
+                receivedBytes[i] += chunkSize
+                totalBytes[i] = total
+                receivedRecords[0] += records
+                _showProgress()
 
-    _updateCourseJson("xk_8", "体育课程")
-    doubleVar.set(0.6)
+        postJson(url, data, _onProgress, getCategoryPath(dl))
+        with progressLock:
+            finished[i] = True
+            _showProgress()
 
-    _updateCourseJson("xk_zyjckc", "专业基础课程")
-    doubleVar.set(0.8)
+    _showProgress()
+    executor = ThreadPoolExecutor(max_workers=len(COURSE_CATEGORIES))
+    try:
+        futureToCategory = {executor.submit(_updateCourseJson, i, dl, xkmc): dl
+                            for i, (dl, xkmc) in enumerate(COURSE_CATEGORIES) if not finished[i]}
+        error = None
+        for future in iterCompleted(executor, futureToCategory, cancelToken):
+            try:
+                future.result()
+            except Exception as e:
+                # 其余类别继续下载，下载好的记录到同步状态中
+                error = error or e
+                continue
+            categoryTimes[futureToCategory[future]] = time.time()
+            saveSyncState(state)
+        if error is not None:
+            raise error
+    finally:
+        # 取消或出错时不等待正在进行的请求
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    _updateCourseJson("zy_qb", "所有类（专业）")
+    # 按照类别的顺序合并，保证结果和逐个类别下载时一样。课程逐条读出、逐条写入，内存中只保留课程代码
+    codes = set()
+    queryCodes = set()  # 新的courses.json中各课程的kcdm，用来清理同步状态中已经不存在的课程
+    with open("courses.json.tmp", "w", encoding="UTF-8") as f:
+        f.write("[")
+        for dl, _ in COURSE_CATEGORIES:
+            for course in jsonStream.iterJsonArrayFile(getCategoryPath(dl)):
+                code = course["xskcdm"]
+                if code not in codes:
+                    f.write(", " if codes else "")
+                    codes.add(code)
+                    queryCodes.add(course.get("kcdm"))
+                    f.write(json.dumps(course, ensure_ascii=False))
+        f.write("]")
+    os.replace("courses.json.tmp", "courses.json")
+    for dl, _ in COURSE_CATEGORIES:
+        os.remove(getCategoryPath(dl))
     doubleVar.set(1.0)
+    categoryTimes.clear()
+    state["classes"] = {code: entry for code, entry in state["classes"].items() if code in queryCodes}
+    state["coursesTime"] = time.time()
+    saveSyncState(state)
 
-    with open("courses.json", "w", encoding="UTF-8") as f:
-        json.dump(courses, f, ensure_ascii=False)
+
+def fetchClassDetail(course: dict) -> list:
+    """
+    下载一门课程的所有班级数据
+    :param course: courses.json中的课程记录
+    :return: json格式的班级数据列表
+    """
+    url = f"{ZDBK_BASE_URL}/jwglxt/xsxk/zzxkghb_cxZzxkGhbJxbList.html?gnmkdm={GNMKDM}&su={username}"
+    data = {
+        "dl": "",
+        "xn": XN,
+        "xq": XQ,
+        "kcdm": course["kcdm"],
+        "xkkh": course["xkkh"],
+        "ylxs": "0"
+    }
+    return postJson(url, data)
 
 
-def updateClassJson(wishList: WishList, doubleVar):
+def fetchClassDetails(courses: List[dict], concurrency: int = FETCH_CONCURRENCY,
+                      cancelToken: CancellationToken = None) -> List[list]:
     """
-    更新classes.json文件
+    并发下载多门课程的班级数据
+    :param courses: courses.json中的课程记录列表
+    :param concurrency: 最多同时发出多少个请求
+    :param cancelToken: 取消令牌。取消时不等待正在进行的请求，抛出OperationCancelled
+    :return: 各课程的班级数据列表，顺序与courses一致
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = [executor.submit(fetchClassDetail, course) for course in courses]
+        for _ in iterCompleted(executor, futures, cancelToken):
+            pass
+        return [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def updateClassJson(wishList: WishList, doubleVar, concurrency: int = FETCH_CONCURRENCY, force: bool = False,
+                    cancelToken: CancellationToken = None):
+    """
+    更新classes.json文件。
+    只下载本地没有、已经过期（CLASSES_FRESH_SECONDS）或者课程记录有变化的课程的班级数据，其余的直接使用本地数据。
     :param wishList: wishList对象。本方法只会获取wishList中的课程，以减少网络请求时间。
     :param doubleVar: DoubleVar对象。用于显示进度条
+    :param concurrency: 最多同时发出多少个请求
+    :param force: 为True时忽略本地数据，全部重新下载
+    :param cancelToken: 取消令牌。取消时抛出OperationCancelled，classes.json保持不变
+    某门课程下载失败或者取消时，已经下载好的课程仍然会保存到同步状态中，下次更新时不用再下载
     """
-    url = f"http://zdbk.zju.edu.cn/jwglxt/xsxk/zzxkghb_cxZzxkGhbJxbList.html?gnmkdm={GNMKDM}&su={username}"
-    with open("courses.json", "r", encoding="UTF-8") as f:
-        course_data = json.load(f)
+    # 课程键 -> courses.json中第一个匹配的课程记录。courses.json逐条读取，不需要整个放进内存
+    courseByKey = {}
+    for course in jsonStream.iterJsonArrayFile("courses.json"):
+        courseByKey.setdefault(Course.getCourseKey(course["kcdm"]), course)
+    # 后面的课程代码可能把前面两个课程键合并成一个，按合并后的键重新整理
+    for key in [key for key, course in courseByKey.items() if Course.findCourseKey(course["kcdm"]) != key]:
+        course = courseByKey.pop(key)
+        courseByKey.setdefault(Course.findCourseKey(course["kcdm"]), course)
 
-    courseCodeContained = []
-    details = []
+    # 先确定要下载哪些课程的班级数据，再一起并发下载
+    courseKeyContained = set()
+    coursesToFetch = []
     for wish in wishList.wishes:
-        doubleVar.set(wishList.wishes.index(wish) / len(wishList.wishes) / 2)
-        for course in course_data:
-            if Course.isEqualCourseCode(course["kcdm"], wish.courseCode):
-                courseCodeContained.append(course["kcdm"])
-                data = {
-                    "dl": "",
-                    "xn": XN,
-                    "xq": XQ,
-                    "kcdm": course["kcdm"],
-                    "xkkh": course["xkkh"],
-                    "ylxs": "0"
-                }
-                response = session.post(url, data=data, headers=headers)
-                details.append(response.json())
-                break
+        course = courseByKey.get(wish.key)
+        if course is not None and wish.key not in courseKeyContained:
+            courseKeyContained.add(wish.key)
+            coursesToFetch.append(course)
     for class_ in getChosenClasses():
-        doubleVar.set(0.5 + getChosenClasses().index(class_) / len(getChosenClasses()) / 2)
-        if class_["t_kcdm"] not in courseCodeContained:
-            # class和course的xkkh不一样
-            for course in course_data:
-                if Course.isEqualCourseCode(course["kcdm"],class_["t_kcdm"]):
-                    courseCodeContained.append(course["kcdm"])
-                    data = {
-                        "dl": "",
-                        "xn": XN,
-                        "xq": XQ,
-                        "kcdm": course["kcdm"],
-                        "xkkh": course["xkkh"],
-                        "ylxs": "0"
-                    }
-                    response = session.post(url, data=data, headers=headers)
-                    details.append(response.json())
-                    break
+        # class和course的xkkh不一样
+        key = Course.findCourseKey(class_["t_kcdm"])
+        if key not in courseKeyContained:
+            course = courseByKey.get(key)
+            if course is not None:
+                courseKeyContained.add(key)
+                coursesToFetch.append(course)
             else:
                 # 已经选上的课，在courses.json中找不到对应的课程。例如形势与政策I，秋学期选的，春学期找不到。
                 ...
 
+    # 找出需要重新下载的课程。同步状态中只保留这次要用到的课程，已经不在愿望清单中的课程不再保存
+    state = loadSyncState()
+    queryCodes = {course["kcdm"] for course in coursesToFetch}
+    state["classes"] = {code: entry for code, entry in state["classes"].items() if code in queryCodes}
+    now = time.time()
+    fingerprints = [getCourseFingerprint(course) for course in coursesToFetch]
+    staleIndices = []
+    for i, course in enumerate(coursesToFetch):
+        cached = state["classes"].get(course["kcdm"])
+        if (force or cached is None
+                or cached["fingerprint"] != fingerprints[i]
+                or now - cached["time"] >= CLASSES_FRESH_SECONDS):
+            staleIndices.append(i)
 
+    # 结果按照下载前的顺序放回，classes.json里各课程的顺序和串行下载时一样
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futureToIndex = {executor.submit(fetchClassDetail, coursesToFetch[i]): i for i in staleIndices}
+        error = None
+        for finished, future in enumerate(iterCompleted(executor, futureToIndex, cancelToken)):
+            i = futureToIndex[future]
+            try:
+                detail = future.result()
+            except Exception as e:
+                # 其余课程继续下载，下载好的记录到同步状态中
+                error = error or e
+                continue
+            state["classes"][coursesToFetch[i]["kcdm"]] = {
+                "time": time.time(),
+                "fingerprint": fingerprints[i],
+                "detail": detail
+            }
+            doubleVar.set((finished + 1) / len(staleIndices))
+        if error is not None:
+            raise error
+    finally:
+        # 取消或出错时不等待正在进行的请求，但是已经下载好的课程要保存下来
+        executor.shutdown(wait=False, cancel_futures=True)
+        saveSyncState(state)
+    doubleVar.set(1.0)
 
+    details = [state["classes"][course["kcdm"]]["detail"] for course in coursesToFetch]
     with open("classes.json", "w", encoding="UTF-8") as f:
         json.dump(details, f, ensure_ascii=False)
-
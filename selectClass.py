@@ -2,6 +2,11 @@
 这个模块负责执行选课算法
 """
 from typing import *
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+import multiprocessing
+import threading
+import time
 import data
 from Entities.WishList import WishList
 from Entities.Course import Course
@@ -9,6 +14,160 @@ from Entities.ClassTable import ClassTable
 from Entities.Class import Class
 import Entities.Time as Time
 import Entities.Constants as Constants
+from Entities.CancellationToken import CancellationToken, OperationCancelled
+
+
+class SearchStats:
+    def __init__(self):
+        """
+        选课搜索的统计信息。传给selectClass后在搜索过程中逐步填充，搜索进行时也可以读取，用于显示进度
+        """
+        self.nodesPerPriority: Dict[int, int] = {}     # 优先级 -> 访问过的搜索树节点数
+        self.prunedPerPriority: Dict[int, int] = {}    # 优先级 -> 被剪枝的节点数
+        self.leafEvaluations = 0                       # 评估过的完整课表数
+        self.combinationsPerCourse: Dict[str, int] = {}    # 课程代码 -> 搜索中尝试过的志愿组合数
+        self.ratingTime = 0.0           # 计算班级评分和课表评分的时间（秒）
+        self.candidateTime = 0.0        # 生成志愿组合的时间（秒），包括其中的冲突检查
+        self.conflictCheckTime = 0.0    # 生成志愿组合时检查冲突的时间（秒）
+        self.totalTime = 0.0            # selectClass的总时间（秒）
+        self.nodes = 0                  # 访问过的节点总数
+        self.budgetExhausted = False    # 是否因为预算用完而提前结束了搜索。见SearchBudget
+        self.cancelled = False          # 搜索是否被取消了
+        # 优先级 -> 搜索树在预算用完之前被完整搜索的比例。预算用完后只贪心地选出的部分不算，
+        # 所以开始时预算就已经用完、只贪心地选了一次的优先级为0
+        self.coveragePerPriority: Dict[int, float] = {}
+
+        # 目前找到的最优课表和它的评分列表。由selectClass设置，搜索时会不断更新。
+        # 其他线程读取时应当使用getBestSoFar()
+        self.bestClassTable: Union[ClassTable, None] = None
+        self.bestRateList: Union[List[float | None], None] = None
+        self.lock = threading.Lock()    # 更新和读取最优课表时使用
+
+        self.priorityCount = 0          # 要搜索的优先级个数
+        self.finishedPriorityCount = 0  # 已经搜索完的优先级个数
+        self.currentPriority: Union[int, None] = None  # 正在搜索的优先级
+        self.currentProgress = 0.0      # 正在搜索的优先级的搜索树已经搜索完的比例
+        self.currentNodes = 0           # 正在搜索的优先级已经访问过的节点数
+
+    @property
+    def progress(self) -> float:
+        """
+        总体进度。每个优先级占相同的比例
+        """
+        if self.priorityCount == 0:
+            return 0.0
+        return min(1.0, (self.finishedPriorityCount + self.currentProgress) / self.priorityCount)
+
+    @property
+    def estimatedRemainingNodes(self) -> Union[int, None]:
+        """
+        正在搜索的优先级预计还要访问多少个节点。
+        搜索树的每个节点把自己的比例平分给各个子节点，叶子和被剪枝的节点搜索完时把比例计入currentProgress。
+        假设没搜索的部分和已经搜索的部分一样大，按照已经访问的节点数外推。还没有进度时返回None
+        """
+        if self.currentProgress <= 0:
+            return None
+        return round(self.currentNodes * (1 - min(self.currentProgress, 1.0)) / self.currentProgress)
+
+    def enterPriority(self, priority: int):
+        self.currentPriority = priority
+        self.currentProgress = 0.0
+        self.currentNodes = 0
+
+    def finishPriority(self):
+        self.coveragePerPriority[self.currentPriority] = min(self.currentProgress, 1.0)
+        self.finishedPriorityCount += 1
+        self.currentProgress = 0.0
+
+    def getBestSoFar(self) -> Tuple[Union[ClassTable, None], List[float | None]]:
+        """
+        获取目前找到的最优课表。可以在搜索进行时从其他线程调用
+        :return: (最优课表的副本, 评分列表的副本)。搜索还没有开始时返回(None, [])
+        """
+        with self.lock:
+            if self.bestClassTable is None:
+                return None, []
+            classTable = ClassTable()
+            self.bestClassTable.copyTo(classTable)
+            return classTable, list(self.bestRateList)
+
+    def __getstate__(self):
+        # 子进程把统计传回主进程时，锁和最优课表都不需要传
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["bestClassTable"] = None
+        state["bestRateList"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def merge(self, other):
+        """
+        把另一个统计（例如子进程的统计）的计数和耗时累加到这里
+        :param other: SearchStats对象
+        """
+        for priority, count in other.nodesPerPriority.items():
+            self.nodesPerPriority[priority] = self.nodesPerPriority.get(priority, 0) + count
+        for priority, count in other.prunedPerPriority.items():
+            self.prunedPerPriority[priority] = self.prunedPerPriority.get(priority, 0) + count
+        for courseCode, count in other.combinationsPerCourse.items():
+            self.combinationsPerCourse[courseCode] = self.combinationsPerCourse.get(courseCode, 0) + count
+        self.leafEvaluations += other.leafEvaluations
+        self.nodes += other.nodes
+        self.ratingTime += other.ratingTime
+        self.candidateTime += other.candidateTime
+        self.conflictCheckTime += other.conflictCheckTime
+        self.currentNodes += sum(other.nodesPerPriority.values())
+
+    def getReport(self) -> Dict:
+        """
+        :return: 可以直接写成json的统计报告
+        """
+        return {
+            "nodes": sum(self.nodesPerPriority.values()),
+            "nodesPerPriority": dict(self.nodesPerPriority),
+            "prunedPerPriority": dict(self.prunedPerPriority),
+            "leafEvaluations": self.leafEvaluations,
+            "combinationsPerCourse": dict(self.combinationsPerCourse),
+            "ratingTime": self.ratingTime,
+            "candidateTime": self.candidateTime,
+            "conflictCheckTime": self.conflictCheckTime,
+            "totalTime": self.totalTime,
+            "budgetExhausted": self.budgetExhausted,
+            "cancelled": self.cancelled,
+            "coveragePerPriority": dict(self.coveragePerPriority),
+            "candidateCache": dict(candidateCacheStats),
+        }
+
+
+class SearchBudget:
+    def __init__(self, seconds: float = None, nodes: int = None):
+        """
+        选课搜索的预算。预算用完时，正在搜索的优先级立即停止，之后的优先级只沿着每门课程的第一个志愿组合贪心地选一次，
+        然后返回目前找到的最优课表。选课时间很紧张时，用一点时间得到一个不错的课表比等待最优解更有用
+        :param seconds: 最多搜索多少秒。为None时不限制
+        :param nodes: 最多访问多少个搜索树节点。为None时不限制
+        """
+        self.seconds = seconds
+        self.nodes = nodes
+        self.deadline: Union[float, None] = None
+
+    def start(self):
+        """
+        开始计时。由selectClass调用
+        """
+        self.deadline = None if self.seconds is None else time.perf_counter() + self.seconds
+
+    def isExhausted(self, stats: SearchStats) -> bool:
+        return ((self.deadline is not None and time.perf_counter() >= self.deadline)
+                or (self.nodes is not None and stats.nodes >= self.nodes))
+
+
+# 正在进行的搜索的统计和取消令牌。由selectClass和_searchSubtree设置，供搜索内部的各个函数使用
+_activeStats: Union[SearchStats, None] = None
+_activeCancelToken: Union[CancellationToken, None] = None
 
 
 def calculateClassRate(course: Course):
@@ -16,14 +175,39 @@ def calculateClassRate(course: Course):
     为一个课程内的所有班级计算评分，并填充到class.rate里面
     :param course: 课程对象
     """
-    allClassOfCourse = data.filterClassSetByCondition(
-        lambda x: Course.isEqualCourseCode(course.courseCode, x.course.courseCode)
-    )
+    calculateClassRates([course])
+
+
+def calculateClassRates(courses: List[Course]):
+    """
+    为多个课程内的所有班级一次性计算评分，并填充到class.rate、class.teacherRate、class.timeRate、class.possibilityRate里面。
+    先把所有班级的数据按列排好，再逐列计算各项评分。每门课程的班级在各列中占据连续的一段。
+    :param courses: 课程对象列表
+    """
+    # 列式数据。第i个元素都对应classes[i]
+    classes: List[Class] = []
+    teacherScores: List[float] = []     # 班级教师的査老师评分。多个教师取最高分，查不到为NULL_TEACHER_SCORE
+    availables: List[int] = []
+    unfiltereds: List[int] = []
+    segments: List[Tuple[int, int]] = []    # 第k门课程的班级在各列中的范围[start, end)
+    for course in courses:
+        start = len(classes)
+        for class_ in data.getClassesOfCourse(course.courseCode):
+            rate = data.NULL_TEACHER_SCORE
+            for teacher in class_.teacherNames:
+                rate = max(rate, data.getTeacherRate(teacher, course.academy))
+            classes.append(class_)
+            teacherScores.append(rate)
+            availables.append(class_.available)
+            unfiltereds.append(class_.unfiltered)
+        segments.append((start, len(classes)))
+
     # 给所有班级根据教师评分
     # 评分方法：
     # 1.    获取classSet内所有教师的査老师评分。如果某个教师查不到，就先跳过他。产生一个{教师-分数}的字典
     # 2.    给每个班级评分。班级教师的分数就直接作为班级的分数。如果一个班有多个教师，取最高分。
     # 3.    把这些班级按照分数从高到低排序。其(1-索引/长度)就是班级的分数。同一个老师的班级分数相同。
+    #       这里的索引和长度都是按不同的分数计算的，分数相同的班级共用一个索引。
     # 4.    第2步中有的班级因为其教师查不到分数而导致班级没有分数。这些班级的分数就是0.5
     # 5.    产生一个{班级-分数}的字典，存储所有班级的分数
     # 6.    检查course的teacherGroup。遍历每个班级，如果班级的教师在teacherGroup里面，就给他加对应的分
@@ -32,55 +216,34 @@ def calculateClassRate(course: Course):
     #       normalTeacher       +0.5分;    badTeacher  -0分;
     #       这里不作扣分。因为如果扣分，可能存在一门课选上反而总体评分更低的情况。
     # 注：不在任何teacherGroup的教师视作normalTeacher。这是因为teacherGroup是用户给的特殊标记，反映其主观意愿。程序不会自动给教师分组，只会按照排名给班级计分。
-    # step 1
-    teacherToRate = {}
-    for class_ in allClassOfCourse:
-        for teacher in class_.teacherNames:
-            if teacher not in teacherToRate:
-                teacherToRate[teacher] = data.getTeacherRate(teacher)
-    classAndRateByTeacher: List[
-        List[Tuple[Class, float]]] = []  # [[(class1, 9.9), (class2, 9.9), ...], [(class3, 9.8), ...], ...]
-    classNotIncluded = []
-    # step 2
-    for class_ in allClassOfCourse:
-        rate = data.NULL_TEACHER_SCORE
-        for teacher in class_.teacherNames:
-            rate = max(rate, teacherToRate.get(teacher, data.NULL_TEACHER_SCORE))
-        if rate != data.NULL_TEACHER_SCORE:
-            inserted = False
-            for classAndRateList in classAndRateByTeacher:
-                if classAndRateList[0][1] == rate:
-                    classAndRateList.append((class_, rate))
-                    inserted = True
-                    break
-            if not inserted:
-                classAndRateByTeacher.append([(class_, rate)])
-        else:
-            classNotIncluded.append(class_)
-    # step 3/4/5
-    classAndRateByTeacher.sort(key=lambda x: x[0][1], reverse=True)
-    classToRateByTeacher = {}
-    for classAndRateList in classAndRateByTeacher:
-        for class_, rate in classAndRateList:
-            classToRateByTeacher[class_] = (1 - classAndRateByTeacher.index(classAndRateList)
-                                                / len(classAndRateByTeacher))
-    for class_ in classNotIncluded:
-        classToRateByTeacher[class_] = 0.5
-    # step 6
-    for class_ in allClassOfCourse:
-        maxAddition = 0
-        for teacher in class_.teacherNames:
-            if teacher in course.teacherGroup[0]:
-                maxAddition = max(maxAddition, 1.5)
-            elif teacher in course.teacherGroup[1]:
-                maxAddition = max(maxAddition, 1)
-            elif teacher in course.teacherGroup[2]:
-                maxAddition = max(maxAddition, 0.5)
-            elif teacher in course.teacherGroup[3]:
-                maxAddition = max(maxAddition, 0)
+    teacherRates: List[float] = [0.0] * len(classes)
+    for course, (start, end) in zip(courses, segments):
+        # step 1/2/3
+        distinctScores = sorted(
+            {score for score in teacherScores[start:end] if score != data.NULL_TEACHER_SCORE}, reverse=True
+        )
+        scoreToRank = {score: rank for rank, score in enumerate(distinctScores)}
+        # step 6
+        preferredTeachers, goodTeachers, normalTeachers, badTeachers = (set(group) for group in course.teacherGroup)
+        for i in range(start, end):
+            # step 3/4
+            if teacherScores[i] != data.NULL_TEACHER_SCORE:
+                rate = 1 - scoreToRank[teacherScores[i]] / len(distinctScores)
             else:
-                maxAddition = max(maxAddition, 0.5)
-        classToRateByTeacher[class_] += maxAddition
+                rate = 0.5
+            maxAddition = 0
+            for teacher in classes[i].teacherNames:
+                if teacher in preferredTeachers:
+                    maxAddition = max(maxAddition, 1.5)
+                elif teacher in goodTeachers:
+                    maxAddition = max(maxAddition, 1)
+                elif teacher in normalTeachers:
+                    maxAddition = max(maxAddition, 0.5)
+                elif teacher in badTeachers:
+                    maxAddition = max(maxAddition, 0)
+                else:
+                    maxAddition = max(maxAddition, 0.5)
+            teacherRates[i] = rate + maxAddition
 
     # 给所有班级根据时间评分
     # 评分方法：
@@ -89,61 +252,115 @@ def calculateClassRate(course: Course):
     #       如果这个时间在course.avoidTimeList里面，这个班级评分为0分
     #       如果这个时间不在course.expectedTimeList和course.avoidTimeList里面，这个班级评分为0.5分
     # 2.    产生一个{班级-分数}的字典，存储所有班级的分数
-    classToRateByTime = {}
-    for class_ in allClassOfCourse:
-        rate = 0.5
+    # 多个期望（避免）时间只要有一个重叠就算，所以先把它们合并成一个位图
+    timeRates: List[float] = [0.5] * len(classes)
+    for course, (start, end) in zip(courses, segments):
+        expectedMask = 0
         for classTime in course.expectedTimeList:
-            if class_.classTime.isOverlapped(classTime):
-                rate = 1
-                break
+            expectedMask |= classTime.mask
+        avoidMask = 0
         for classTime in course.avoidTimeList:
-            if class_.classTime.isOverlapped(classTime):
-                rate = 0
-                break
-        classToRateByTime[class_] = rate
+            avoidMask |= classTime.mask
+        for i in range(start, end):
+            if classes[i].classTime.mask & avoidMask:
+                timeRates[i] = 0
+            elif classes[i].classTime.mask & expectedMask:
+                timeRates[i] = 1
 
+    # 给所有班级根据选上的概率评分
+    possibilityRates = _getPossibilityRates(availables, unfiltereds, segments)
+
+    # 合并评分
+    # 合并方法： 遍历所有班级，取出各个评分。将各个评分加权相加，得到最终评分。权值可由用户设定。
+    for course, (start, end) in zip(courses, segments):
+        for i in range(start, end):
+            class_ = classes[i]
+            class_.teacherRate = teacherRates[i]
+            class_.timeRate = timeRates[i]
+            class_.possibilityRate = possibilityRates[i]
+            class_.rate = (teacherRates[i] * course.teacherFactor
+                           + timeRates[i] * course.timeFactor
+                           + possibilityRates[i] * course.possibilityFactor)
+
+
+def _getPossibilityRates(availables: List[int], unfiltereds: List[int],
+                         segments: List[Tuple[int, int]]) -> List[float]:
+    """
+    根据余量和待筛选人数计算选上概率评分。各列的含义同calculateClassRates
+    :param availables: 各班级的余量
+    :param unfiltereds: 各班级的待筛选人数
+    :param segments: 每门课程的班级在各列中的范围[start, end)
+    :return: 各班级的选上概率评分
+    """
     # 给所有班级根据选上的概率评分
     # 1.    按照class内部的数据，算出选上的概率P。P=余量/待选人数。
     # 2.    将所有的P映射到[0, 1]区间，得到一个P'。P'即为这个班级的概率评分。
     # 3.    产生一个{班级-分数}的字典，存储所有班级的分数，并
-    classToRateByPossibility = {}
-    minPossibility = 1
-    maxPossibility = -1
-    for class_ in allClassOfCourse:
-        if class_.available <= 0:
-            possibility = 0
-        elif class_.unfiltered <= class_.available:
-            possibility = 1
+    possibilities: List[float] = []
+    for available, unfiltered in zip(availables, unfiltereds):
+        if available <= 0:
+            possibilities.append(0)
+        elif unfiltered <= available:
+            possibilities.append(1)
         else:
-            possibility = class_.available / class_.unfiltered
-        minPossibility = min(minPossibility, possibility)
-        maxPossibility = max(maxPossibility, possibility)
-        classToRateByPossibility[class_] = possibility
+            possibilities.append(available / unfiltered)
     # 映射到[0, 1]区间
-
-    for class_ in allClassOfCourse:
+    possibilityRates: List[float] = [0] * len(possibilities)
+    for start, end in segments:
+        if start == end:
+            continue
+        minPossibility = min(1, min(possibilities[start:end]))
+        maxPossibility = max(-1, max(possibilities[start:end]))
         if maxPossibility == minPossibility:
-            rate = 0
-        else:
-            rate = (
-                    (classToRateByPossibility[class_] - minPossibility)
-                    / (maxPossibility - minPossibility)
-            )
-        classToRateByPossibility[class_] = rate
+            continue
+        for i in range(start, end):
+            possibilityRates[i] = (possibilities[i] - minPossibility) / (maxPossibility - minPossibility)
+    return possibilityRates
 
 
-    # 合并评分
-    # 合并方法： 遍历所有班级，取出各个评分。将各个评分加权相加，得到最终评分。权值可由用户设定。
-    for class_ in allClassOfCourse:
-        class_.teacherRate = classToRateByTeacher[class_]
-        class_.timeRate = classToRateByTime[class_]
-        class_.possibilityRate = classToRateByPossibility[class_]
+def updatePossibilityRates(courses: List[Course]):
+    """
+    班级的余量或待筛选人数变化后，只重新计算这些课程的选上概率评分，并更新class.rate。
+    教师评分和时间评分保持不变。调用前这些课程应当已经由calculateClassRates计算过评分
+    :param courses: 课程对象列表
+    """
+    classes: List[Class] = []
+    availables: List[int] = []
+    unfiltereds: List[int] = []
+    segments: List[Tuple[int, int]] = []
+    for course in courses:
+        start = len(classes)
+        for class_ in data.getClassesOfCourse(course.courseCode):
+            classes.append(class_)
+            availables.append(class_.available)
+            unfiltereds.append(class_.unfiltered)
+        segments.append((start, len(classes)))
+
+    possibilityRates = _getPossibilityRates(availables, unfiltereds, segments)
+    for course, (start, end) in zip(courses, segments):
+        for i in range(start, end):
+            class_ = classes[i]
+            class_.possibilityRate = possibilityRates[i]
+            class_.rate = (class_.teacherRate * course.teacherFactor
+                           + class_.timeRate * course.timeFactor
+                           + possibilityRates[i] * course.possibilityFactor)
 
-        rate = (classToRateByTeacher[class_] * course.teacherFactor
-                + classToRateByTime[class_] * course.timeFactor
-                + classToRateByPossibility[class_] * course.possibilityFactor)
 
-        class_.rate = rate
+# 按照选上概率划分的班级类别，见getOptimalCandidatesWithinClassSet
+HOT = 0
+NORMAL = 1
+COLD = 2
+
+
+def getPossibilityBucket(class_: Class) -> int:
+    """
+    :return: 班级按照选上概率所属的类别。HOT、NORMAL或COLD
+    """
+    if class_.possibilityRate >= 2 / 3:
+        return COLD
+    if class_.possibilityRate <= 1 / 3:
+        return HOT
+    return NORMAL
 
 
 def getOptimalCandidatesWithinClassSet(classSet: List[Class], classTable) -> List[Class]:
@@ -181,8 +398,8 @@ def getOptimalCandidatesWithinClassSet(classSet: List[Class], classTable) -> Lis
     # 如果课程已经选上（即用户要求优化），那么要去掉比已经选上的班级更差的班级。此处不用考虑选上概率。
     if course.status == Constants.CourseStatus.SELECTED:
         selectedClass = data.filterClassSetByCondition(
-            lambda x: Course.isEqualCourseCode(course.courseCode, x.course.courseCode)
-                      and x.status == Constants.ClassStatus.CONFIRMED
+            lambda x: x.status == Constants.ClassStatus.CONFIRMED,
+            data.getClassesOfCourse(course.courseCode)
         )[0]
         classSet = data.filterClassSetByCondition(
             lambda x: x.teacherRate*course.teacherFactor + x.timeRate*course.timeFactor
@@ -190,10 +407,13 @@ def getOptimalCandidatesWithinClassSet(classSet: List[Class], classTable) -> Lis
             classSet
         )
     # 去掉插不进课表的班级。此处检验是为了解决期末考试的冲突。上课时间的话在选timeDomain的时候已经检查过了。
+    start = time.perf_counter()
     classSet = data.filterClassSetByCondition(
         lambda x: not classTable.isConflict(x),
         classSet
     )
+    if _activeStats is not None:
+        _activeStats.conflictCheckTime += time.perf_counter() - start
 
     if not classSet:
         return []
@@ -205,16 +425,12 @@ def getOptimalCandidatesWithinClassSet(classSet: List[Class], classTable) -> Lis
     #       将P'[0, 1/3)划为hot，(2/3, 1]划为cold，(1/3, 2/3)划为normal
     # 2.    按照course.strategy的设定，从hot, normal, cold里面选出相应数量的评分前n的班级。
     #       如果某个类别的班级数量不够，就从更冷门类别里面选。如果班级总数小于3，就不选那么多。
-    hotClasses = []
-    normalClasses = []
-    coldClasses = []
+    buckets = {HOT: [], NORMAL: [], COLD: []}
     for class_ in classSet:
-        if class_.possibilityRate >= 2 / 3:
-            coldClasses.append(class_)
-        elif class_.possibilityRate <= 1 / 3:
-            hotClasses.append(class_)
-        else:
-            normalClasses.append(class_)
+        buckets[getPossibilityBucket(class_)].append(class_)
+    hotClasses = buckets[HOT]
+    normalClasses = buckets[NORMAL]
+    coldClasses = buckets[COLD]
 
     hotClasses.sort(key=lambda x: x.rate, reverse=True)
     normalClasses.sort(key=lambda x: x.rate, reverse=True)
@@ -238,9 +454,63 @@ def getOptimalCandidatesWithinClassSet(classSet: List[Class], classTable) -> Lis
 # 时间占据情况2：周五
 # 时间占据情况3：周三和周五（两个班的志愿都先报上）
 # 然后再对每个课程进行深搜，找到这个优先级的课表最优解
+# getCourseCandidateCombination的结果缓存。
+# 结果只取决于课程和课表占据的上课时间、考试时间，所以用(课程键, 上课时间位图, 考试时间段集合)作为键。
+# 缓存在selectClass开始时清空，因为那时班级评分会重新计算
+CANDIDATE_CACHE_SIZE = 4096     # 最多缓存多少个结果。超出时淘汰最久没有用到的结果
+_candidateCache: OrderedDict = OrderedDict()
+candidateCacheStats = {"hits": 0, "misses": 0}
+
+
+def clearCandidateCache():
+    """
+    清空getCourseCandidateCombination的结果缓存和命中统计
+    """
+    _candidateCache.clear()
+    candidateCacheStats["hits"] = 0
+    candidateCacheStats["misses"] = 0
+
+
+def invalidateCandidateCache(courseKeys: Set[int]):
+    """
+    只丢弃某些课程的缓存结果。用于部分课程的班级评分变化之后
+    :param courseKeys: 课程键集合
+    """
+    for key in [key for key in _candidateCache if key[0] in courseKeys]:
+        del _candidateCache[key]
+
+
 def getCourseCandidateCombination(course: Course, classTable: ClassTable) -> List[List[Class]]:
     """
     获取某门课程的不同时间占据情况下的最优的志愿组合。返回的时间组合是能插入ClassTable的。
+    结果会被缓存，相同课程在占据情况相同的课表上会直接返回上次的结果。调用者不应修改返回的列表。
+    详见_getCourseCandidateCombination
+
+    :param course: 课程对象
+    :param classTable: 课表对象
+    :return: [[一号志愿, 二号志愿, ...], ...] 内部各列表总体占据的时间互异
+    """
+    if _activeCancelToken is not None:
+        _activeCancelToken.raiseIfCancelled()
+    if classTable.getNumberOfCandidates(course):
+        # 课表里已经有这门课程的班级时，同一门课程的班级之间不算冲突，结果不只取决于占据情况，不做缓存
+        return _getCourseCandidateCombination(course, classTable)
+    key = (course.key, classTable.timeMask, classTable.getOccupiedExamTimes())
+    if key in _candidateCache:
+        candidateCacheStats["hits"] += 1
+        _candidateCache.move_to_end(key)
+        return _candidateCache[key]
+    candidateCacheStats["misses"] += 1
+    result = _getCourseCandidateCombination(course, classTable)
+    _candidateCache[key] = result
+    if len(_candidateCache) > CANDIDATE_CACHE_SIZE:
+        _candidateCache.popitem(last=False)
+    return result
+
+
+def _getCourseCandidateCombination(course: Course, classTable: ClassTable) -> List[List[Class]]:
+    """
+    获取某门课程的不同时间占据情况下的最优的志愿组合。返回的时间组合是能插入ClassTable的。
 
     :param course: 课程对象
     :param classTable: 课表对象
@@ -262,8 +532,8 @@ def getCourseCandidateCombination(course: Course, classTable: ClassTable) -> Lis
     # 每一个元素是一个列表，列表内的第一个元素是ClassTime
     # 第二个元素是一个数字，表示有几个班是这个时间
 
-    for class_ in data.filterClassSetByCondition(
-            lambda x: Course.isEqualCourseCode(course.courseCode, x.course.courseCode)):
+    allClassOfCourse = data.getClassesOfCourse(course.courseCode)
+    for class_ in allClassOfCourse:
         if class_.classTime not in [i[0] for i in classTimeSet]:
             classTimeSet.append([class_.classTime, 0])
         index = 0
@@ -356,17 +626,20 @@ def getCourseCandidateCombination(course: Course, classTable: ClassTable) -> Lis
             # 如果这门课已经选上了，那么就只有一个时间可以，就是这个选上的班级上课的时间
             timeDomainSet = [
                 data.filterClassSetByCondition(
-                    lambda x: Course.isEqualCourseCode(course.courseCode, x.course.courseCode)
-                                and x.status == Constants.ClassStatus.CONFIRMED
+                    lambda x: x.status == Constants.ClassStatus.CONFIRMED,
+                    allClassOfCourse
                 )[0].classTime
             ]
         # 删去上课时间与现有课表冲突的时间
+    start = time.perf_counter()
     timeDomainSet = [i for i in timeDomainSet if not classTable.isConflict(
         Class("", course, [], "",
               i, [],
               0, 0, "", "", "", ""
               )
     )]
+    if _activeStats is not None:
+        _activeStats.conflictCheckTime += time.perf_counter() - start
     # 现在time_domain_set内存储了所有可能的时间组合
     # 现在要找出每个时间组合内的最优志愿组合
     optimalCandidateCombination = []
@@ -375,8 +648,8 @@ def getCourseCandidateCombination(course: Course, classTable: ClassTable) -> Lis
         # 这里不需要递归。根据Course内部的策略，找出当前时间下的最优志愿组合
         # 首先先找出所有符合当前时间要求的班级
         classSet = data.filterClassSetByCondition(
-            lambda x: x.classTime in timeDomain
-                      and Course.isEqualCourseCode(course.courseCode, x.course.courseCode)
+            lambda x: x.classTime in timeDomain,
+            allClassOfCourse
         )
         # 然后按照策略找出class_set里面最好的三个班级（如果有的话）
         optimalClassSet = getOptimalCandidatesWithinClassSet(classSet, classTable)  # 存储最优的三个班级
@@ -409,13 +682,13 @@ def getClassTableRateList(classTable: ClassTable, wishList: WishList) -> List[fl
         if class_.course.status == Constants.CourseStatus.SELECTED and class_.course not in wishList.wishes:
             continue  # 已经选上了并且没有要求优化，不再参与运算
         priority = class_.course.priority
-        if class_.course.courseCode in courseToRate:
-            if class_.rate > courseToRate[class_.course.courseCode]:
-                result[maxPriority - priority] -= courseToRate[class_.course.courseCode]
+        if class_.course.key in courseToRate:
+            if class_.rate > courseToRate[class_.course.key]:
+                result[maxPriority - priority] -= courseToRate[class_.course.key]
                 result[maxPriority - priority] += class_.rate
-                courseToRate[class_.course.courseCode] = class_.rate
+                courseToRate[class_.course.key] = class_.rate
         else:
-            courseToRate[class_.course.courseCode] = class_.rate
+            courseToRate[class_.course.key] = class_.rate
             if result[maxPriority - priority] is None:
                 result[maxPriority - priority] = 0
             result[maxPriority - priority] += class_.rate
@@ -423,6 +696,23 @@ def getClassTableRateList(classTable: ClassTable, wishList: WishList) -> List[fl
     return result
 
 
+def getCourseRateUpperBound(course: Course) -> float:
+    """
+    获取一门课程对课表评分列表的贡献的上界。用于选课算法的剪枝。
+    一门课程的贡献是它在课表里的班级评分的最大值，不选这门课程时贡献为0。所以上界就是所有班级评分的最大值和0中的较大者。
+    :param course: 课程对象。应当已经调用过calculateClassRate
+    :return: 上界
+    """
+    upperBound = 0
+    for class_ in data.getClassesOfCourse(course.courseCode):
+        upperBound = max(upperBound, class_.rate)
+    return upperBound
+
+
+# 评分是浮点数，求和的顺序不同会有微小的误差。给上界加上这个余量，保证剪枝不会剪掉更优的课表
+UPPER_BOUND_EPSILON = 1e-9
+
+
 def rateListCmp(a: List[float | None], b: List[float | None]) -> int:
     """
     评分列表比较函数
@@ -444,115 +734,484 @@ def rateListCmp(a: List[float | None], b: List[float | None]) -> int:
     return 0
 
 
-def selectClass(classTable: ClassTable, wishList: WishList, doubleVar) -> ClassTable:
+def getPriorityGroup(wishList: WishList) -> Dict[int, List[Course]]:
     """
-    选课算法。调用这个函数的时候，所有数据应该都已经加载好了。
-    :param classTable: 课程表对象
+    把愿望清单里的课程按照优先级分组。调用前wishList.wishes应当已经按照优先级从高到低排好序
     :param wishList: 愿望列表对象
-    :param doubleVar: 用于显示进度条
-    :return: 选课结果。选课结果也会直接写入classTable对象。
+    :return: {优先级: [课程, ...], ...}
     """
-
-    if not wishList.wishes:  # 没有课程需要选
-        return classTable
-
-    wishList.wishes.sort(key=lambda x: x.priority, reverse=True)
-    # 按照优先级分组
     priorityGroup: Dict[int, List[Course]] = {}  # 优先级-课程列表
     for wish in wishList.wishes:
-        calculateClassRate(wish)  # 在这里计算好所有课程的评分，以便后续使用
         if wish.priority not in priorityGroup:
             priorityGroup[wish.priority] = []
         priorityGroup[wish.priority].append(wish)
+    return priorityGroup
 
-    # for class_ in classTable.classes:
-    #     calculateClassRate(class_.course)
 
-    wishList.maxPriority = max(priorityGroup.keys())
-    bestClassTable = ClassTable()
-    classTable.copyTo(bestClassTable)
-    bestRateList = getClassTableRateList(classTable, wishList)
+def getConfirmedClass(course: Course) -> Class:
+    """
+    获取一门已选上的课程的已选上的教学班
+    :param course: 课程对象。course.status应当是CourseStatus.SELECTED
+    :return: 已选上的教学班
+    """
+    return data.filterClassSetByCondition(
+        lambda x: x.course.key == course.key and x.status == Constants.ClassStatus.CONFIRMED,
+        data.getClassesOfCourse(course.courseCode)
+    )[0]
+
+
+def applyCandidateCombination(classTable: ClassTable, course: Course,
+                              candidateCombination: List[Class], confirmedClass: Class | None) -> List[Class]:
+    """
+    把一门课程的一个志愿组合加入课表。
+    如果这门课程是已选上的课程，调用前应当已经把已选上的教学班从课表里删除。
+    :param classTable: 课表对象
+    :param course: 课程对象
+    :param candidateCombination: getCourseCandidateCombination返回的一个志愿组合
+    :param confirmedClass: 已选上的教学班。未选上的课程传None
+    :return: 实际加入课表的班级。用undoCandidateCombination撤销
+    """
+    # getCourseCandidateCombination已经保证各candidate_combination能插入classTable且按照评分从高到低排序
+    # 对于已经选上的课程，getCourseCandidateCombination返回的candidate_combination里面可能包含已选上的教学班
+    # 所以不用再检查ClassTable是否冲突，直接append即可（再说了，append内部也会检查冲突，真冲突就报错了）
 
-    def _select(_priority: int, index: int):
+    # 这个地方要分两种情况：
+    # 1.    这门课程是未选上的课程。这种情况下，直接将candidate_combination里面的班级加入classTable即可。
+    # 2.    这门课程是已选上的课程。这种情况下，candidate_combination里面的班级可能有已选上的班级。
+    #       如果candidate_combination里没有已经选上的班级，由于本程序不会退选已选上的课程，所以取candidate_combination里面的前两个班级即可，再加入已选上的班级。
+    #       接着按顺序把班级添加进classTable，添加到那个已选上的课程时，就可以停止了。
+    appendedClasses = []
+    if course.status == Constants.CourseStatus.NOT_SELECTED:
+        for class_ in candidateCombination:
+            classTable.append(class_)
+            appendedClasses.append(class_)
+    else:
+        # 最极端的情况下，系统可以在已选课程前再插入两个更好的教学班
+        candidateCombination = candidateCombination[:2]
+        candidateCombination.append(confirmedClass)
+        # 再依次加入candidate_combination里面的班级，直到加入已选上的班级
+        for class_ in candidateCombination:
+            classTable.append(class_)
+            appendedClasses.append(class_)
+            if class_ == confirmedClass:
+                break
+    return appendedClasses
+
+
+def undoCandidateCombination(classTable: ClassTable, appendedClasses: List[Class]):
+    """
+    撤销applyCandidateCombination对课表的修改
+    :param classTable: 课表对象
+    :param appendedClasses: applyCandidateCombination的返回值
+    """
+    for class_ in reversed(appendedClasses):
+        classTable.removeClass(class_)
+
+
+def getRemainingUpperBound(courses: List[Course]) -> List[float]:
+    """
+    剪枝用的上界。
+    :param courses: 一个优先级内的课程
+    :return: 列表的第index个元素是courses[index:]这些课程的贡献的上界之和
+    """
+    remainingUpperBound = [0.0]
+    for course in reversed(courses):
+        remainingUpperBound.insert(0, remainingUpperBound[0] + getCourseRateUpperBound(course))
+    return remainingUpperBound
+
+
+# 搜索时最多每隔多少秒报告一次进度
+PROGRESS_INTERVAL = 0.1
+
+
+def searchPriorityGroup(classTable: ClassTable, wishList: WishList, courses: List[Course],
+                        bestClassTable: ClassTable, bestRateList: List[float | None],
+                        startIndex: int = 0, sharedBestRate=None, stats: SearchStats = None,
+                        onProgress: Callable[[SearchStats], None] = None, budget: SearchBudget = None,
+                        cancelToken: CancellationToken = None):
+    """
+    在classTable的基础上搜索一个优先级内的最优课表。一次处理一个课程。
+    找到比bestRateList更好的课表时，会直接更新bestClassTable和bestRateList。
+    :param classTable: 课表对象。搜索结束后会恢复原状
+    :param wishList: 愿望列表对象
+    :param courses: 这个优先级内的所有课程
+    :param bestClassTable: 目前找到的最优课表
+    :param bestRateList: 目前找到的最优课表的评分列表
+    :param startIndex: 从courses的第几个课程开始搜索。之前的课程视为已经处理过了
+    :param sharedBestRate: 多个进程共享的当前优先级的最优得分(multiprocessing.Value)，用于并行搜索时互相剪枝。串行搜索传None
+    :param stats: 记录搜索统计的对象。为None时不记录
+    :param onProgress: 搜索时定期调用的回调函数 onProgress(stats)。需要同时传入stats
+    :param budget: 搜索预算。为None时完整搜索。开始搜索时预算已经用完的话，只贪心地选一次
+    :param cancelToken: 取消令牌。取消时抛出OperationCancelled，classTable不会恢复原状，bestClassTable仍然是完整的课表
+    """
+    priority = courses[0].priority
+    remainingUpperBound = getRemainingUpperBound(courses)
+    if stats is None:
+        stats = SearchStats()
+    lock = stats.lock
+    groupLeafEvaluations = stats.leafEvaluations   # 开始搜索这个优先级时已经评估过的课表数
+    stats.nodesPerPriority.setdefault(priority, 0)
+    stats.prunedPerPriority.setdefault(priority, 0)
+    lastReportTime = [time.perf_counter()]
+
+    def _finishSubtree(share: float):
         """
-        选课算法的递归函数，负责选出当前这一个优先级的课程表。一次处理一个课程。
-        :param _priority: 当前优先级
-        :param index: 当前正在处理的课程在priority_group[priority]中的索引
+        记录一棵子树已经搜索完，必要时报告进度
+        :param share: 这棵子树占当前优先级搜索树的比例
+        """
+        if not stats.budgetExhausted:
+            stats.currentProgress += share  # 预算用完后贪心地走完的路径不算搜索过
+        if onProgress is not None:
+            now = time.perf_counter()
+            if now - lastReportTime[0] >= PROGRESS_INTERVAL:
+                lastReportTime[0] = now
+                onProgress(stats)
+
+    def _canBeatBest(index: int) -> bool:
+        """
+        判断当前的部分课表继续搜索下去，有没有可能得到比bestRateList更好的课表。
+        搜索一个优先级时，其他优先级的得分在所有叶子上都和bestRateList相同，所以只需要比较当前优先级的得分。
+        当前优先级的得分不会超过：已经处理过的课程的得分 + 剩下的课程的贡献的上界
+        :param index: 当前正在处理的课程在courses中的索引
+        """
+        bestRate = bestRateList[wishList.maxPriority - priority]
+        if bestRate is None:
+            return True
+        decidedCourseKeys = {course.key for course in courses[:index]}
+        courseToRate = {}
+        for class_ in classTable.classes:
+            if class_.course.key in decidedCourseKeys:
+                courseToRate[class_.course.key] = max(
+                    courseToRate.get(class_.course.key, class_.rate), class_.rate
+                )
+        upperBound = sum(courseToRate.values()) + remainingUpperBound[index]
+        upperBound += UPPER_BOUND_EPSILON * (1 + abs(upperBound))
+        if sharedBestRate is not None and upperBound < sharedBestRate.value:
+            # 其他进程已经找到了更好的课表。这里必须用严格小于，得分相同的课表要留给排在前面的子树
+            return False
+        return upperBound > bestRate
+
+    def _select(index: int, share: float):
+        """
+        选课算法的递归函数
+        :param index: 当前正在处理的课程在courses中的索引
+        :param share: 这个节点的子树占当前优先级搜索树的比例。用于估计进度
 
         课程表对象classTable是外部变量
         """
-        if _priority not in priorityGroup:
-            return
-        if index == len(priorityGroup[_priority]):  # 当前优先级的课程已经全部处理完了，可以评估这个课表了
+        if cancelToken is not None:
+            cancelToken.raiseIfCancelled()
+        if budget is not None and not stats.budgetExhausted and budget.isExhausted(stats):
+            stats.budgetExhausted = True
+            if stats.leafEvaluations > groupLeafEvaluations:
+                return  # 预算用完，放弃剩下的子树
+            # 这个优先级还没有得到过完整的课表。深度优先搜索还在第一条路径上，继续贪心地走完它
+        stats.nodesPerPriority[priority] += 1
+        stats.currentNodes += 1
+        stats.nodes += 1
+        if index == len(courses):  # 当前优先级的课程已经全部处理完了，可以评估这个课表了
+            stats.leafEvaluations += 1
+            start = time.perf_counter()
             rateList = getClassTableRateList(classTable, wishList)
+            stats.ratingTime += time.perf_counter() - start
             if rateListCmp(rateList, bestRateList) > 0:
-                bestRateList.clear()
-                bestRateList.extend(rateList)
-                bestClassTable.clear()
-                bestClassTable.extend(classTable)
+                with lock:
+                    bestRateList.clear()
+                    bestRateList.extend(rateList)
+                    bestClassTable.clear()
+                    bestClassTable.extend(classTable)
+                if sharedBestRate is not None:
+                    with sharedBestRate.get_lock():
+                        sharedBestRate.value = max(sharedBestRate.value, rateList[wishList.maxPriority - priority])
+            _finishSubtree(share)
             return
-        # 现在处理的是priority_group[priority][index]这门课程
-        course = priorityGroup[_priority][index]
+        if not _canBeatBest(index):
+            stats.prunedPerPriority[priority] += 1
+            _finishSubtree(share)
+            return  # 剪枝：这棵子树里不可能有比bestRateList更好的课表
+        # 现在处理的是courses[index]这门课程
+        course = courses[index]
 
         # 如果这门课程是已选上的，那么就尝试找出比当前已选上的教学班更好的教学班。并把它放到已选上的教学班的前面。
         # 为了保证修改最少的代码，这里将已选上的课程从classTable里面删除，模拟他是一个未选上的课程
         # 之后再加回去
         confirmedClass = None
         if course.status == Constants.CourseStatus.SELECTED:
-            confirmedClass = data.filterClassSetByCondition(
-                lambda x: x.course.courseCode == course.courseCode and x.status == Constants.ClassStatus.CONFIRMED
-            )[0]
+            confirmedClass = getConfirmedClass(course)
             classTable.removeClass(confirmedClass)     # 删除已选上的教学班
 
         # 获取这门课程的志愿组合，依次尝试
+        start = time.perf_counter()
         candidateCombinations = getCourseCandidateCombination(course, classTable)
+        stats.candidateTime += time.perf_counter() - start
+        stats.combinationsPerCourse[course.courseCode] = (stats.combinationsPerCourse.get(course.courseCode, 0)
+                                                          + len(candidateCombinations))
+        # 各个志愿组合和"不选"这几棵子树平分这个节点的比例
+        childShare = share / (len(candidateCombinations) + 1)
         for candidateCombination in candidateCombinations:
-            candidateCombination: List[Class]
-            # getCourseCandidateCombination已经保证各candidate_combination能插入classTable且按照评分从高到低排序
-            # 对于已经选上的课程，getCourseCandidateCombination返回的candidate_combination里面可能包含已选上的教学班
-            # 所以不用再检查ClassTable是否冲突，直接append即可（再说了，append内部也会检查冲突，真冲突就报错了）
-
-            # 这个地方要分两种情况：
-            # 1.    这门课程是未选上的课程。这种情况下，直接将candidate_combination里面的班级加入classTable即可。
-            # 2.    这门课程是已选上的课程。这种情况下，candidate_combination里面的班级可能有已选上的班级。
-            #       如果candidate_combination里没有已经选上的班级，由于本程序不会退选已选上的课程，所以取candidate_combination里面的前两个班级即可，再加入已选上的班级。
-            #       接着按顺序把班级添加进classTable，添加到那个已选上的课程时，就可以停止了。
-            if course.status == Constants.CourseStatus.NOT_SELECTED:
-                for class_ in candidateCombination:
-                    classTable.append(class_)
-            else:
-                # 最极端的情况下，系统可以在已选课程前再插入两个更好的教学班
-                candidateCombination = candidateCombination[:2]
-                candidateCombination.append(confirmedClass)
-                # 再依次加入candidate_combination里面的班级，直到加入已选上的班级
-                for class_ in candidateCombination:
-                    classTable.append(class_)
-                    if class_ == confirmedClass:
-                        break
+            appendedClasses = applyCandidateCombination(classTable, course, candidateCombination, confirmedClass)
             # 递归调用_select，处理下一个课程
-            _select(_priority, index + 1)
-            # 撤销本次尝试，也要分两种情况
-            # 1.    这门课程是未选上的课程。这种情况下，直接将candidate_combination里面的班级从classTable里面删除即可。
-            # 2.    这门课程是已选上的课程。按照次序，将candidate_combination里面的班级从classTable里面删除。
-            #       直到删除已选上的班级为止。
-            if course.status == Constants.CourseStatus.NOT_SELECTED:
-                for class_ in candidateCombination:
-                    classTable.removeClass(class_)
-            else:
-                for class_ in candidateCombination:
-                    classTable.removeClass(class_)
-                    if class_ == confirmedClass:
-                        break
+            _select(index + 1, childShare)
+            # 撤销本次尝试
+            undoCandidateCombination(classTable, appendedClasses)
+            if stats.budgetExhausted:
+                break   # 预算已经用完（或者正在贪心地选），不再尝试其他志愿组合
         # 恢复已选上的课程
         if course.status == Constants.CourseStatus.SELECTED:
             classTable.append(confirmedClass)
 
-        _select(_priority, index + 1)  # 不选这门课程也要尝试/不做更改也要尝试
+        if stats.budgetExhausted and candidateCombinations:
+            return
+        _select(index + 1, childShare)  # 不选这门课程也要尝试/不做更改也要尝试
+
+    _select(startIndex, 1.0)
+
 
-    # 逐优先级开始递归调用_select，选出这个优先级下的最优课表
-    for i, priority in enumerate(sorted(list(priorityGroup.keys()), reverse=True)):
-        _select(priority, 0)
-        bestClassTable.copyTo(classTable)  # 保存这一个优先级的最优课表。下一个优先级的课程要在这个基硃上继续选课
-        doubleVar.set(i / len(priorityGroup.keys()))
+def getSubtreeTables(classTable: ClassTable, courses: List[Course], depth: int) -> List[List[int]]:
+    """
+    把一个优先级的搜索树的前depth层展开，得到各个子树的根节点处的课表。
+    子树的顺序和searchPriorityGroup访问它们的顺序相同。
+    :param classTable: 课表对象。函数返回时会恢复原状
+    :param courses: 这个优先级内的所有课程
+    :param depth: 展开的层数
+    :return: [[班级编号, ...], ...] 每个子树根节点处课表内的班级的编号(Class.index)，按课表内的顺序排列
+    """
+    result = []
+
+    def _expand(index: int):
+        if index == depth:
+            result.append([class_.index for class_ in classTable.classes])
+            return
+        course = courses[index]
+        confirmedClass = None
+        if course.status == Constants.CourseStatus.SELECTED:
+            confirmedClass = getConfirmedClass(course)
+            classTable.removeClass(confirmedClass)
+        for candidateCombination in getCourseCandidateCombination(course, classTable):
+            appendedClasses = applyCandidateCombination(classTable, course, candidateCombination, confirmedClass)
+            _expand(index + 1)
+            undoCandidateCombination(classTable, appendedClasses)
+        if course.status == Constants.CourseStatus.SELECTED:
+            classTable.append(confirmedClass)
+        _expand(index + 1)
+
+    _expand(0)
+    return result
+
+
+# 以下是并行搜索时子进程内使用的全局变量。由_initSearchWorker填充
+_workerWishList: WishList | None = None
+_workerSharedBestRate = None
+_workerCancelToken: CancellationToken | None = None
+
+
+def _initSearchWorker(allClassSet: List[Class], wishList: WishList, courseKeyRegistry: Dict[str, int],
+                      sharedBestRate, cancelEvent):
+    """
+    并行搜索的子进程初始化函数。进程池启动子进程时传入这些参数：
+    fork方式启动时子进程直接继承主进程中的对象；spawn方式（Windows）启动时，所有参数作为同一个元组一起序列化，
+    所以子进程里班级引用的课程对象和愿望清单里的课程对象仍然是同一个对象
+    :param allClassSet: 所有班级。子进程用它替换data.allClassSet并重新建立索引
+    :param wishList: 愿望列表对象
+    :param courseKeyRegistry: 主进程的课程代码到课程键的映射。见Course.getCourseKeyRegistry
+    :param sharedBestRate: 各进程共享的当前优先级的最优得分(multiprocessing.Value)
+    :param cancelEvent: 主进程取消搜索时设置的multiprocessing.Event
+    """
+    global _workerWishList, _workerSharedBestRate, _workerCancelToken
+    Course.setCourseKeyRegistry(courseKeyRegistry)  # 课程键与进程有关，子进程要使用和主进程相同的映射
+    data.allClassSet[:] = allClassSet
+    data.buildClassIndex()
+    _workerWishList = wishList
+    _workerSharedBestRate = sharedBestRate
+    _workerCancelToken = CancellationToken(cancelEvent)
+
+
+def _searchSubtree(priority: int, tableClassIndices: List[int], startIndex: int,
+                   bestRateList: List[float | None]) -> Tuple[Tuple[List[float | None], List[int]] | None, SearchStats]:
+    """
+    在子进程内搜索一棵子树
+    :param priority: 当前优先级
+    :param tableClassIndices: 子树根节点处课表内的班级的编号
+    :param startIndex: 子树根节点对应的课程在这个优先级内的索引
+    :param bestRateList: 开始搜索这个优先级时的最优评分列表
+    :return: ((评分列表, 班级编号列表), 这棵子树的搜索统计)。这棵子树里没有更好的课表时，第一项为None
+    """
+    global _activeStats, _activeCancelToken
+    classTable = ClassTable()
+    for index in tableClassIndices:
+        classTable.append(data.allClassSet[index])
+    courses = getPriorityGroup(_workerWishList)[priority]
+    bestClassTable = ClassTable()
+    subtreeBestRateList = list(bestRateList)
+    stats = SearchStats()
+    _activeStats = stats
+    _activeCancelToken = _workerCancelToken
+    try:
+        searchPriorityGroup(classTable, _workerWishList, courses, bestClassTable, subtreeBestRateList,
+                            startIndex, _workerSharedBestRate, stats, cancelToken=_workerCancelToken)
+    except OperationCancelled:
+        stats.cancelled = True  # 主进程已经放弃了这次搜索，结果不会被使用
+    finally:
+        _activeStats = None
+        _activeCancelToken = None
+    if rateListCmp(subtreeBestRateList, bestRateList) > 0:
+        return (subtreeBestRateList, [class_.index for class_ in bestClassTable.classes]), stats
+    return None, stats
+
+
+# 并行搜索时展开搜索树的层数。层数越多，子任务越多，各进程的负载越均衡
+PARALLEL_SPLIT_DEPTH = 2
+# 并行搜索最多使用的进程数。Windows上ProcessPoolExecutor最多只能有61个进程；
+# 而且子树之间只能通过共享的最优得分互相剪枝，进程越多，多搜索的节点越多
+PARALLEL_MAX_WORKERS = 8
+# 并行搜索前先在本进程内试着搜索的节点数。在这之内搜索完的优先级不交给进程池。
+# 子树之间剪枝不及时，并行搜索访问的节点数可能是串行的数倍（中等规模的例子中2470对10529），还要加上启动进程池的开销，
+# 只有很大的搜索树才值得并行。串行搜索每秒大约访问2000个节点，5000个节点约为2~3秒
+PARALLEL_PROBE_NODES = 5000
+CANCEL_CHECK_INTERVAL = 0.1     # 并行搜索时每隔多少秒检查一次是否已经取消
+
+
+def selectClass(classTable: ClassTable, wishList: WishList, doubleVar, workers: int = 1,
+                recalculate: bool = True, stats: SearchStats = None,
+                onProgress: Callable[[SearchStats], None] = None, budget: SearchBudget = None,
+                cancelToken: CancellationToken = None) -> ClassTable:
+    """
+    选课算法。调用这个函数的时候，所有数据应该都已经加载好了。
+    :param classTable: 课程表对象
+    :param wishList: 愿望列表对象
+    :param doubleVar: 用于显示进度条
+    :param workers: 搜索最多使用的进程数，不超过PARALLEL_MAX_WORKERS。大于1时每个优先级先在本进程内试搜索PARALLEL_PROBE_NODES个节点，
+                    搜索不完的才把搜索树的前几层展开成子任务，交给进程池并行搜索。结果与串行搜索相同
+    :param recalculate: 是否重新计算所有课程的评分并清空志愿组合缓存。
+                        为False时沿用已有的评分和缓存，调用者需要自己保证它们是最新的（见updatePossibilityRates、invalidateCandidateCache）
+    :param stats: 记录搜索统计的对象。搜索结束后可以用stats.getReport()得到统计报告
+    :param onProgress: 搜索时定期调用的回调函数 onProgress(stats)，用于显示进度
+    :param budget: 搜索预算。预算用完时提前返回目前找到的最优课表，stats.coveragePerPriority记录了各优先级搜索完的比例。
+                   有预算时在本进程内搜索，忽略workers，以便随时可以通过stats.getBestSoFar()读取最优课表
+    :param cancelToken: 取消令牌。取消时尽快停止搜索，把目前找到的最优课表写入classTable并返回，stats.cancelled为True
+    :return: 选课结果。选课结果也会直接写入classTable对象。
+    """
+
+    if not wishList.wishes:  # 没有课程需要选
+        return classTable
+
+    global _activeStats, _activeCancelToken
+    if stats is None:
+        stats = SearchStats()
+    startTime = time.perf_counter()
+    if budget is not None:
+        budget.start()
+        workers = 1
+
+    def _reportProgress(_stats: SearchStats):
+        doubleVar.set(_stats.progress)
+        if onProgress is not None:
+            onProgress(_stats)
+
+    wishList.wishes.sort(key=lambda x: x.priority, reverse=True)
+    if recalculate:
+        start = time.perf_counter()
+        calculateClassRates(wishList.wishes)  # 在这里计算好所有课程的评分，以便后续使用
+        stats.ratingTime += time.perf_counter() - start
+        clearCandidateCache()   # 评分变了，之前缓存的志愿组合不再有效
+    # 按照优先级分组
+    priorityGroup = getPriorityGroup(wishList)
+    stats.priorityCount = len(priorityGroup)
+
+    # for class_ in classTable.classes:
+    #     calculateClassRate(class_.course)
+
+    wishList.maxPriority = max(priorityGroup.keys())
+    bestClassTable = ClassTable()
+    classTable.copyTo(bestClassTable)
+    bestRateList = getClassTableRateList(classTable, wishList)
+    with stats.lock:
+        stats.bestClassTable = bestClassTable
+        stats.bestRateList = bestRateList
+
+    executor = None
+    sharedBestRate = None
+    cancelEvent = None
+    workers = min(workers, PARALLEL_MAX_WORKERS)
+
+    _activeStats = stats
+    _activeCancelToken = cancelToken
+    try:
+        # 逐优先级搜索，选出这个优先级下的最优课表
+        for i, priority in enumerate(sorted(list(priorityGroup.keys()), reverse=True)):
+            courses = priorityGroup[priority]
+            stats.enterPriority(priority)
+            if workers <= 1:
+                searchPriorityGroup(classTable, wishList, courses, bestClassTable, bestRateList,
+                                    stats=stats, onProgress=_reportProgress, budget=budget, cancelToken=cancelToken)
+            else:
+                # 先在本进程内试着搜索。试搜索按串行搜索的顺序进行，找到的课表是串行搜索最先找到的那些课表中最好的，
+                # 即使没有搜索完，也可以作为并行搜索的初始最优解
+                probeStats = SearchStats()
+                probeClassTable = ClassTable()
+                bestClassTable.copyTo(probeClassTable)
+                probeRateList = list(bestRateList)
+                probeBudget = SearchBudget(nodes=PARALLEL_PROBE_NODES)
+                probeBudget.start()
+                searchPriorityGroup(classTable, wishList, courses, probeClassTable, probeRateList,
+                                    stats=probeStats, budget=probeBudget, cancelToken=cancelToken)
+                stats.merge(probeStats)
+                with stats.lock:
+                    probeClassTable.copyTo(bestClassTable)
+                    bestRateList.clear()
+                    bestRateList.extend(probeRateList)
+                if not probeStats.budgetExhausted:
+                    stats.currentProgress = probeStats.currentProgress
+                else:
+                    if executor is None:
+                        sharedBestRate = multiprocessing.Value('d', float('-inf'))
+                        cancelEvent = multiprocessing.Event()   # 取消时通知子进程
+                        executor = ProcessPoolExecutor(
+                            max_workers=workers,
+                            initializer=_initSearchWorker,
+                            initargs=(data.allClassSet, wishList, Course.getCourseKeyRegistry(), sharedBestRate,
+                                      cancelEvent)
+                        )
+                    # 各子树独立搜索，然后按照串行搜索访问子树的顺序合并结果。
+                    # 只有严格更好的结果才会替换当前最优解，所以得分相同时和串行搜索一样保留先找到的课表
+                    stats.currentProgress = 0.0
+                    depth = min(PARALLEL_SPLIT_DEPTH, len(courses))
+                    groupBestRate = bestRateList[wishList.maxPriority - priority]
+                    sharedBestRate.value = float('-inf') if groupBestRate is None else groupBestRate
+                    futures = [
+                        executor.submit(_searchSubtree, priority, tableClassIndices, depth, list(bestRateList))
+                        for tableClassIndices in getSubtreeTables(classTable, courses, depth)
+                    ]
+                    for j, future in enumerate(futures):
+                        while cancelToken is not None and not future.done():   # 等待子进程时也要响应取消
+                            cancelToken.raiseIfCancelled()
+                            wait([future], timeout=CANCEL_CHECK_INTERVAL)
+                        subtreeResult, subtreeStats = future.result()
+                        stats.merge(subtreeStats)
+                        stats.currentProgress = (j + 1) / len(futures)
+                        _reportProgress(stats)
+                        if subtreeResult is not None and rateListCmp(subtreeResult[0], bestRateList) > 0:
+                            with stats.lock:
+                                bestRateList.clear()
+                                bestRateList.extend(subtreeResult[0])
+                                bestClassTable.clear()
+                                for index in subtreeResult[1]:
+                                    bestClassTable.append(data.allClassSet[index])
+            bestClassTable.copyTo(classTable)  # 保存这一个优先级的最优课表。下一个优先级的课程要在这个基硃上继续选课
+            stats.finishPriority()
+            _reportProgress(stats)
+    except OperationCancelled:
+        # bestClassTable只在找到完整的课表时整体更新，总是可以直接使用的
+        stats.cancelled = True
+        if cancelEvent is not None:
+            cancelEvent.set()
+        with stats.lock:
+            bestClassTable.copyTo(classTable)
+    finally:
+        _activeStats = None
+        _activeCancelToken = None
+        stats.totalTime += time.perf_counter() - startTime
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
     doubleVar.set(1)
     return classTable
@@ -0,0 +1,75 @@
+import os
+import sys
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from Entities.Course import Course
+
+
+@pytest.fixture
+def courseKeyRegistry():
+    """
+    在空的课程键映射上运行测试，结束后恢复原来的映射
+    """
+    registry = Course.getCourseKeyRegistry()
+    Course.setCourseKeyRegistry({})
+    yield
+    Course.setCourseKeyRegistry(registry)
+
+
+@pytest.fixture(scope="session")
+def semester():
+    """
+    一个小的模拟学期 (courses, classes, chosen)，见benchmark.synthetic
+    """
+    from benchmark.synthetic import SemesterConfig, generateSemester
+    return generateSemester(SemesterConfig(courseCount=40, classesPerCourse=(1, 6), chosenCount=2, seed=1))
+
+
+@pytest.fixture
+def workDir(tmp_path, monkeypatch):
+    """
+    在临时目录中读写数据文件，教师评分仍然使用项目中的teacher.json
+    """
+    import data
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data, "TEACHER_DATA_PATH", os.path.join(REPO_DIR, "teacher.json"))
+    monkeypatch.setattr(data, "TEACHER_INDEX_PATH", str(tmp_path / "teacher.idx"))
+    return tmp_path
+
+
+@pytest.fixture
+def zdbkServer(semester, tmp_path_factory, monkeypatch):
+    """
+    用模拟学期数据启动的本地模拟服务器，network的请求都发给它
+    """
+    import network
+    from benchmark.synthetic import writeSemester
+    from mockServer import startMockServer
+    fixtureDir = str(tmp_path_factory.mktemp("fixture"))
+    writeSemester(fixtureDir, *semester)
+    server = startMockServer(fixtureDir)
+    monkeypatch.setattr(network, "ZDBK_BASE_URL", server.baseUrl)
+    monkeypatch.setattr(network, "chosenClasses", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def wishedSemester(workDir, semester, monkeypatch):
+    """
+    在workDir中写出12门愿望课程对应的courses.json、classes.json，并加载课程数据
+    :return: 愿望清单中课程的课程代码
+    """
+    import random
+    import network
+    from benchmark.scaling import loadWishedSemester
+    courses, classes, chosen = semester
+    monkeypatch.setattr(network, "chosenClasses", None)
+    indices = random.Random(0).sample(range(len(courses)), 12)
+    loadWishedSemester(courses, classes, chosen, indices)
+    return [courses[i]["xskcdm"] for i in indices]
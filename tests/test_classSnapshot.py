@@ -0,0 +1,62 @@
+import os
+import pytest
+import classSnapshot
+import data
+from benchmark.scaling import NullProgress
+from Entities.WishList import WishList
+from Entities.ClassTable import ClassTable
+from selectClass import selectClass
+
+pytestmark = pytest.mark.usefixtures("courseKeyRegistry")
+
+
+def describeClasses():
+    return [(class_.classCode, class_.course.key, class_.teacherNames, class_.semester, class_.classTime.mask,
+             [(examTime.startTime, examTime.endTime, examTime.noExam) for examTime in class_.examTimeList],
+             class_.available, class_.unfiltered, class_.status, class_.originClassTimeStr,
+             class_.originSemesterStr, class_.location)
+            for class_ in data.allClassSet]
+
+
+def solve(codes):
+    classTable = ClassTable()
+    data.initClassTable(classTable)
+    wishList = WishList()
+    for priority, code in enumerate(codes):
+        wishList.append(data.getCourseFromCourseCode(code)).withPriority(priority % 3)
+    selectClass(classTable, wishList, NullProgress())
+    return sorted(class_.classCode for class_ in classTable.classes)
+
+
+def testRoundTrip(wishedSemester):
+    assert not os.path.exists(classSnapshot.CLASS_SNAPSHOT_PATH)
+    data.loadClassData(NullProgress())
+    fromJson = describeClasses()
+    failures = list(data.classLoadFailures)
+    selection = solve(wishedSemester)
+    assert os.path.exists(classSnapshot.CLASS_SNAPSHOT_PATH)
+    assert data.classData
+
+    data.loadClassData(NullProgress())
+    assert not data.classData   # 从快照读取时不解析json
+    assert describeClasses() == fromJson
+    assert data.classLoadFailures == failures
+    assert solve(wishedSemester) == selection
+
+
+def testStaleSnapshotIsRejected(wishedSemester, monkeypatch):
+    data.loadClassData(NullProgress())
+    with open("classes.json", "rb") as f:
+        digest = classSnapshot.getSourceDigest(f.read())
+    classSnapshot.ClassSnapshot(classSnapshot.CLASS_SNAPSHOT_PATH, digest).close()
+
+    with pytest.raises(ValueError):
+        classSnapshot.ClassSnapshot(classSnapshot.CLASS_SNAPSHOT_PATH, classSnapshot.getSourceDigest(b"[]"))
+    monkeypatch.setattr(classSnapshot, "PARSER_VERSION", classSnapshot.PARSER_VERSION + 1)
+    with pytest.raises(ValueError):
+        classSnapshot.ClassSnapshot(classSnapshot.CLASS_SNAPSHOT_PATH, digest)
+
+    # 解析代码的版本变化后重新解析json
+    data.loadClassData(NullProgress())
+    assert data.classData
+    classSnapshot.ClassSnapshot(classSnapshot.CLASS_SNAPSHOT_PATH, digest).close()
@@ -0,0 +1,58 @@
+import itertools
+import pytest
+from Entities.Course import Course
+
+pytestmark = pytest.mark.usefixtures("courseKeyRegistry")
+
+
+@pytest.mark.parametrize("order", list(itertools.permutations(["A", "B", "A（B）"])))
+def testFormsShareOneKeyInAnyOrder(order):
+    keys = [Course.getCourseKey(code) for code in order]
+    assert len({Course.getCourseKey(code) for code in order}) == 1
+    assert Course.isEqualCourseCode("A（B）", "B")
+    assert Course.isEqualCourseCode("A", "B")
+    assert min(keys) == Course.getCourseKey("A")
+
+
+def testBridgingCodeDoesNotMergeDistinctCourses():
+    first = Course.getCourseKey("A（B）")
+    second = Course.getCourseKey("C（D）")
+    assert Course.getCourseKey("B（C）") == first
+    assert Course.getCourseKey("A") != Course.getCourseKey("D")
+    assert not Course.isEqualCourseCode("A（B）", "C（D）")
+    assert Course.isEqualCourseCode("B（C）", "A（B）") and Course.isEqualCourseCode("B（C）", "C（D）")
+    assert Course.getCourseKey("C") == second
+
+
+def testMergeAfterConstructionUpdatesExistingCourses():
+    new = Course("NEW1", "课程", 1.0, None, "", "")
+    old = Course("OLD1", "课程", 1.0, None, "", "")
+    both = Course("NEW1（OLD1）", "课程", 1.0, None, "", "")
+    assert Course.isEqualCourseCode("OLD1", "NEW1（OLD1）")
+    assert new == old == both
+    assert hash(new) == hash(old) == hash(both)
+    assert len({new.key, old.key, both.key}) == 1
+
+
+def testDifferentCoursesKeepDifferentKeys():
+    assert Course.getCourseKey("A（B）") != Course.getCourseKey("C（D）")
+    assert not Course.isEqualCourseCode("A", "C")
+
+
+def testLookupsDoNotAllocate():
+    Course.getCourseKey("A（B）")
+    registry = Course.getCourseKeyRegistry()
+    assert Course.findCourseKey("X") is None
+    assert Course.findCourseKey("B") == Course.findCourseKey("X（A）")
+    assert Course.isEqualCourseCode("X（B）", "A")
+    assert not Course.isEqualCourseCode("X", "Y")
+    assert Course.getCourseKeyRegistry() == registry
+
+
+def testRegistryRestoresCounter():
+    first = Course.getCourseKey("A")
+    registry = Course.getCourseKeyRegistry()
+    Course.setCourseKeyRegistry({})
+    Course.setCourseKeyRegistry(registry)
+    assert Course.getCourseKey("A（B）") == first
+    assert Course.getCourseKey("C") != first
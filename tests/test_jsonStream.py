@@ -0,0 +1,63 @@
+import json
+import pytest
+import jsonStream
+
+DOCUMENT = json.dumps([
+    {"kcdm": "MATH1136G", "kcmc": "微积分（甲）Ⅰ", "credit": -3.5e10},
+    [],
+    {},
+    "字符串里有]和,",
+    12345,
+    True,
+    None,
+], ensure_ascii=False).encode("utf-8")
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, len(DOCUMENT)])
+def testChunkBoundaries(size):
+    # 块大小为1、2时，多字节字符和数字都会被切开
+    assert list(jsonStream.iterJsonArray(split(DOCUMENT, size))) == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3])
+def testSplitMultiByteCharacter(size):
+    data = '["选课", "ü"]'.encode("utf-8")
+    assert list(jsonStream.iterJsonArray(split(data, size))) == ["选课", "ü"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("[]", []),
+    (" [ ] ", []),
+    ("[1]", [1]),
+    ('[1, "a", {"b": [2]}]', [1, "a", {"b": [2]}]),
+])
+def testValidArrays(text, expected):
+    for size in range(1, len(text) + 1):
+        assert list(jsonStream.iterJsonArray(split(text.encode("utf-8"), size))) == expected
+
+
+@pytest.mark.parametrize("text", ["[1,]", "[1 2]", "[,1]", "{}", "", "[1", "[1,", '["abc', "[1.5e"])
+def testInvalidArrays(text):
+    for size in range(1, len(text) + 1):
+        with pytest.raises(ValueError):
+            list(jsonStream.iterJsonArray(split(text.encode("utf-8"), size)))
+    with pytest.raises(ValueError):
+        list(jsonStream.iterJsonArray([text.encode("utf-8")]))
+
+
+def testTruncatedInputYieldsCompleteElementsFirst():
+    elements = []
+    with pytest.raises(ValueError):
+        for element in jsonStream.iterJsonArray([b'[1, 2, {"a": ']):
+            elements.append(element)
+    assert elements == [1, 2]
+
+
+def testFile(tmp_path):
+    path = tmp_path / "array.json"
+    path.write_bytes(DOCUMENT)
+    assert list(jsonStream.iterJsonArrayFile(str(path))) == json.loads(DOCUMENT)
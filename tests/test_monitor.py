@@ -0,0 +1,137 @@
+import threading
+import time
+import pytest
+import data
+import network
+from Entities.WishList import WishList
+from Entities.ClassTable import ClassTable
+import monitor as monitor_
+from monitor import EnrollmentMonitor
+import selectClass as selectClass_
+from selectClass import selectClass
+
+pytestmark = pytest.mark.usefixtures("courseKeyRegistry")
+
+
+class NullProgress:
+    def set(self, value):
+        pass
+
+
+@pytest.fixture
+def solved(workDir, zdbkServer, semester):
+    """
+    从模拟服务器下载数据并选一次课
+    :return: (选课前的课表, 选课结果, 愿望清单)
+    """
+    courses, _, _ = semester
+    network.updateCoursesJson(NullProgress())
+    data.loadCourseData()
+    wishList = WishList()
+    for course in courses[:6]:
+        wishList.append(data.getCourseFromCourseCode(course["xskcdm"]))
+    network.updateClassJson(wishList, NullProgress())
+    data.loadClassData(NullProgress())
+    classTable = ClassTable()
+    data.initClassTable(classTable)
+    baseTable = ClassTable()
+    classTable.copyTo(baseTable)
+    selectClass(classTable, wishList, NullProgress())
+    return baseTable, classTable, wishList
+
+
+def setAvailable(server, classCode: str, available: int):
+    for classes in server.classesByCourseCode.values():
+        for class_ in classes:
+            if class_["xkkh"] == classCode:
+                class_["rs"] = f"{available}/{class_['rs'].split('/')[1]}"
+                return
+    raise KeyError(classCode)
+
+
+def testPollWithoutChangesDoesNotResolve(solved):
+    baseTable, classTable, wishList = solved
+    results = []
+    monitor = EnrollmentMonitor(baseTable, classTable, wishList, NullProgress(),
+                                onResult=lambda table, deltas: results.append(table))
+    assert monitor.getWatchedCourses()
+    assert monitor.poll() is None
+    assert results == []
+
+
+def testFullClassTriggersResolve(solved, zdbkServer):
+    baseTable, classTable, wishList = solved
+    baseCodes = {class_.classCode for class_ in baseTable.classes}
+    target = next(class_ for class_ in classTable.classes if class_.classCode not in baseCodes)
+    results = []
+    monitor = EnrollmentMonitor(baseTable, classTable, wishList, NullProgress(),
+                                onResult=lambda table, deltas: results.append((table, deltas)))
+
+    available = target.available
+    setAvailable(zdbkServer, target.classCode, 0)
+    newTable = monitor.poll()
+    assert newTable is not None
+    assert len(results) == 1 and results[0][0] is newTable
+    assert [(class_.classCode, delta) for class_, delta, _ in results[0][1]] == [(target.classCode, -available)]
+    assert target.available == 0
+    assert target.classCode not in {class_.classCode for class_ in newTable.classes}
+    assert all(class_.classCode in {c.classCode for c in newTable.classes} for class_ in baseTable.classes)
+
+
+def testPollErrorsAreReported(solved, zdbkServer, monkeypatch):
+    baseTable, classTable, wishList = solved
+    errors = []
+    monitor = EnrollmentMonitor(baseTable, classTable, wishList, NullProgress(), onResult=lambda *args: None,
+                                onError=errors.append, interval=0.01)
+    zdbkServer.failureRate = 1
+    monkeypatch.setattr(network, "REQUEST_RETRIES", 1)
+    monitor.start()
+    try:
+        for _ in range(500):
+            if errors:
+                break
+            time.sleep(0.01)
+    finally:
+        monitor.stop(wait=True)
+    assert errors and monitor.lastError is errors[-1]
+
+
+def testAnyChangeDropsCachedCombinations(solved, zdbkServer, monkeypatch):
+    baseTable, classTable, wishList = solved
+    baseCodes = {class_.classCode for class_ in baseTable.classes}
+    target = next(class_ for class_ in classTable.classes if class_.classCode not in baseCodes)
+    monitor = EnrollmentMonitor(baseTable, classTable, wishList, NullProgress(), onResult=lambda *args: None)
+    assert any(key[0] == target.course.key for key in selectClass_._candidateCache)
+
+    # 重新选课会重新填充缓存，所以在丢弃缓存的时刻检查
+    invalidated = []
+
+    def _invalidate(courseKeys):
+        selectClass_.invalidateCandidateCache(courseKeys)
+        invalidated.append(any(key[0] == target.course.key for key in selectClass_._candidateCache))
+
+    monkeypatch.setattr(monitor_, "invalidateCandidateCache", _invalidate)
+    # 余量只少了一个，排名不一定变化，但缓存的志愿组合也要丢弃
+    setAvailable(zdbkServer, target.classCode, target.available - 1)
+    monitor.poll()
+    assert invalidated == [False]
+
+
+def testStopInterruptsPoll(solved, monkeypatch):
+    baseTable, classTable, wishList = solved
+    requested = threading.Event()
+
+    def _slowFetch(course):
+        requested.set()
+        time.sleep(5)
+        return []
+
+    monkeypatch.setattr(network, "fetchClassDetail", _slowFetch)
+    monitor = EnrollmentMonitor(baseTable, classTable, wishList, NullProgress(), onResult=lambda *args: None,
+                                interval=0.01)
+    monitor.start()
+    assert requested.wait(5)
+    start = time.perf_counter()
+    monitor.stop(wait=True)
+    assert time.perf_counter() - start < 1
+    assert monitor.pollCount == 0
@@ -0,0 +1,126 @@
+import json
+import os
+import pytest
+import network
+import data
+from Entities.WishList import WishList
+from Entities.Course import Course
+from Entities.CancellationToken import CancellationToken, OperationCancelled
+
+
+class NullProgress:
+    def set(self, value):
+        pass
+
+
+def readCourses():
+    with open("courses.json", encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def testUpdateCoursesJson(workDir, zdbkServer, semester):
+    courses, _, _ = semester
+    network.updateCoursesJson(NullProgress())
+    assert readCourses() == courses
+    assert not [name for name in os.listdir(workDir) if name.endswith(".part")]
+
+    # 有效期内不重新下载，force时重新下载
+    requestCount = zdbkServer.requestCount
+    network.updateCoursesJson(NullProgress())
+    assert zdbkServer.requestCount == requestCount
+    network.updateCoursesJson(NullProgress(), force=True)
+    assert zdbkServer.requestCount == requestCount + len(network.COURSE_CATEGORIES)
+
+
+def testUpdateCoursesJsonKeepsFinishedCategories(workDir, zdbkServer, semester, monkeypatch):
+    courses, _, _ = semester
+    failedCategory = network.COURSE_CATEGORIES[2][0]
+    postJson = network.postJson
+
+    def _failingPostJson(url, data, onProgress=None, path=None):
+        if data.get("dl") == failedCategory:
+            raise network.r.ConnectionError("category unavailable")
+        return postJson(url, data, onProgress, path)
+
+    monkeypatch.setattr(network, "postJson", _failingPostJson)
+    with pytest.raises(network.r.ConnectionError):
+        network.updateCoursesJson(NullProgress(), force=True)
+    assert not os.path.exists("courses.json")
+    assert set(network.loadSyncState()["courseCategories"]) == \
+        {dl for dl, _ in network.COURSE_CATEGORIES} - {failedCategory}
+
+    # 再次更新时只下载失败的类别
+    monkeypatch.setattr(network, "postJson", postJson)
+    requestCount = zdbkServer.requestCount
+    network.updateCoursesJson(NullProgress(), force=True)
+    assert zdbkServer.requestCount == requestCount + 1
+    assert readCourses() == courses
+    assert network.loadSyncState()["courseCategories"] == {}
+
+
+def createWishList(courses) -> WishList:
+    network.updateCoursesJson(NullProgress())
+    data.loadCourseData()
+    wishList = WishList()
+    for course in courses:
+        wishList.append(data.getCourseFromCourseCode(course["xskcdm"]))
+    return wishList
+
+
+@pytest.mark.usefixtures("courseKeyRegistry")
+def testUpdateClassJsonKeepsFinishedCourses(workDir, zdbkServer, semester, monkeypatch):
+    courses, _, _ = semester
+    wishList = createWishList(courses[:4])
+    failedCode = courses[1]["kcdm"]
+    fetchClassDetail = network.fetchClassDetail
+
+    def _failingFetch(course):
+        if course["kcdm"] == failedCode:
+            raise network.r.ConnectionError("course unavailable")
+        return fetchClassDetail(course)
+
+    monkeypatch.setattr(network, "fetchClassDetail", _failingFetch)
+    with pytest.raises(network.r.ConnectionError):
+        network.updateClassJson(wishList, NullProgress())
+    assert not os.path.exists("classes.json")
+    saved = set(network.loadSyncState()["classes"])
+    assert failedCode not in saved and {course["kcdm"] for course in courses[:4]} - {failedCode} <= saved
+
+    # 再次更新时只下载失败的课程；不在愿望清单中的课程从同步状态中删除
+    monkeypatch.setattr(network, "fetchClassDetail", fetchClassDetail)
+    requestCount = zdbkServer.requestCount
+    network.updateClassJson(wishList, NullProgress())
+    assert zdbkServer.requestCount == requestCount + 1
+    chosenCodes = [class_["t_kcdm"] for class_ in network.getChosenClasses()]
+    dropped = next(course for course in wishList.wishes
+                   if not any(Course.isEqualCourseCode(course.courseCode, code) for code in chosenCodes))
+    wishList.wishes.remove(dropped)
+    network.updateClassJson(wishList, NullProgress())
+    assert data.courseRecordByKey[dropped.key].queryCode not in network.loadSyncState()["classes"]
+
+def testUpdateCoursesJsonDropsRemovedCourses(workDir, zdbkServer, semester):
+    courses, _, _ = semester
+    state = network.loadSyncState()
+    entry = {"time": 0, "fingerprint": "", "detail": []}
+    state["classes"] = {"REMOVED": entry, courses[0]["kcdm"]: entry}
+    network.saveSyncState(state)
+    network.updateCoursesJson(NullProgress(), force=True)
+    assert set(network.loadSyncState()["classes"]) == {courses[0]["kcdm"]}
+
+
+def testFetchClassDetailsCanBeCancelled(zdbkServer, semester):
+    courses, _, _ = semester
+    cancelToken = CancellationToken()
+    cancelToken.cancel()
+    with pytest.raises(OperationCancelled):
+        network.fetchClassDetails(courses[:3], cancelToken=cancelToken)
+    assert len(network.fetchClassDetails(courses[:3])) == 3
+
+
+@pytest.mark.usefixtures("courseKeyRegistry")
+def testMockServerIgnoresClientCourseKeys(zdbkServer):
+    code = next(iter(zdbkServer.classesByCourseCode))
+    assert zdbkServer.getClassesOfCourse(f"OTHER（{code}）") == zdbkServer.classesByCourseCode[code]
+    # 客户端登记的课程键把OTHER和code连在一起，模拟服务器不应该受影响
+    Course.getCourseKey(f"OTHER（{code}）")
+    assert zdbkServer.getClassesOfCourse("OTHER") == []
@@ -0,0 +1,75 @@
+import pickle
+import pytest
+import data
+from benchmark.scaling import NullProgress
+
+
+@pytest.fixture(autouse=True)
+def emptyParseCache():
+    data.clearParseCache()
+    yield
+    data.clearParseCache()
+
+
+def testClassTimeIsShared():
+    first = data.getClassTimeFromString("周一第3,4,5节;周三第1,2节", "春夏")
+    assert data.getClassTimeFromString("周一第3,4,5节;周三第1,2节", "春夏") is first
+    assert data.getClassTimeFromString("周一第3,4,5节;周三第1,2节", "春") is not first
+    assert data.parseCacheStats["classTime"] == {"hits": 1, "misses": 2}
+    assert first.mask == data._parseClassTimeString("周一第3,4,5节;周三第1,2节", "春夏").mask
+
+
+def testExamTimesAreSharedAcrossStrings():
+    both = data.getExamTimeListFromString("2025年04月12日(14:00-16:00);2025年06月13日(08:00-10:00)")
+    single = data.getExamTimeListFromString("2025年06月13日(08:00-10:00)")
+    assert single[0] is both[1]
+    assert data.getExamTimeListFromString("") == data.getExamTimeListFromString("--")
+    assert data.getExamTimeListFromString("")[0].noExam
+
+    # 返回的列表是新的，修改它不会影响缓存
+    both.clear()
+    assert len(data.getExamTimeListFromString("2025年04月12日(14:00-16:00);2025年06月13日(08:00-10:00)")) == 2
+
+
+def testSharedTimesAreImmutable():
+    classTime = data.getClassTimeFromString("周一第3,4,5节;周三第1,2节", "春夏")
+    examTime = data.getExamTimeListFromString("2025年06月13日(08:00-10:00)")[0]
+    with pytest.raises(AttributeError):
+        classTime.mask = 0
+    with pytest.raises(AttributeError):
+        classTime.firstHalfTimeList.append((2, 1))
+    with pytest.raises(AttributeError):
+        examTime.noExam = True
+    assert classTime.firstHalfTimeList == ((1, 3), (1, 4), (1, 5), (3, 1), (3, 2))
+    # 并行搜索时时间对象要传给子进程
+    assert pickle.loads(pickle.dumps(classTime)) == classTime
+    copied = pickle.loads(pickle.dumps(examTime))
+    assert (copied.startTime, copied.endTime, copied.noExam) == (examTime.startTime, examTime.endTime, examTime.noExam)
+
+
+def testCacheIsBounded(monkeypatch):
+    monkeypatch.setattr(data, "PARSE_CACHE_SIZE", 4)
+    first = data.getClassTimeFromString("周一第1节", "春夏")
+    for period in range(2, 12):
+        data.getClassTimeFromString("周一第1节", "春夏")    # 一直在用的结果不会被淘汰
+        data.getClassTimeFromString(f"周二第{period}节", "春夏")
+        assert len(data._classTimeCache) <= 4
+    assert data.getClassTimeFromString("周一第1节", "春夏") is first
+    assert ("周二第2节", "春夏") not in data._classTimeCache
+    for string in (f"2025年04月{day:02d}日(14:00-16:00)" for day in range(1, 20)):
+        data.getExamTimeListFromString(string)
+    assert len(data._examTimeListCache) <= 4
+    assert len(data._examTimeCache) <= 4
+
+
+@pytest.mark.usefixtures("courseKeyRegistry")
+def testLoadedClassesShareTimes(wishedSemester):
+    # 从json和从快照加载时，相同的时间字符串都得到同一个时间对象
+    for _ in range(2):
+        data.clearParseCache()
+        data.loadClassData(NullProgress())
+        byString = {}
+        for class_ in data.allClassSet:
+            key = (class_.originClassTimeStr, class_.originSemesterStr)
+            assert byString.setdefault(key, class_.classTime) is class_.classTime
+        assert len(byString) < len(data.allClassSet)
@@ -0,0 +1,137 @@
+import pytest
+import data
+from benchmark.scaling import NullProgress
+from Entities import Constants
+from Entities.WishList import WishList
+from Entities.ClassTable import ClassTable
+from Entities.CancellationToken import CancellationToken, OperationCancelled
+import selectClass as selectClassModule
+from selectClass import selectClass, SearchStats, SearchBudget, getClassTableRateList, rateListCmp
+
+pytestmark = pytest.mark.usefixtures("courseKeyRegistry")
+
+
+class CountdownToken(CancellationToken):
+    """
+    第checks次检查时自动取消的取消令牌，用于在搜索进行到一半时取消
+    """
+    def __init__(self, checks: int):
+        super().__init__()
+        self.checks = checks
+
+    def raiseIfCancelled(self):
+        self.checks -= 1
+        if self.checks <= 0:
+            self.cancel()
+        super().raiseIfCancelled()
+
+
+@pytest.fixture
+def problem(wishedSemester):
+    """
+    :return: 一个函数，每次调用都返回新的(课表, 愿望清单)。愿望分配到3个优先级
+    """
+    data.loadClassData(NullProgress())
+
+    def _create():
+        classTable = ClassTable()
+        data.initClassTable(classTable)
+        wishList = WishList()
+        for i, code in enumerate(wishedSemester):
+            wishList.append(data.getCourseFromCourseCode(code)).withPriority(i % 3)
+        return classTable, wishList
+    return _create
+
+
+def assertConsistent(classTable: ClassTable, wishList: WishList, stats: SearchStats):
+    """
+    检查提前结束的选课结果是一个完整、合法的课表，而且就是stats中记录的最优课表
+    """
+    confirmed = [class_ for class_ in data.allClassSet if class_.status == Constants.ClassStatus.CONFIRMED]
+    assert all(class_ in classTable.classes for class_ in confirmed)
+    rebuilt = ClassTable()
+    for class_ in classTable.classes:
+        assert not rebuilt.isConflict(class_)
+        rebuilt.append(class_)
+    bestClassTable, bestRateList = stats.getBestSoFar()
+    assert [class_.classCode for class_ in classTable.classes] == \
+        [class_.classCode for class_ in bestClassTable.classes]
+    assert getClassTableRateList(classTable, wishList) == bestRateList
+
+
+def testFullSearchCoversEveryPriority(problem):
+    classTable, wishList = problem()
+    stats = SearchStats()
+    selectClass(classTable, wishList, NullProgress(), stats=stats)
+    assert not stats.budgetExhausted and not stats.cancelled
+    assert list(stats.coveragePerPriority.values()) == pytest.approx([1.0] * len(stats.coveragePerPriority))
+    assertConsistent(classTable, wishList, stats)
+
+
+def testBudgetReturnsConsistentTable(problem):
+    classTable, wishList = problem()
+    reference = ClassTable()
+    classTable.copyTo(reference)
+    selectClass(reference, wishList, NullProgress())
+
+    classTable, wishList = problem()
+    stats = SearchStats()
+    selectClass(classTable, wishList, NullProgress(), stats=stats, budget=SearchBudget(nodes=1))
+    assert stats.budgetExhausted
+    assertConsistent(classTable, wishList, stats)
+    # 第一个优先级在预算用完时还没有完整的课表，只能贪心地选；之后的优先级一开始预算就已经用完
+    assert set(stats.coveragePerPriority.values()) == {0.0}
+    assert len(stats.coveragePerPriority) == len({course.priority for course in wishList.wishes})
+    assert rateListCmp(getClassTableRateList(classTable, wishList), getClassTableRateList(reference, wishList)) <= 0
+
+
+def testSmallSearchStaysInProcess(problem, monkeypatch):
+    classTable, wishList = problem()
+    reference = ClassTable()
+    classTable.copyTo(reference)
+    selectClass(reference, wishList, NullProgress())
+
+    def _noPool(*args, **kwargs):
+        raise AssertionError("试搜索就能搜索完的优先级不应该启动进程池")
+    monkeypatch.setattr(selectClassModule, "ProcessPoolExecutor", _noPool)
+    classTable, wishList = problem()
+    selectClass(classTable, wishList, NullProgress(), workers=4)
+    assert [class_.classCode for class_ in classTable.classes] == [class_.classCode for class_ in reference.classes]
+
+
+@pytest.mark.parametrize("probeNodes", [1, 50])
+def testParallelMatchesSerial(problem, monkeypatch, probeNodes):
+    classTable, wishList = problem()
+    reference = ClassTable()
+    classTable.copyTo(reference)
+    selectClass(reference, wishList, NullProgress())
+
+    monkeypatch.setattr(selectClassModule, "PARALLEL_PROBE_NODES", probeNodes)
+    classTable, wishList = problem()
+    stats = SearchStats()
+    selectClass(classTable, wishList, NullProgress(), workers=2, stats=stats)
+    assert [class_.classCode for class_ in classTable.classes] == [class_.classCode for class_ in reference.classes]
+    assertConsistent(classTable, wishList, stats)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("checks", [1, 5, 20, 60])
+def testCancelReturnsConsistentTable(problem, monkeypatch, checks, workers):
+    monkeypatch.setattr(selectClassModule, "PARALLEL_PROBE_NODES", 1)   # 让并行搜索真正使用进程池
+    classTable, wishList = problem()
+    stats = SearchStats()
+    selectClass(classTable, wishList, NullProgress(), workers=workers, stats=stats,
+                cancelToken=CountdownToken(checks))
+    # 并行搜索时主进程检查取消的次数较少，搜索可能在取消之前就结束了
+    assert stats.cancelled or workers > 1
+    assertConsistent(classTable, wishList, stats)
+
+
+def testCancelledLoadLeavesNoClasses(wishedSemester):
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(OperationCancelled):
+        data.loadClassData(NullProgress(), cancelToken=token)
+    assert data.allClassSet == []
+    data.loadClassData(NullProgress())
+    assert data.allClassSet